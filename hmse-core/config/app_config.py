@@ -44,6 +44,13 @@ class AppConfig:
     modflow_program_path: Optional[str] = None
     hydrus_program_path: Optional[str] = None
 
+    # Simulation steps save Modflow heads to binary head files (faster to read than formatted ones)
+    modflow_binary_heads: bool = False
+    # Every n-th row and column of heads exported to results.json, None - JSON view of results not exported
+    results_json_downsample: Optional[int] = 1
+    # Max relative error of K(h) tables used to recalculate Hydrus pressure profiles, None - exact conductivity
+    hydrus_kh_tolerance: Optional[float] = 1e-6
+
     # docker specific config
     docker_volume_overwrite: Optional[str] = None  # Used only for HMSE runner script
 
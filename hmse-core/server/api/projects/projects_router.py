@@ -1,14 +1,18 @@
 from http import HTTPStatus
+from typing import Optional, Tuple
 
 import flask
-from flask import request, render_template, jsonify, Blueprint, send_file, url_for
+from flask import request, render_template, jsonify, Blueprint, url_for, stream_with_context
 from flask_paginate import get_page_args, Pagination
-from werkzeug.exceptions import abort
+from werkzeug.datastructures import ContentRange
+from werkzeug.exceptions import abort, RequestedRangeNotSatisfiable
 from werkzeug.utils import redirect
 
 from config import app_config
 from config.app_config import ApplicationDeployment
-from simulations.projects import project_service
+from hmse_utils.processing.modflow.modflow_results import PYRAMID_TILE_SIZE
+from simulations.projects import project_service, results_service, project_archive
+from simulations.projects.project_archive import ArchiveSelection, PrebuiltArchive
 from hmse_utils.processing.modflow import modflow_utils
 from simulations.projects.project_exceptions import ProjectInUse
 from simulations.projects.project_metadata import ProjectMetadata
@@ -139,8 +143,112 @@ def project_download(project_id: str):
     check_previous_steps = path_checker.path_check_cookie(request.cookies.get(cookie_utils.COOKIE_NAME))
     if check_previous_steps:
         return check_previous_steps
-    return send_file(project_service.download_project(project_id), as_attachment=True,
-                     download_name=f"{project_id}.zip")
+    download = project_service.download_project(project_id, __parse_archive_selection())
+    content_disposition = f"attachment; filename={project_id}.zip"
+    if isinstance(download, PrebuiltArchive):
+        return __send_prebuilt_archive(download, content_disposition)
+    return flask.Response(stream_with_context(project_archive.stream_zip(download)),
+                          mimetype="application/zip",
+                          headers={"Content-Disposition": content_disposition})
+
+
+def __parse_archive_selection() -> ArchiveSelection:
+    # ?final=false&steps=0,2 - selected steps only, ?steps=none - final results only
+    include_final = request.args.get("final", "true").lower() != "false"
+    steps = request.args.get("steps", "all").lower()
+    if steps == "all":
+        return ArchiveSelection(include_final=include_final)
+    if steps in ("none", ""):
+        return ArchiveSelection(include_final=include_final, steps=[])
+    try:
+        return ArchiveSelection(include_final=include_final, steps=[int(step) for step in steps.split(',')])
+    except ValueError:
+        abort(HTTPStatus.BAD_REQUEST, "Steps must be given as: all, none or comma-separated step numbers")
+
+
+def __send_prebuilt_archive(archive: PrebuiltArchive, content_disposition: str) -> flask.Response:
+    # Range requests allow resuming interrupted downloads (only if the archive did not change - If-Range).
+    # Only a strong ETag validator is compared, the full archive is sent for dates and weak ETags.
+    if_range_header = request.headers.get("If-Range")
+    range_valid = if_range_header is None or (not if_range_header.startswith("W/")
+                                              and request.if_range.etag == archive.etag)
+    byte_range = None
+    if request.range is not None and range_valid:
+        byte_range = request.range.range_for_length(archive.size)
+        if byte_range is None:
+            raise RequestedRangeNotSatisfiable(length=archive.size)
+    start, stop = byte_range or (0, archive.size)
+
+    response = flask.Response(archive.read_range(start, stop),
+                              status=HTTPStatus.PARTIAL_CONTENT if byte_range else HTTPStatus.OK,
+                              mimetype="application/zip",
+                              headers={"Content-Disposition": content_disposition})
+    response.content_length = stop - start
+    response.accept_ranges = "bytes"
+    response.set_etag(archive.etag)
+    if byte_range:
+        response.content_range = ContentRange("bytes", start, stop, archive.size)
+    return response
+
+
+@projects.route(endpoints.PROJECT_RESULTS, methods=['GET'])
+def project_results(project_id: str):
+    check_previous_steps = path_checker.path_check_cookie(request.cookies.get(cookie_utils.COOKIE_NAME))
+    if check_previous_steps:
+        return check_previous_steps
+
+    manifest = results_service.get_results_manifest(project_id)
+    if manifest.results_id in request.if_none_match:
+        return __not_modified(manifest.results_id)
+    response = jsonify(results_service.get_results_info(manifest))
+    response.set_etag(manifest.results_id)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@projects.route(endpoints.PROJECT_RESULTS_HEADS, methods=['GET'])
+def project_results_heads(project_id: str):
+    check_previous_steps = path_checker.path_check_cookie(request.cookies.get(cookie_utils.COOKIE_NAME))
+    if check_previous_steps:
+        return check_previous_steps
+
+    manifest = results_service.get_results_manifest(project_id)
+    tile = results_service.select_heads_tile(manifest,
+                                             period=request.args.get("period", 0, type=int),
+                                             layer=request.args.get("layer", 0, type=int),
+                                             bbox=__parse_bbox(request.args.get("bbox")),
+                                             size=request.args.get("size", PYRAMID_TILE_SIZE, type=int))
+    etag = tile.get_etag()
+    if etag in request.if_none_match:
+        return __not_modified(etag)
+
+    response = jsonify(results_service.read_heads_tile(project_id, manifest, tile))
+    response.set_etag(etag)
+    response.cache_control.private = True
+    if request.args.get("results_id") == manifest.results_id:
+        # URL pinned to a single export of results - content never changes
+        response.cache_control.max_age = 365 * 24 * 60 * 60
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def __parse_bbox(bbox: Optional[str]) -> Optional[Tuple[int, int, int, int]]:
+    if not bbox:
+        return None
+    try:
+        row_start, col_start, row_end, col_end = (int(value) for value in bbox.split(','))
+    except ValueError:
+        abort(HTTPStatus.BAD_REQUEST, "Area must be given as: row_start,col_start,row_end,col_end")
+    return row_start, col_start, row_end, col_end
+
+
+def __not_modified(etag: str) -> flask.Response:
+    response = flask.Response(status=HTTPStatus.NOT_MODIFIED)
+    response.set_etag(etag)
+    return response
 
 
 @projects.route(endpoints.PROJECT_MANAGE_MODFLOW, methods=['PUT', 'DELETE', 'PATCH'])
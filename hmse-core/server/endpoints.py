@@ -9,6 +9,8 @@ PROJECT_LIST = '/project-list'
 PROJECT_LIST_SEARCH = '/project-list/<search>'
 
 PROJECT_DOWNLOAD = '/project/<project_id>/download'
+PROJECT_RESULTS = '/project/<project_id>/results'
+PROJECT_RESULTS_HEADS = '/project/<project_id>/results/heads'
 PROJECT = '/project/<project_id>'
 PROJECT_FINISHED = '/project/<project_id>/is-finished'
 PROJECT_IN_USE = '/project/<project_id>/in-use'
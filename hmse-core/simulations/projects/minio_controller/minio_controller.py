@@ -2,13 +2,21 @@ import io
 import json
 import logging
 import os
+import queue
+import threading
+from datetime import timedelta
 from enum import auto
-from pathlib import Path
-from typing import Dict
+from typing import Dict, Iterator, List, Set
 
+import certifi
+import urllib3
 from minio import Minio
+from minio.deleteobjects import DeleteObject
+from minio.error import S3Error
 from strenum import StrEnum
 
+from simulations.projects.minio_controller import transfer_manager
+from simulations.projects.minio_controller.transfer_manager import TransferStats, UPLOAD_WORKERS, PARALLEL_PARTS
 from simulations.projects.minio_controller.typing_help import FilePathInBucket, PrefixEndedWithSlash
 
 # Needed environment variables:
@@ -23,6 +31,13 @@ MINIO_ENDPOINT = os.environ.get("MINIO_ENDPOINT")
 MINIO_REGION = os.environ.get("MINIO_REGION")
 ROOT_BUCKET = os.environ.get("HMSE_MINIO_ROOT_BUCKET")
 
+STREAM_CHUNK_SIZE = 1024 * 1024
+# Connections are reused by all upload workers and their parallel parts
+CONNECTION_POOL_SIZE = UPLOAD_WORKERS * PARALLEL_PARTS
+CONNECTION_TIMEOUT = timedelta(minutes=5).seconds
+# Maximal number of keys in a single multi-object delete request
+DELETE_BATCH_SIZE = 1000
+
 __INSTANCE = None
 logger = logging.getLogger(__name__)
 
@@ -41,8 +56,20 @@ class MinIOController:
             endpoint=endpoint,
             access_key=MINIO_ACCESS_KEY,
             secret_key=MINIO_SECRET_KEY,
-            region=MINIO_REGION
+            region=MINIO_REGION,
+            http_client=urllib3.PoolManager(
+                timeout=urllib3.util.Timeout(connect=CONNECTION_TIMEOUT, read=CONNECTION_TIMEOUT),
+                maxsize=CONNECTION_POOL_SIZE,
+                cert_reqs='CERT_REQUIRED',
+                ca_certs=os.environ.get('SSL_CERT_FILE') or certifi.where(),
+                retries=urllib3.Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504])
+            )
         )
+        # Directories deleted in background - (prefix, object names) processed one at a time by a worker thread
+        self.deletion_queue = queue.Queue()
+        self.pending_deletions: Dict[PrefixEndedWithSlash, int] = {}  # prefix -> number of queued deletions
+        self.deletion_lock = threading.Lock()
+        self.deletion_worker = None
 
     def list_bucket_content(self, name_prefix: PrefixEndedWithSlash, recursive: bool = False):
         logger.debug(f"Retrieving list of object in bucket {ROOT_BUCKET} with prefix: {name_prefix} "
@@ -63,6 +90,28 @@ class MinIOController:
         logger.debug(f"Getting object from bucket {ROOT_BUCKET}: {file_name} (raw bytes)")
         return self.minio_client.get_object(ROOT_BUCKET, file_name)
 
+    def get_file_range(self, file_name: FilePathInBucket, offset: int, length: int) -> bytes:
+        logger.debug(f"Getting bytes {offset}-{offset + length - 1} of object from bucket {ROOT_BUCKET}: {file_name}")
+        response = self.minio_client.get_object(ROOT_BUCKET, file_name, offset=offset, length=length)
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def get_file_stat(self, file_name: FilePathInBucket):
+        logger.debug(f"Getting object info from bucket {ROOT_BUCKET}: {file_name}")
+        return self.minio_client.stat_object(ROOT_BUCKET, file_name)
+
+    def stream_file(self, file_name: FilePathInBucket, offset: int = 0, length: int = 0) -> Iterator[bytes]:
+        logger.debug(f"Streaming object from bucket {ROOT_BUCKET}: {file_name} (offset: {offset}, length: {length})")
+        response = self.minio_client.get_object(ROOT_BUCKET, file_name, offset=offset, length=length)
+        try:
+            yield from response.stream(STREAM_CHUNK_SIZE)
+        finally:
+            response.close()
+            response.release_conn()
+
     def put_file(self, input_file: os.PathLike, bucket_location: FilePathInBucket):
         logger.debug(f"Putting object {input_file} to bucket {ROOT_BUCKET} under path: {bucket_location}")
         return self.minio_client.fput_object(ROOT_BUCKET, bucket_location, input_file)
@@ -77,21 +126,94 @@ class MinIOController:
         logger.debug(f"Deleting object in bucket {ROOT_BUCKET} under path: {object_location}")
         return self.minio_client.remove_object(ROOT_BUCKET, object_location)
 
-    def delete_directory(self, dir_location: PrefixEndedWithSlash):
-        logger.debug(f"Deleting all objects recursively in bucket {ROOT_BUCKET} with prefix: {dir_location}")
-        files_to_delete = [obj.object_name for obj in self.list_bucket_content(dir_location, recursive=True)]
-        for file in files_to_delete:
-            self.delete_file(file)
-
-    def upload_directory_to_bucket(self, directory: os.PathLike, bucket_location_root: FilePathInBucket):
+    def delete_directory(self, dir_location: PrefixEndedWithSlash, background: bool = False):
+        """
+        @param dir_location: Prefix of objects to delete
+        @param background: Return right after listing the objects, they are deleted by a worker thread
+                           (the prefix is pending deletion until then)
+        """
+        logger.debug(f"Deleting all objects recursively in bucket {ROOT_BUCKET} with prefix: {dir_location} "
+                     f"(background: {background})")
+        if not background:
+            self.delete_files([obj.object_name for obj in self.list_bucket_content(dir_location, recursive=True)])
+            return
+
+        # Prefix is marked before listing - writes under it are rejected until the deletion finishes
+        with self.deletion_lock:
+            self.pending_deletions[dir_location] = self.pending_deletions.get(dir_location, 0) + 1
+        try:
+            files_to_delete = [obj.object_name for obj in self.list_bucket_content(dir_location, recursive=True)]
+        except Exception:
+            self.__finish_deletion(dir_location)
+            raise
+        with self.deletion_lock:
+            if self.deletion_worker is None or not self.deletion_worker.is_alive():
+                self.deletion_worker = threading.Thread(target=self.__process_deletions, daemon=True)
+                self.deletion_worker.start()
+        self.deletion_queue.put((dir_location, files_to_delete))
+
+    def delete_files(self, object_locations: List[FilePathInBucket]):
+        logger.debug(f"Deleting {len(object_locations)} objects in bucket {ROOT_BUCKET}")
+        for start in range(0, len(object_locations), DELETE_BATCH_SIZE):
+            batch = [DeleteObject(name) for name in object_locations[start:start + DELETE_BATCH_SIZE]]
+            # Errors are returned lazily - the request is sent while they are iterated
+            for error in self.minio_client.remove_objects(ROOT_BUCKET, batch):
+                logger.error(f"Error occurred during deleting object {error.name} in bucket {ROOT_BUCKET}: "
+                             f"{error.message}")
+
+    def get_pending_deletions(self) -> Set[PrefixEndedWithSlash]:
+        with self.deletion_lock:
+            return set(self.pending_deletions.keys())
+
+    def is_pending_deletion(self, object_location: FilePathInBucket) -> bool:
+        """
+        @param object_location: Object or prefix in the bucket
+        @return: True if the location is under a prefix being deleted in background (by this process)
+        """
+        return any(object_location.startswith(prefix) for prefix in self.get_pending_deletions())
+
+    def file_exists(self, file_name: FilePathInBucket) -> bool:
+        try:
+            self.minio_client.stat_object(ROOT_BUCKET, file_name)
+            return True
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return False
+            raise
+
+    def wait_for_deletions(self):
+        self.deletion_queue.join()
+
+    def __process_deletions(self):
+        while True:
+            dir_location, files_to_delete = self.deletion_queue.get()
+            try:
+                self.delete_files(files_to_delete)
+                logger.debug(f"Deleted {len(files_to_delete)} objects in bucket {ROOT_BUCKET} "
+                             f"with prefix: {dir_location}")
+            except Exception as e:
+                logger.error(f"Error occurred during deleting objects with prefix {dir_location}: {str(e)}")
+            finally:
+                self.__finish_deletion(dir_location)
+                self.deletion_queue.task_done()
+
+    def __finish_deletion(self, dir_location: PrefixEndedWithSlash):
+        with self.deletion_lock:
+            self.pending_deletions[dir_location] -= 1
+            if self.pending_deletions[dir_location] == 0:
+                del self.pending_deletions[dir_location]
+
+    def upload_directory_to_bucket(self, directory: os.PathLike,
+                                   bucket_location_root: FilePathInBucket) -> TransferStats:
         logger.debug(f"Uploading all objects in directory {directory} recursively to bucket {ROOT_BUCKET} "
                      f"under prefix: {bucket_location_root}")
-        files_to_upload = [str(file) for file in Path(directory).rglob("*")
-                           if file.is_file()]
-        for file in files_to_upload:
-            bucket_file = file.replace("\\", "/")
-            location_in_bucket = bucket_file.replace(f"{directory}/", '')
-            self.put_file(file, f"{bucket_location_root}/{location_in_bucket}")
+        existing_etags = {obj.object_name: obj.etag
+                          for obj in self.list_bucket_content(f"{bucket_location_root}/", recursive=True)}
+        tasks = transfer_manager.get_upload_tasks(directory, bucket_location_root)
+        stats = transfer_manager.upload_files(self.minio_client, ROOT_BUCKET, tasks, existing_etags)
+        logger.info(f"Uploaded directory {directory} to bucket {ROOT_BUCKET} under prefix "
+                    f"{bucket_location_root}: {stats}")
+        return stats
 
     def get_root(self) -> str:
         return ROOT_BUCKET
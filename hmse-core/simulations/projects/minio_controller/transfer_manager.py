@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from minio import Minio
+
+from simulations.projects.minio_controller.typing_help import FilePathInBucket
+
+logger = logging.getLogger(__name__)
+
+# Number of files uploaded at once
+UPLOAD_WORKERS = 8
+# Files larger than a part are uploaded in parts, several parts of a file at once
+MULTIPART_PART_SIZE = 16 * 1024 * 1024
+PARALLEL_PARTS = 4
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class UploadTask:
+    local_path: str
+    object_name: FilePathInBucket
+    size: int
+
+
+@dataclass
+class TransferStats:
+    file_count: int = 0
+    uploaded_count: int = 0
+    skipped_count: int = 0
+    uploaded_bytes: int = 0
+    elapsed_seconds: float = 0.0
+
+    def get_throughput(self) -> float:
+        """
+        @return: Uploaded bytes per second
+        """
+        return self.uploaded_bytes / self.elapsed_seconds if self.elapsed_seconds > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.uploaded_count}/{self.file_count} files uploaded ({self.skipped_count} unchanged skipped), "
+                f"{self.uploaded_bytes / 2 ** 20:.1f} MiB in {self.elapsed_seconds:.2f} s "
+                f"({self.get_throughput() / 2 ** 20:.1f} MiB/s)")
+
+
+def get_local_etag(local_path: str, part_size: int = MULTIPART_PART_SIZE) -> str:
+    """
+    ETag the object store gives to the file uploaded with given part size - MD5 of the file for single part uploads,
+    MD5 of concatenated part MD5s with number of parts for multipart uploads.
+
+    @param local_path: Path to the file
+    @param part_size: Part size of the upload
+    @return: Expected ETag of the uploaded object (without quotes)
+    """
+    file_hash = hashlib.md5()
+    part_digests = []
+    part_hash, part_read = hashlib.md5(), 0
+    with open(local_path, 'rb') as handle:
+        for data in iter(lambda: handle.read(HASH_CHUNK_SIZE), b''):
+            while data:
+                part_data = data[:part_size - part_read]
+                data = data[len(part_data):]
+                file_hash.update(part_data)
+                part_hash.update(part_data)
+                part_read += len(part_data)
+                if part_read == part_size:
+                    part_digests.append(part_hash.digest())
+                    part_hash, part_read = hashlib.md5(), 0
+    if part_read > 0:
+        part_digests.append(part_hash.digest())
+
+    if len(part_digests) <= 1:
+        return file_hash.hexdigest()
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+
+def upload_files(client: Minio, bucket: str, tasks: List[UploadTask],
+                 existing_etags: Optional[Dict[FilePathInBucket, str]] = None) -> TransferStats:
+    """
+    Upload files concurrently, files already stored in the bucket with the same content are skipped.
+
+    @param client: MinIO client, shared by all workers (its connection pool should fit UPLOAD_WORKERS)
+    @param bucket: Target bucket
+    @param tasks: Files to upload
+    @param existing_etags: ETags of objects already stored in the bucket (by object name)
+    @return: Statistics of the transfer
+    """
+    existing_etags = existing_etags or {}
+    start = time.perf_counter()
+
+    def upload(task: UploadTask) -> bool:
+        existing_etag = existing_etags.get(task.object_name)
+        if existing_etag and existing_etag.strip('"') == get_local_etag(task.local_path):
+            logger.debug(f"Skipping unchanged object {task.object_name} in bucket {bucket}")
+            return False
+        logger.debug(f"Putting object {task.local_path} to bucket {bucket} under path: {task.object_name}")
+        client.fput_object(bucket, task.object_name, task.local_path,
+                           part_size=MULTIPART_PART_SIZE, num_parallel_uploads=PARALLEL_PARTS)
+        return True
+
+    stats = TransferStats(file_count=len(tasks))
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        # Largest files first - they do not end up alone at the end of the transfer
+        tasks = sorted(tasks, key=lambda t: t.size, reverse=True)
+        for task, uploaded in zip(tasks, executor.map(upload, tasks)):
+            if uploaded:
+                stats.uploaded_count += 1
+                stats.uploaded_bytes += task.size
+            else:
+                stats.skipped_count += 1
+    stats.elapsed_seconds = time.perf_counter() - start
+    return stats
+
+
+def get_upload_tasks(directory: os.PathLike, bucket_location_root: FilePathInBucket) -> List[UploadTask]:
+    """
+    @param directory: Local directory
+    @param bucket_location_root: Prefix of the objects (without trailing slash)
+    @return: Tasks uploading all files of the directory recursively under the prefix
+    """
+    tasks = []
+    for root, _, files in os.walk(directory):
+        for file in files:
+            local_path = os.path.join(root, file)
+            relative_path = os.path.relpath(local_path, directory).replace(os.sep, '/')
+            tasks.append(UploadTask(local_path=local_path,
+                                    object_name=f"{bucket_location_root}/{relative_path}",
+                                    size=os.path.getsize(local_path)))
+    return tasks
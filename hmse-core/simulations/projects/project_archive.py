@@ -0,0 +1,99 @@
+import io
+import logging
+import zipfile
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+SIMULATION_STEP_DIR_PREFIX = "sim_step_"
+
+
+@dataclass
+class ArchiveSelection:
+    """
+    Part of the simulation directory to download - final results (everything except simulation steps)
+    and simulation steps (sim_step_N dirs).
+    """
+    include_final: bool = True
+    steps: Optional[List[int]] = None  # None - all steps
+
+    def is_full(self) -> bool:
+        return self.include_final and self.steps is None
+
+    def includes_path(self, rel_path: str) -> bool:
+        """
+        @param rel_path: Path relative to the simulation directory, with '/' separators
+        @return: True if the file or directory belongs to the selection
+        """
+        top_dir = rel_path.split('/')[0]
+        if not top_dir.startswith(SIMULATION_STEP_DIR_PREFIX):
+            return self.include_final
+        step = top_dir[len(SIMULATION_STEP_DIR_PREFIX):]
+        return self.steps is None or (step.isdigit() and int(step) in self.steps)
+
+
+@dataclass
+class ArchiveEntry:
+    arcname: str
+    open_source: Callable[[], BinaryIO]
+    date_time: Tuple[int, int, int, int, int, int] = (1980, 1, 1, 0, 0, 0)
+
+
+@dataclass
+class PrebuiltArchive:
+    size: int
+    etag: str
+    read_range: Callable[[int, int], Iterator[bytes]]  # start, stop (exclusive) -> chunks of the archive
+
+
+class ZipStreamBuffer(io.RawIOBase):
+    """
+    Write-only, non-seekable output of a zip file - zipfile then writes sizes in data descriptors after file data,
+    so written bytes can be sent right away.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def take(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(entries: Iterable[ArchiveEntry]) -> Iterator[bytes]:
+    """
+    Create a zip archive on the fly - entries are read and compressed one chunk at a time.
+
+    @param entries: Files to archive
+    @return: Chunks of the archive
+    """
+    buffer = ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for entry in entries:
+            zip_info = zipfile.ZipInfo(entry.arcname, date_time=entry.date_time)
+            zip_info.compress_type = zipfile.ZIP_DEFLATED
+            with entry.open_source() as source, archive.open(zip_info, 'w', force_zip64=True) as target:
+                for data in iter(lambda: source.read(CHUNK_SIZE), b''):
+                    target.write(data)
+                    if buffer.chunks:
+                        yield buffer.take()
+            if buffer.chunks:
+                yield buffer.take()
+    # Central directory
+    yield buffer.take()
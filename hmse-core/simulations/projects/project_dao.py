@@ -1,11 +1,14 @@
 import abc
-from typing import List
+from typing import List, Dict, Iterator, Optional
 
 import numpy as np
 from werkzeug.datastructures import FileStorage
 
 from config.deployment_config import get_deployment_class, required
+from hmse_utils.processing.modflow.modflow_results import ResultsManifest
+from hmse_utils.processing.modflow.rch_zoning import RchZoning
 from hmse_utils.processing.typing_help import ModflowID, HydrusID
+from simulations.projects.project_archive import ArchiveSelection, ArchiveEntry, PrebuiltArchive
 from simulations.projects.project_metadata import ProjectMetadata
 from simulations.projects.typing_help import ProjectID, WeatherID, ShapeID
 
@@ -31,7 +34,10 @@ class ProjectDao(abc.ABC):
     def delete_project(self, project_id: ProjectID) -> None:
         ...
 
-    def download_project(self, project_id: ProjectID) -> str:
+    def get_archive_entries(self, project_id: ProjectID, selection: ArchiveSelection) -> Iterator[ArchiveEntry]:
+        ...
+
+    def get_prebuilt_archive(self, project_id: ProjectID) -> Optional[PrebuiltArchive]:
         ...
 
     def add_hydrus_model(self, project_id: ProjectID,
@@ -62,6 +68,9 @@ class ProjectDao(abc.ABC):
                              shape_mask: np.ndarray) -> None:
         ...
 
+    def save_or_update_shapes(self, project_id: ProjectID, shape_masks: Dict[ShapeID, np.ndarray]) -> None:
+        ...
+
     def get_rch_shapes(self, project_id: ProjectID):
         ...
 
@@ -71,15 +80,27 @@ class ProjectDao(abc.ABC):
     def get_shape(self, project_id: ProjectID, shape_id: ShapeID) -> np.ndarray:
         ...
 
+    def get_shapes(self, project_id: ProjectID, shape_ids: List[ShapeID]) -> Dict[ShapeID, np.ndarray]:
+        ...
+
     def delete_shape(self, project_id: ProjectID, shape_id: ShapeID) -> None:
         ...
 
-    def add_modflow_rch_shapes(self, project_id: ProjectID, rch_shapes: List[np.ndarray]):
+    def delete_shapes(self, project_id: ProjectID, shape_ids: List[ShapeID]) -> None:
+        ...
+
+    def add_modflow_rch_shapes(self, project_id: ProjectID, rch_zoning: RchZoning):
         ...
 
     def get_project_root(self, project_id: ProjectID) -> str:
         ...
 
+    def read_results_manifest(self, project_id: ProjectID) -> ResultsManifest:
+        ...
+
+    def read_results_range(self, project_id: ProjectID, file_name: str, offset: int, length: int) -> bytes:
+        ...
+
 
 def get() -> ProjectDao:
     global __INSTANCE
@@ -1,8 +1,10 @@
+import functools
 import json
 import logging
 import os
 import shutil
-from typing import List
+import time
+from typing import List, Dict, Iterator, Optional
 
 import numpy as np
 from werkzeug.datastructures import FileStorage
@@ -11,8 +13,13 @@ from config.deployment_config import desktop, docker
 from hmse_utils.processing.local_fs_configuration import local_paths
 from hmse_utils.processing.local_fs_configuration.path_constants import \
     get_workspace_local_path
+from hmse_utils.processing.local_fs_configuration.shape_store import ShapeStore
+from hmse_utils.processing.modflow import modflow_results
+from hmse_utils.processing.modflow.modflow_results import ResultsManifest
+from hmse_utils.processing.modflow.rch_zoning import RchZoning
 from hmse_utils.processing.typing_help import ModflowID, HydrusID
 from simulations.projects import project_dao
+from simulations.projects.project_archive import ArchiveSelection, ArchiveEntry, PrebuiltArchive
 from simulations.projects.project_metadata import ProjectMetadata
 from simulations.projects.typing_help import ProjectID, WeatherID, ShapeID
 
@@ -61,11 +68,26 @@ class ProjectDaoLocal:
         except OSError as e:
             logging.error(f"Error occurred during deleting project {project_id}: {str(e)}")
 
-    def download_project(self, project_id: ProjectID) -> str:
-        logger.debug(f"Archiving project for download: {project_id}")
-        return shutil.make_archive(base_name=os.path.join(local_paths.get_project_dir(project_id), project_id),
-                                   format='zip',
-                                   root_dir=local_paths.get_simulation_dir(project_id))
+    def get_archive_entries(self, project_id: ProjectID, selection: ArchiveSelection) -> Iterator[ArchiveEntry]:
+        logger.debug(f"Listing files of project {project_id} for download: {selection}")
+        simulation_dir = local_paths.get_simulation_dir(project_id)
+        for dir_path, dir_names, file_names in os.walk(simulation_dir):
+            rel_dir = os.path.relpath(dir_path, simulation_dir).replace(os.sep, '/')
+            rel_dir = '' if rel_dir == '.' else f"{rel_dir}/"
+            dir_names[:] = sorted(dir_name for dir_name in dir_names if selection.includes_path(rel_dir + dir_name))
+            for file_name in sorted(file_names):
+                if not selection.includes_path(rel_dir + file_name):
+                    continue
+                file_path = os.path.join(dir_path, file_name)
+                # Zip format does not support dates before 1980
+                date_time = max(time.localtime(os.path.getmtime(file_path))[:6], (1980, 1, 1, 0, 0, 0))
+                yield ArchiveEntry(arcname=rel_dir + file_name,
+                                   open_source=functools.partial(open, file_path, 'rb'),
+                                   date_time=date_time)
+
+    def get_prebuilt_archive(self, project_id: ProjectID) -> Optional[PrebuiltArchive]:
+        # Archives are always streamed from simulation files
+        return None
 
     def add_hydrus_model(self, project_id: ProjectID,
                          hydrus_id: HydrusID,
@@ -106,41 +128,58 @@ class ProjectDaoLocal:
     def delete_weather_file(self, project_id: ProjectID, weather_id: WeatherID) -> None:
         logger.debug(f"Deleting SWAT weather file {weather_id} to project: {project_id}")
         os.remove(local_paths.get_weather_model_path(project_id, weather_id))
+        weather_cache_path = local_paths.get_weather_cache_path(project_id, weather_id)
+        if os.path.isfile(weather_cache_path):
+            os.remove(weather_cache_path)
 
     def save_or_update_shape(self,
                              project_id: ProjectID,
                              shape_id: ShapeID,
                              shape_mask: np.ndarray) -> None:
-        logger.debug(f"Saving shape {shape_id} in project: {project_id}")
-        os.makedirs(local_paths.get_shapes_dir(project_id), exist_ok=True)
-        np.save(local_paths.get_shape_path(project_id, shape_id), shape_mask)
+        self.save_or_update_shapes(project_id, {shape_id: shape_mask})
+
+    def save_or_update_shapes(self, project_id: ProjectID, shape_masks: Dict[ShapeID, np.ndarray]) -> None:
+        logger.debug(f"Saving shapes {list(shape_masks.keys())} in project: {project_id}")
+        ShapeStore(local_paths.get_shapes_dir(project_id)).save_masks(shape_masks)
 
     def get_rch_shapes(self, project_id: ProjectID):
         logger.debug(f"Retrieving RCH shapes for project: {project_id}")
-        return {shape_id[:-4]: np.load(local_paths.get_rch_shape_filepath(project_id, shape_id[:-4]))
-                for shape_id in os.listdir(local_paths.get_rch_shapes_dir(project_id))}
+        return ShapeStore(local_paths.get_rch_shapes_dir(project_id)).get_masks()
 
     def delete_rch_shapes(self, project_id: ProjectID):
         logger.debug(f"Deleting all RCH shapes in project: {project_id}")
-        rch_shapes_path = local_paths.get_rch_shapes_dir(project_id)
-        for rch_shape_id in os.listdir(rch_shapes_path):
-            os.remove(os.path.join(rch_shapes_path, rch_shape_id))
+        ShapeStore(local_paths.get_rch_shapes_dir(project_id)).clear()
 
     def get_shape(self, project_id: ProjectID, shape_id: ShapeID) -> np.ndarray:
         logger.debug(f"Reading shape {shape_id} in project: {project_id}")
-        return np.load(local_paths.get_shape_path(project_id, shape_id))
+        return ShapeStore(local_paths.get_shapes_dir(project_id)).get_mask(shape_id)
+
+    def get_shapes(self, project_id: ProjectID, shape_ids: List[ShapeID]) -> Dict[ShapeID, np.ndarray]:
+        logger.debug(f"Reading shapes {shape_ids} in project: {project_id}")
+        return ShapeStore(local_paths.get_shapes_dir(project_id)).get_masks(shape_ids)
 
     def delete_shape(self, project_id: ProjectID, shape_id: ShapeID) -> None:
-        logger.debug(f"Deleting shape {shape_id} in project: {project_id}")
-        os.remove(local_paths.get_shape_path(project_id, shape_id))
+        self.delete_shapes(project_id, [shape_id])
 
-    def add_modflow_rch_shapes(self, project_id: ProjectID, rch_shapes: List[np.ndarray]):
+    def delete_shapes(self, project_id: ProjectID, shape_ids: List[ShapeID]) -> None:
+        logger.debug(f"Deleting shapes {shape_ids} in project: {project_id}")
+        ShapeStore(local_paths.get_shapes_dir(project_id)).delete_masks(shape_ids)
+
+    def add_modflow_rch_shapes(self, project_id: ProjectID, rch_zoning: RchZoning):
         logger.debug(f"Generating RCH shapes for project: {project_id}")
-        os.makedirs(local_paths.get_rch_shapes_dir(project_id), exist_ok=True)
-        for i, mask in enumerate(rch_shapes):
-            shape_id = f"rch_shape_{i + 1}"
-            np.save(local_paths.get_rch_shape_filepath(project_id, shape_id), mask)
+        ShapeStore(local_paths.get_rch_shapes_dir(project_id)).save_mask_items(
+            (f"rch_shape_{zone_idx + 1}", mask) for zone_idx, mask in rch_zoning.iter_masks()
+        )
 
     def get_project_root(self, project_id: ProjectID) -> str:
         # Not needed
         ...
+
+    def read_results_manifest(self, project_id: ProjectID) -> ResultsManifest:
+        logger.debug(f"Reading results manifest for project: {project_id}")
+        return modflow_results.read_manifest(local_paths.get_output_dir(project_id))
+
+    def read_results_range(self, project_id: ProjectID, file_name: str, offset: int, length: int) -> bytes:
+        with open(os.path.join(local_paths.get_output_dir(project_id), file_name), 'rb') as handle:
+            handle.seek(offset)
+            return handle.read(length)
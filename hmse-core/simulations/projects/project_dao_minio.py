@@ -1,16 +1,23 @@
+import functools
 import logging
 import os
 import tempfile
-from typing import List
+from typing import List, Dict, Iterator, Optional
 
 import numpy as np
+from minio.error import S3Error
 from werkzeug.datastructures import FileStorage
 
 from config.deployment_config import k8s
-from hmse_utils.processing.local_fs_configuration.path_constants import METADATA_FILENAME
+from hmse_utils.processing.local_fs_configuration.path_constants import METADATA_FILENAME, \
+    MODFLOW_OUTPUT_DIR, RESULTS_MANIFEST_FILENAME
+from hmse_utils.processing.modflow.modflow_results import ResultsManifest
+from hmse_utils.processing.modflow.rch_zoning import RchZoning
 from hmse_utils.processing.typing_help import ModflowID, HydrusID
 from simulations.projects import project_dao
 from simulations.projects.minio_controller import minio_controller
+from simulations.projects.project_archive import ArchiveSelection, ArchiveEntry, PrebuiltArchive
+from simulations.projects.project_exceptions import ProjectArchiveSelectionUnavailable, ProjectInUse
 from simulations.projects.project_metadata import ProjectMetadata
 from simulations.projects.typing_help import ProjectID, WeatherID, ShapeID
 
@@ -31,27 +38,58 @@ class ProjectDaoMinio:
 
     def read_all_names(self) -> List[str]:
         logger.debug("Reading names of all projects")
+        # Projects being deleted (also interrupted deletions - metadata is deleted first) are skipped
         return [obj.object_name.replace("projects/", '')[:-1]
                 for obj in minio_controller.get().list_bucket_content("projects/")
-                if obj.object_name != "projects/"]
+                if obj.object_name != "projects/"
+                and not minio_controller.get().is_pending_deletion(obj.object_name)
+                and minio_controller.get().file_exists(f"{obj.object_name}{METADATA_FILENAME}")]
 
     def save_or_update_metadata(self, metadata: ProjectMetadata) -> None:
         logger.debug(f"Saving changes to metadata for project: {metadata.project_id}")
+        self.__check_not_deleted(metadata.project_id)
         minio_controller.get().put_json_file(metadata.to_json_response(),
-                                             f"projects/{metadata.project_id}/metadata.json")
+                                             f"projects/{metadata.project_id}/{METADATA_FILENAME}")
 
     def delete_project(self, project_id: ProjectID) -> None:
         logger.debug(f"Deleting project: {project_id}")
-        minio_controller.get().delete_directory(f"projects/{project_id}/")
-
-    def download_project(self, project_id: ProjectID) -> FileStorage:
-        logger.debug(f"Archiving project for download: {project_id}")
-        return minio_controller.get().get_file_bytes(f"projects/{project_id}/output.zip")
+        # Project without metadata is not listed, even if the deletion of remaining files gets interrupted
+        minio_controller.get().delete_file(f"projects/{project_id}/{METADATA_FILENAME}")
+        minio_controller.get().delete_directory(f"projects/{project_id}/", background=True)
+
+    def get_archive_entries(self, project_id: ProjectID, selection: ArchiveSelection) -> Iterator[ArchiveEntry]:
+        logger.debug(f"Listing files of project {project_id} for download: {selection}")
+        if selection.steps is None or selection.steps:
+            # Simulation steps are uploaded only inside the prebuilt archive (output.zip)
+            raise ProjectArchiveSelectionUnavailable()
+        if not selection.include_final:
+            return iter([])
+        results_prefix = f"projects/{project_id}/{MODFLOW_OUTPUT_DIR}/"
+        object_names = [obj.object_name
+                        for obj in minio_controller.get().list_bucket_content(results_prefix, recursive=True)]
+        return (ArchiveEntry(arcname=f"{MODFLOW_OUTPUT_DIR}/{object_name[len(results_prefix):]}",
+                             open_source=functools.partial(minio_controller.get().get_file_bytes, object_name))
+                for object_name in object_names)
+
+    def get_prebuilt_archive(self, project_id: ProjectID) -> Optional[PrebuiltArchive]:
+        archive_name = f"projects/{project_id}/output.zip"
+        try:
+            stat = minio_controller.get().get_file_stat(archive_name)
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return None
+            raise
+        return PrebuiltArchive(size=stat.size,
+                               etag=stat.etag,
+                               read_range=lambda start, stop: minio_controller.get().stream_file(archive_name,
+                                                                                                 offset=start,
+                                                                                                 length=stop - start))
 
     def add_hydrus_model(self, project_id: ProjectID,
                          hydrus_id: HydrusID,
                          validated_model_path: os.PathLike) -> None:
         logger.debug(f"Adding hydrus model {hydrus_id} to project: {project_id}")
+        self.__check_not_deleted(project_id)
         minio_controller.get().upload_directory_to_bucket(validated_model_path,
                                                           f"projects/{project_id}/hydrus/{hydrus_id}")
 
@@ -59,6 +97,7 @@ class ProjectDaoMinio:
                           modflow_id: ModflowID,
                           validated_model_path: os.PathLike) -> None:
         logger.debug(f"Adding modflow model {modflow_id} to project: {project_id}")
+        self.__check_not_deleted(project_id)
         minio_controller.get().upload_directory_to_bucket(validated_model_path,
                                                           f"projects/{project_id}/modflow/{modflow_id}")
 
@@ -72,6 +111,7 @@ class ProjectDaoMinio:
 
     def add_weather_file(self, project_id: ProjectID, weather_id: WeatherID, weather_file: FileStorage) -> None:
         logger.debug(f"Adding SWAT weather file {weather_id} to project: {project_id}")
+        self.__check_not_deleted(project_id)
         with tempfile.TemporaryDirectory() as tmp_dir:
             path_to_weather_file = os.path.join(tmp_dir, weather_file.filename)
             weather_file.save(path_to_weather_file)
@@ -84,47 +124,82 @@ class ProjectDaoMinio:
     def save_or_update_shape(self,
                              project_id: ProjectID,
                              shape_id: ShapeID,
-                             shape_mask: np.ndarray,
-                             is_rch: bool = False) -> None:
-        logger.debug(f"Saving shape {shape_id} in project: {project_id}")
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            shape_path = os.path.join(tmp_dir, "shape.npy")
-            np.save(shape_path, shape_mask)
-            shape_project_dir = "rch_shapes" if is_rch else "shapes"
-            s3_path = f"projects/{project_id}/{shape_project_dir}/{shape_id}.npy"
-            minio_controller.get().put_file(shape_path, s3_path)
+                             shape_mask: np.ndarray) -> None:
+        self.save_or_update_shapes(project_id, {shape_id: shape_mask})
+
+    def save_or_update_shapes(self, project_id: ProjectID, shape_masks: Dict[ShapeID, np.ndarray]) -> None:
+        logger.debug(f"Saving shapes {list(shape_masks.keys())} in project: {project_id}")
+        self.__check_not_deleted(project_id)
+        for shape_id, mask in shape_masks.items():
+            self.__put_mask(f"projects/{project_id}/shapes/{shape_id}.npy", mask)
 
     def get_rch_shapes(self, project_id: ProjectID):
         logger.debug(f"Retrieving RCH shapes for project: {project_id}")
-        rch_shapes = {}
         rch_paths = [obj.object_name for obj in
                      minio_controller.get().list_bucket_content(f"projects/{project_id}/rch_shapes/")]
-        for rch_shape_bucket_path in rch_paths:
-            shape_id = rch_shape_bucket_path.split("/")[-1].split('.')[0]
-            rch_shapes[shape_id] = self.get_shape(project_id, shape_id)
-        return rch_shapes
+        return {rch_path.split("/")[-1][:-len(".npy")]: self.__read_mask(rch_path) for rch_path in rch_paths}
 
     def delete_rch_shapes(self, project_id: ProjectID):
         logger.debug(f"Deleting all RCH shapes in project: {project_id}")
-        minio_controller.get().delete_directory(f"projects/{project_id}/rch_shapes")
+        minio_controller.get().delete_directory(f"projects/{project_id}/rch_shapes/")
 
     def get_shape(self, project_id: ProjectID, shape_id: ShapeID) -> np.ndarray:
         logger.debug(f"Reading shape {shape_id} in project: {project_id}")
         shape_dir = "rch_shapes" if shape_id.startswith("rch_shape_") else "shapes"
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            shape_path = os.path.join(tmp_dir, "shape.npy")
-            minio_controller.get().get_file(f"projects/{project_id}/{shape_dir}/{shape_id}.npy", shape_path)
-            return np.load(shape_path)
+        return self.__read_mask(f"projects/{project_id}/{shape_dir}/{shape_id}.npy")
+
+    def get_shapes(self, project_id: ProjectID, shape_ids: List[ShapeID]) -> Dict[ShapeID, np.ndarray]:
+        logger.debug(f"Reading shapes {shape_ids} in project: {project_id}")
+        return {shape_id: self.__read_mask(f"projects/{project_id}/shapes/{shape_id}.npy") for shape_id in shape_ids}
 
     def delete_shape(self, project_id: ProjectID, shape_id: ShapeID) -> None:
-        logger.debug(f"Deleting shape {shape_id} in project: {project_id}")
-        minio_controller.get().delete_file(f"projects/{project_id}/shapes/{shape_id}.npy")
+        self.delete_shapes(project_id, [shape_id])
 
-    def add_modflow_rch_shapes(self, project_id: ProjectID, rch_shapes: List[np.ndarray]):
+    def delete_shapes(self, project_id: ProjectID, shape_ids: List[ShapeID]) -> None:
+        logger.debug(f"Deleting shapes {shape_ids} in project: {project_id}")
+        minio_controller.get().delete_files([f"projects/{project_id}/shapes/{shape_id}.npy" for shape_id in shape_ids])
+
+    def add_modflow_rch_shapes(self, project_id: ProjectID, rch_zoning: RchZoning):
         logger.debug(f"Generating RCH shapes for project: {project_id}")
-        for i, mask in enumerate(rch_shapes):
-            shape_id = f"rch_shape_{i + 1}"
-            self.save_or_update_shape(project_id, shape_id, mask, is_rch=True)
+        self.__check_not_deleted(project_id)
+        for zone_idx, mask in rch_zoning.iter_masks():
+            self.__put_mask(f"projects/{project_id}/rch_shapes/rch_shape_{zone_idx + 1}.npy", mask)
 
     def get_project_root(self, project_id: ProjectID) -> str:
         return f"{minio_controller.get().get_root()}/projects/{project_id}"
+
+    def read_results_manifest(self, project_id: ProjectID) -> ResultsManifest:
+        logger.debug(f"Reading results manifest for project: {project_id}")
+        try:
+            return ResultsManifest.from_json(minio_controller.get().get_json_content(
+                f"projects/{project_id}/{MODFLOW_OUTPUT_DIR}/{RESULTS_MANIFEST_FILENAME}"))
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                raise FileNotFoundError(f"No results of project: {project_id}") from e
+            raise
+
+    def read_results_range(self, project_id: ProjectID, file_name: str, offset: int, length: int) -> bytes:
+        return minio_controller.get().get_file_range(f"projects/{project_id}/{MODFLOW_OUTPUT_DIR}/{file_name}",
+                                                     offset, length)
+
+    @staticmethod
+    def __check_not_deleted(project_id: ProjectID) -> None:
+        # Files written under a project being deleted in background would be deleted as well
+        if minio_controller.get().is_pending_deletion(f"projects/{project_id}/"):
+            raise ProjectInUse()
+
+    @staticmethod
+    def __put_mask(object_name: str, mask: np.ndarray) -> None:
+        # Every shape is a separate object - concurrent requests modifying different shapes do not conflict.
+        # Simulation jobs pack downloaded masks into a local shape store.
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mask_path = os.path.join(tmp_dir, "shape.npy")
+            np.save(mask_path, np.asarray(mask) == 1)  # Frontend sets explicitly 1
+            minio_controller.get().put_file(mask_path, object_name)
+
+    @staticmethod
+    def __read_mask(object_name: str) -> np.ndarray:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mask_path = os.path.join(tmp_dir, "shape.npy")
+            minio_controller.get().get_file(object_name, mask_path)
+            return np.load(mask_path)
@@ -23,6 +23,16 @@ class ProjectSimulationNotFinishedError(HTTPException):
     description = "Cannot download - project simulation not finished!"
 
 
+class ProjectResultsNotFound(HTTPException):
+    code = 404
+    description = "Project simulation results not found!"
+
+
+class ProjectArchiveSelectionUnavailable(HTTPException):
+    code = 400
+    description = "Simulation steps can only be downloaded in the full project archive!"
+
+
 class ProjectSimulationInProgressError(HTTPException):
     code = 403
     description = "Cannot download - project simulation not finished!"
@@ -1,6 +1,6 @@
 import os
 import tempfile
-from typing import List, Dict
+from typing import List, Dict, Iterator, Union
 
 import numpy as np
 from werkzeug.datastructures import FileStorage
@@ -10,6 +10,7 @@ from hmse_utils.processing.modflow import modflow_utils, zonebudget_shape_parser
 from hmse_utils.processing.modflow.modflow_metadata import ModflowMetadata
 from hmse_utils.processing.typing_help import HydrusID
 from simulations.projects import project_dao, polygon_processor
+from simulations.projects.project_archive import ArchiveSelection, ArchiveEntry, PrebuiltArchive
 from simulations.projects.project_exceptions import ProjectSimulationNotFinishedError
 from simulations.projects.project_metadata import ProjectMetadata
 from simulations.projects.shape_utils import generate_random_html_color
@@ -33,10 +34,18 @@ def delete(project_id: ProjectID) -> None:
     project_dao.get().delete_project(project_id)
 
 
-def download_project(project_id: ProjectID):
+def download_project(project_id: ProjectID,
+                     selection: ArchiveSelection) -> Union[PrebuiltArchive, Iterator[ArchiveEntry]]:
+    """
+    @return: Prebuilt archive of the whole project if available, files of the selection to archive otherwise
+    """
     if not project_dao.get().read_metadata(project_id).finished:
         raise ProjectSimulationNotFinishedError()
-    return project_dao.get().download_project(project_id)
+    if selection.is_full():
+        prebuilt_archive = project_dao.get().get_prebuilt_archive(project_id)
+        if prebuilt_archive is not None:
+            return prebuilt_archive
+    return project_dao.get().get_archive_entries(project_id, selection)
 
 
 def is_finished(project_id: ProjectID) -> bool:
@@ -119,8 +128,7 @@ def delete_weather_file(project_id: ProjectID, weather_id: HydrusID):
 
 def get_all_shapes(project_id: ProjectID) -> Dict[ShapeID, List[List[int]]]:
     metadata = project_dao.get().read_metadata(project_id)
-    shapes_to_masks = {shape_id: project_dao.get().get_shape(project_id, shape_id) for shape_id in
-                       metadata.shapes.keys()}
+    shapes_to_masks = project_dao.get().get_shapes(project_id, list(metadata.shapes.keys()))
     return __transform_mask_to_polygon(shapes_to_masks)
 
 
@@ -207,8 +215,8 @@ def remove_weather_hydrus_mapping(project_id: ProjectID, hydrus_id: HydrusID):
 def wipe_all_shapes(project_id: ProjectID) -> None:
     metadata = project_dao.get().read_metadata(project_id)
     shape_ids = list(metadata.shapes.keys())
+    project_dao.get().delete_shapes(metadata.project_id, shape_ids)
     for shape_id in shape_ids:
-        project_dao.get().delete_shape(metadata.project_id, shape_id)
         metadata.remove_shape_metadata(shape_id)
     project_dao.get().save_or_update_metadata(metadata)
 
@@ -228,8 +236,7 @@ def __transform_mask_to_polygon(shapes_to_mask: Dict[ShapeID, np.ndarray]) -> Di
 
 
 def __save_new_shapes(project_id, shape_data):
-    for shape_id, mask in shape_data.items():
-        project_dao.get().save_or_update_shape(project_id, shape_id, mask)
+    project_dao.get().save_or_update_shapes(project_id, shape_data)
     shape_ids = {shape_id: generate_random_html_color() for shape_id in shape_data.keys()}
     metadata = project_dao.get().read_metadata(project_id)
     metadata.shapes.update(shape_ids)
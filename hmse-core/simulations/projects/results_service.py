@@ -0,0 +1,122 @@
+import math
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from werkzeug.exceptions import BadRequest
+
+from hmse_utils.processing.modflow.modflow_results import ResultsManifest, ResultsChunk, PyramidLevel, \
+    PYRAMID_TILE_SIZE, NO_DATA_THRESHOLD, get_level_file_name
+from simulations.projects import project_dao
+from simulations.projects.project_exceptions import ProjectSimulationNotFinishedError, ProjectResultsNotFound
+from simulations.projects.typing_help import ProjectID
+
+MAX_TILE_SIZE = 2048
+# Number of decimal places of heads returned to the web UI
+HEADS_PRECISION = 4
+
+
+@dataclass
+class HeadsTile:
+    results_id: str
+    chunk: ResultsChunk
+    level: PyramidLevel
+    layer: int
+    rows: Tuple[int, int]  # [start, end) of level rows
+    cols: Tuple[int, int]  # [start, end) of level columns
+
+    def get_etag(self) -> str:
+        return (f"{self.results_id}-{self.chunk.period}-{self.level.level}-{self.layer}-"
+                f"{self.rows[0]}-{self.rows[1]}-{self.cols[0]}-{self.cols[1]}")
+
+
+def get_results_manifest(project_id: ProjectID) -> ResultsManifest:
+    if not project_dao.get().read_metadata(project_id).finished:
+        raise ProjectSimulationNotFinishedError()
+    try:
+        return project_dao.get().read_results_manifest(project_id)
+    except FileNotFoundError:
+        raise ProjectResultsNotFound()
+
+
+def get_results_info(manifest: ResultsManifest) -> Dict:
+    nlay, nrow, ncol = manifest.shape
+    return {
+        "results_id": manifest.results_id,
+        "nlay": nlay,
+        "nrow": nrow,
+        "ncol": ncol,
+        "periods": [{"period": chunk.period, "totim": chunk.totim} for chunk in manifest.chunks],
+        "levels": [{"level": level.level, "factor": level.factor, "nrow": level.shape[1], "ncol": level.shape[2]}
+                   for level in manifest.levels]
+    }
+
+
+def select_heads_tile(manifest: ResultsManifest, period: int, layer: int,
+                      bbox: Optional[Tuple[int, int, int, int]] = None,
+                      size: int = PYRAMID_TILE_SIZE) -> HeadsTile:
+    """
+    Select the finest pyramid level at which the area fits in a tile of the requested size.
+
+    @param manifest: Manifest of project results
+    @param period: Zero-based stress period
+    @param layer: Zero-based layer
+    @param bbox: Area of the grid - (row_start, col_start, row_end, col_end), ends exclusive; whole grid by default
+    @param size: Maximal number of rows and columns of the tile
+    @return: Tile covering the area (aligned to cells of the selected level)
+    """
+    nlay, nrow, ncol = manifest.shape
+    chunk = next((chunk for chunk in manifest.chunks if chunk.period == period), None)
+    if chunk is None:
+        raise BadRequest(f"No results for stress period {period}")
+    if not 0 <= layer < nlay:
+        raise BadRequest(f"Layer must be in range [0, {nlay})")
+    if not 0 < size <= MAX_TILE_SIZE:
+        raise BadRequest(f"Tile size must be in range (0, {MAX_TILE_SIZE}]")
+    row_start, col_start, row_end, col_end = bbox or (0, 0, nrow, ncol)
+    if not (0 <= row_start < row_end <= nrow and 0 <= col_start < col_end <= ncol):
+        raise BadRequest(f"Invalid area {bbox} for grid of {nrow} rows and {ncol} columns")
+
+    level = next((level for level in manifest.levels
+                  if math.ceil((row_end - row_start) / level.factor) <= size
+                  and math.ceil((col_end - col_start) / level.factor) <= size),
+                 manifest.levels[-1])
+    return HeadsTile(results_id=manifest.results_id,
+                     chunk=chunk,
+                     level=level,
+                     layer=layer,
+                     rows=(row_start // level.factor, math.ceil(row_end / level.factor)),
+                     cols=(col_start // level.factor, math.ceil(col_end / level.factor)))
+
+
+def read_heads_tile(project_id: ProjectID, manifest: ResultsManifest, tile: HeadsTile) -> Dict:
+    """
+    @param project_id: ID of the project
+    @param manifest: Manifest of project results
+    @param tile: Selected tile
+    @return: Heads of the tile (None for cells without data) and area of the grid it covers
+    """
+    _, level_nrow, level_ncol = tile.level.shape
+    dtype = np.dtype(manifest.dtype)
+    # Rows of a layer are contiguous, only rows of the tile are read
+    offset = tile.level.data_offset + (tile.layer * level_nrow + tile.rows[0]) * level_ncol * dtype.itemsize
+    row_count = tile.rows[1] - tile.rows[0]
+    data = project_dao.get().read_results_range(project_id,
+                                                get_level_file_name(tile.chunk, tile.level.level),
+                                                offset,
+                                                row_count * level_ncol * dtype.itemsize)
+    heads = np.frombuffer(data, dtype=dtype).reshape(row_count, level_ncol)[:, tile.cols[0]:tile.cols[1]]
+    heads = np.round(heads.astype(float), HEADS_PRECISION)
+
+    _, nrow, ncol = manifest.shape
+    factor = tile.level.factor
+    return {
+        "results_id": tile.results_id,
+        "period": tile.chunk.period,
+        "totim": tile.chunk.totim,
+        "layer": tile.layer,
+        "factor": factor,
+        "bbox": [tile.rows[0] * factor, tile.cols[0] * factor,
+                 min(tile.rows[1] * factor, nrow), min(tile.cols[1] * factor, ncol)],
+        "heads": np.where(np.isnan(heads) | (np.abs(heads) >= NO_DATA_THRESHOLD), None, heads).tolist()
+    }
@@ -42,7 +42,8 @@ def __output_extraction_to_json(project_metadata: ProjectMetadata, **kwargs) ->
     logger.debug(f"Launching local task for stage: {kwargs['stage_name']}")
     configuration_tasks_logic.extract_output_to_json(
         project_id=project_metadata.project_id,
-        modflow_id=project_metadata.modflow_metadata.modflow_id
+        modflow_id=project_metadata.modflow_metadata.modflow_id,
+        json_downsample=app_config.get_config().results_json_downsample
     )
 
 
@@ -61,7 +62,9 @@ def __initialize_new_iteration_files(project_metadata: ProjectMetadata, **kwargs
         project_id=project_metadata.project_id,
         modflow_id=project_metadata.modflow_metadata.modflow_id,
         spin_up=project_metadata.spin_up,
-        shapes_to_hydrus=project_metadata.shapes_to_hydrus
+        shapes_to_hydrus=project_metadata.shapes_to_hydrus,
+        preparation_workers=None,  # one process per CPU
+        binary_heads=app_config.get_config().modflow_binary_heads
     )
 
 
@@ -130,7 +133,8 @@ def __modflow_to_hydrus(project_metadata: ProjectMetadata, **kwargs) -> None:
     data_tasks_logic.transfer_data_from_modflow_to_hydrus(
         project_id=project_metadata.project_id,
         shapes_to_hydrus=project_metadata.shapes_to_hydrus,
-        modflow_metadata=project_metadata.modflow_metadata
+        modflow_metadata=project_metadata.modflow_metadata,
+        kh_tolerance=app_config.get_config().hydrus_kh_tolerance
     )
 
 
@@ -142,7 +146,8 @@ def __modflow_init_condition_transfer_steady_state(project_metadata: ProjectMeta
     data_tasks_logic.transfer_data_from_modflow_to_hydrus(
         project_id=project_metadata.project_id,
         shapes_to_hydrus=project_metadata.shapes_to_hydrus,
-        modflow_metadata=project_metadata.modflow_metadata
+        modflow_metadata=project_metadata.modflow_metadata,
+        kh_tolerance=app_config.get_config().hydrus_kh_tolerance
     )
 
 
@@ -153,7 +158,8 @@ def __modflow_init_condition_transfer_transient(project_metadata: ProjectMetadat
     data_tasks_logic.transfer_data_from_modflow_to_hydrus_init_transient(
         project_id=project_metadata.project_id,
         shapes_to_hydrus=project_metadata.shapes_to_hydrus,
-        modflow_metadata=project_metadata.modflow_metadata
+        modflow_metadata=project_metadata.modflow_metadata,
+        kh_tolerance=app_config.get_config().hydrus_kh_tolerance
     )
 
 
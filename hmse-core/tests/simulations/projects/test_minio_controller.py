@@ -0,0 +1,122 @@
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from minio.error import S3Error
+
+from simulations.projects.minio_controller import minio_controller
+from simulations.projects.minio_controller.minio_controller import MinIOController, DELETE_BATCH_SIZE
+from simulations.projects.project_dao_minio import ProjectDaoMinio
+from simulations.projects.project_exceptions import ProjectInUse
+from simulations.projects.project_metadata import ProjectMetadata
+
+PREFIX = "projects/project/"
+
+
+class FakeMinioClient:
+    def __init__(self, object_names):
+        self.object_names = set(object_names)
+        self.batches = []
+        self.contents = {}
+        self.released = threading.Event()
+        self.released.set()
+
+    def list_objects(self, bucket, prefix, recursive=False):
+        names = [name for name in sorted(self.object_names) if name.startswith(prefix)]
+        if not recursive:
+            # Objects in nested "directories" are listed as their common prefix
+            names = sorted({prefix + name[len(prefix):].split('/')[0] + ('/' if '/' in name[len(prefix):] else '')
+                            for name in names})
+        return [SimpleNamespace(object_name=name) for name in names]
+
+    def stat_object(self, bucket, object_name):
+        if object_name not in self.object_names:
+            raise S3Error("NoSuchKey", "Object does not exist", object_name, None, None, None)
+        return SimpleNamespace(object_name=object_name)
+
+    def put_object(self, bucket, object_name, data, length, content_type=None):
+        self.object_names.add(object_name)
+
+    def fput_object(self, bucket, object_name, file_path, **kwargs):
+        with open(file_path, 'rb') as handle:
+            self.contents[object_name] = handle.read()
+        self.object_names.add(object_name)
+
+    def fget_object(self, bucket, object_name, file_path):
+        with open(file_path, 'wb') as handle:
+            handle.write(self.contents[object_name])
+
+    def remove_object(self, bucket, object_name):
+        self.object_names.discard(object_name)
+
+    def remove_objects(self, bucket, delete_object_list):
+        self.released.wait()
+        batch = [obj._name for obj in delete_object_list]
+        self.batches.append(batch)
+        self.object_names.difference_update(batch)
+        return iter([])
+
+
+@pytest.fixture
+def controller(monkeypatch) -> MinIOController:
+    monkeypatch.setattr(minio_controller, "MINIO_ENDPOINT", "localhost:9000")
+    controller = MinIOController("MINIO")
+    controller.minio_client = FakeMinioClient([f"{PREFIX}sim_step_{i}/model.hds" for i in range(2500)]
+                                              + [f"{PREFIX}metadata.json", "projects/other/metadata.json"])
+    monkeypatch.setattr(minio_controller, "__INSTANCE", controller)
+    return controller
+
+
+def test_directory_deleted_in_batches(controller: MinIOController):
+    controller.delete_directory(PREFIX)
+
+    assert [len(batch) for batch in controller.minio_client.batches] == [DELETE_BATCH_SIZE, DELETE_BATCH_SIZE, 501]
+    assert controller.minio_client.object_names == {"projects/other/metadata.json"}
+
+
+def test_directory_deleted_in_background(controller: MinIOController):
+    controller.minio_client.released.clear()
+    controller.delete_directory(PREFIX, background=True)
+    controller.delete_directory(PREFIX, background=True)
+
+    assert controller.get_pending_deletions() == {PREFIX}
+    assert controller.is_pending_deletion(f"{PREFIX}metadata.json")
+    assert not controller.is_pending_deletion("projects/other/")
+    assert len(controller.minio_client.object_names) == 2502
+
+    controller.minio_client.released.set()
+    controller.wait_for_deletions()
+    assert controller.get_pending_deletions() == set()
+    assert controller.minio_client.object_names == {"projects/other/metadata.json"}
+
+
+def test_project_deleted_in_background_cannot_be_recreated(controller: MinIOController):
+    controller.minio_client.released.clear()
+    dao = ProjectDaoMinio()
+    assert dao.read_all_names() == ["other", "project"]
+
+    dao.delete_project("project")
+
+    # Metadata is deleted right away, the project is no longer listed
+    assert f"{PREFIX}metadata.json" not in controller.minio_client.object_names
+    assert dao.read_all_names() == ["other"]
+    with pytest.raises(ProjectInUse):
+        dao.save_or_update_metadata(ProjectMetadata("project", "Project"))
+
+    controller.minio_client.released.set()
+    controller.wait_for_deletions()
+    dao.save_or_update_metadata(ProjectMetadata("project", "Project"))
+    assert dao.read_all_names() == ["other", "project"]
+
+
+def test_shapes_stored_as_separate_objects(controller: MinIOController):
+    dao = ProjectDaoMinio()
+    masks = {"shape_1": np.eye(3), "shape_2": np.ones((3, 3))}
+    dao.save_or_update_shapes("other", masks)
+    dao.delete_shape("other", "shape_1")
+
+    assert {name for name in controller.minio_client.object_names if "/shapes/" in name} == \
+           {"projects/other/shapes/shape_2.npy"}
+    np.testing.assert_array_equal(dao.get_shape("other", "shape_2"), masks["shape_2"] == 1)
+    assert list(dao.get_shapes("other", ["shape_2"]).keys()) == ["shape_2"]
@@ -0,0 +1,98 @@
+import io
+import os
+import zipfile
+from typing import Iterator
+
+import pytest
+
+from flask_app import create_app
+from hmse_utils.processing.local_fs_configuration import local_paths, path_constants
+from server import cookie_utils
+from simulations.projects import project_dao, project_archive
+from simulations.projects.project_archive import ArchiveSelection, PrebuiltArchive
+from simulations.projects.project_dao_local import ProjectDaoLocal
+from simulations.projects.project_dao_minio import ProjectDaoMinio
+from simulations.projects.project_metadata import ProjectMetadata
+
+PROJECT_ID = "project"
+SIMULATION_FILES = ["modflow/model/model.hds", "results/period_00000.npy",
+                    "sim_step_0/modflow/model/model.hds", "sim_step_1/modflow/model/model.hds"]
+ARCHIVE = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def dao(tmp_path, monkeypatch) -> ProjectDaoLocal:
+    monkeypatch.setattr(path_constants, "__WORKSPACE_PATH", str(tmp_path))
+    dao = ProjectDaoLocal()
+    monkeypatch.setattr(project_dao, "__INSTANCE", dao)
+    dao.save_or_update_metadata(ProjectMetadata(PROJECT_ID, "Project", finished=True))
+    for file in SIMULATION_FILES:
+        file_path = os.path.join(local_paths.get_simulation_dir(PROJECT_ID), *file.split('/'))
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as handle:
+            handle.write(file * 1000)
+    return dao
+
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config.update({"TESTING": True})
+    test_client = app.test_client()
+    test_client.set_cookie("localhost", cookie_utils.COOKIE_NAME, "test-cookie-uuid")
+    return test_client
+
+
+@pytest.mark.parametrize(
+    "selection,expected_files",
+    [
+        (ArchiveSelection(), SIMULATION_FILES),
+        (ArchiveSelection(steps=[]), SIMULATION_FILES[:2]),
+        (ArchiveSelection(include_final=False, steps=[1]), SIMULATION_FILES[3:])
+    ]
+)
+def test_streamed_archive_of_selection(dao: ProjectDaoLocal, selection: ArchiveSelection, expected_files):
+    archive_content = b''.join(project_archive.stream_zip(dao.get_archive_entries(PROJECT_ID, selection)))
+
+    with zipfile.ZipFile(io.BytesIO(archive_content)) as archive:
+        assert archive.namelist() == expected_files
+        for file in expected_files:
+            assert archive.read(file).decode() == file * 1000
+
+
+def test_download_streamed_archive(dao: ProjectDaoLocal, client):
+    response = client.get(f"/project/{PROJECT_ID}/download?steps=0")
+
+    assert response.status_code == 200 and response.content_length is None
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        assert archive.namelist() == SIMULATION_FILES[:3]
+
+
+def test_download_prebuilt_archive_range(dao: ProjectDaoLocal, client, monkeypatch):
+    def read_range(start: int, stop: int) -> Iterator[bytes]:
+        yield ARCHIVE[start:stop]
+
+    monkeypatch.setattr(dao, "get_prebuilt_archive",
+                        lambda project_id: PrebuiltArchive(size=len(ARCHIVE), etag="archive-v1", read_range=read_range))
+
+    response = client.get(f"/project/{PROJECT_ID}/download", headers={"Range": "bytes=100-"})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes 100-{len(ARCHIVE) - 1}/{len(ARCHIVE)}"
+    assert response.data == ARCHIVE[100:]
+
+    response = client.get(f"/project/{PROJECT_ID}/download", headers={"Range": "bytes=100-", "If-Range": '"v0"'})
+    assert response.status_code == 200 and response.data == ARCHIVE
+
+    response = client.get(f"/project/{PROJECT_ID}/download",
+                          headers={"Range": "bytes=100-", "If-Range": '"archive-v1"'})
+    assert response.status_code == 206 and response.data == ARCHIVE[100:]
+
+    for if_range in ("Wed, 21 Oct 2015 07:28:00 GMT", 'W/"archive-v1"'):
+        response = client.get(f"/project/{PROJECT_ID}/download", headers={"Range": "bytes=100-", "If-Range": if_range})
+        assert response.status_code == 200 and response.data == ARCHIVE
+
+
+def test_minio_archive_without_final_results_is_empty():
+    entries = ProjectDaoMinio().get_archive_entries(PROJECT_ID, ArchiveSelection(include_final=False, steps=[]))
+
+    assert list(entries) == []
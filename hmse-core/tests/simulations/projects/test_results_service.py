@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+import pytest
+from werkzeug.exceptions import BadRequest
+
+from hmse_utils.processing.local_fs_configuration import local_paths, path_constants
+from hmse_utils.processing.modflow import modflow_heads, modflow_results
+from hmse_utils.processing.modflow.modflow_heads import SINGLE_PRECISION_HEADER
+from simulations.projects import project_dao, results_service
+from simulations.projects.project_dao_local import ProjectDaoLocal
+from simulations.projects.project_metadata import ProjectMetadata
+
+PROJECT_ID = "project"
+NROW, NCOL = 600, 520
+HEADS = np.arange(NROW * NCOL, dtype=np.float32).reshape(NROW, NCOL) / 100
+HEADS[0, 0] = -1e30  # dry cell
+
+
+@pytest.fixture
+def manifest(tmp_path, monkeypatch):
+    monkeypatch.setattr(path_constants, "__WORKSPACE_PATH", str(tmp_path))
+    dao = ProjectDaoLocal()
+    monkeypatch.setattr(project_dao, "__INSTANCE", dao)
+    dao.save_or_update_metadata(ProjectMetadata(PROJECT_ID, "Project", finished=True))
+
+    head_file_path = os.path.join(tmp_path, "model.hds")
+    with open(head_file_path, 'wb') as fp:
+        np.array((1, 1, 1.0, 1.0, "            HEAD", NCOL, NROW, 1), dtype=SINGLE_PRECISION_HEADER).tofile(fp)
+        HEADS.tofile(fp)
+    with modflow_heads.open_head_file(head_file_path) as head_file:
+        modflow_results.export_heads(head_file, local_paths.get_output_dir(PROJECT_ID))
+    return results_service.get_results_manifest(PROJECT_ID)
+
+
+def test_full_resolution_tile(manifest):
+    tile = results_service.select_heads_tile(manifest, period=0, layer=0, bbox=(10, 20, 30, 50))
+    result = results_service.read_heads_tile(PROJECT_ID, manifest, tile)
+
+    assert result["factor"] == 1 and result["bbox"] == [10, 20, 30, 50]
+    np.testing.assert_allclose(result["heads"], np.round(HEADS[10:30, 20:50], 4))
+
+
+def test_downsampled_tile(manifest):
+    assert [level.factor for level in manifest.levels] == [1, 2, 4]
+
+    tile = results_service.select_heads_tile(manifest, period=0, layer=0, size=200)
+    result = results_service.read_heads_tile(PROJECT_ID, manifest, tile)
+
+    assert result["factor"] == 4 and result["bbox"] == [0, 0, NROW, NCOL]
+    heads = result["heads"]
+    assert np.array(heads).shape == (150, 130)
+    # Dry cell skipped in the average
+    assert heads[0][0] == pytest.approx(np.mean(HEADS[:4, :4].ravel()[1:]), abs=1e-3)
+    assert heads[1][2] == pytest.approx(np.mean(HEADS[4:8, 8:12]), abs=1e-3)
+
+
+def test_invalid_tile(manifest):
+    with pytest.raises(BadRequest):
+        results_service.select_heads_tile(manifest, period=1, layer=0)
+    with pytest.raises(BadRequest):
+        results_service.select_heads_tile(manifest, period=0, layer=0, bbox=(0, 0, NROW + 1, 10))
@@ -0,0 +1,65 @@
+import hashlib
+import os
+import threading
+
+import pytest
+
+from simulations.projects.minio_controller import transfer_manager
+
+BUCKET = "bucket"
+PREFIX = "projects/project/modflow/model"
+
+
+class RecordingClient:
+    def __init__(self):
+        self.uploaded = {}
+        self.lock = threading.Lock()
+
+    def fput_object(self, bucket, object_name, file_path, part_size, num_parallel_uploads):
+        with self.lock:
+            self.uploaded[object_name] = (bucket, file_path, part_size)
+
+
+@pytest.fixture
+def model_dir(tmp_path) -> str:
+    files = {"model.nam": b"nam", "model.dis": b"dis" * 100, os.path.join("out", "model.hds"): bytes(1000)}
+    for file, content in files.items():
+        file_path = os.path.join(tmp_path, file)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'wb') as handle:
+            handle.write(content)
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize("size,part_size,part_count", [(0, 64, 1), (100, 64, 2), (128, 64, 2), (64, 64, 1)])
+def test_local_etag_matches_multipart_etag(tmp_path, monkeypatch, size: int, part_size: int, part_count: int):
+    monkeypatch.setattr(transfer_manager, "HASH_CHUNK_SIZE", 24)
+    content = bytes(i % 251 for i in range(size))
+    path = os.path.join(tmp_path, "file")
+    with open(path, 'wb') as handle:
+        handle.write(content)
+
+    if part_count == 1:
+        expected = hashlib.md5(content).hexdigest()
+    else:
+        digests = b''.join(hashlib.md5(content[start:start + part_size]).digest()
+                           for start in range(0, size, part_size))
+        expected = f"{hashlib.md5(digests).hexdigest()}-{part_count}"
+    assert transfer_manager.get_local_etag(path, part_size=part_size) == expected
+
+
+def test_unchanged_objects_skipped(model_dir: str):
+    tasks = transfer_manager.get_upload_tasks(model_dir, PREFIX)
+    assert sorted(task.object_name for task in tasks) == [f"{PREFIX}/model.dis", f"{PREFIX}/model.nam",
+                                                          f"{PREFIX}/out/model.hds"]
+    existing_etags = {f"{PREFIX}/model.dis": f'"{hashlib.md5(b"dis" * 100).hexdigest()}"',
+                      f"{PREFIX}/model.nam": "outdated"}
+
+    client = RecordingClient()
+    stats = transfer_manager.upload_files(client, BUCKET, tasks, existing_etags)
+
+    assert sorted(client.uploaded) == [f"{PREFIX}/model.nam", f"{PREFIX}/out/model.hds"]
+    assert all(part_size == transfer_manager.MULTIPART_PART_SIZE for _, _, part_size in client.uploaded.values())
+    assert (stats.file_count, stats.uploaded_count, stats.skipped_count) == (3, 2, 1)
+    assert stats.uploaded_bytes == 1003
+    assert stats.get_throughput() > 0
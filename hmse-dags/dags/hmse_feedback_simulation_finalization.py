@@ -119,7 +119,9 @@ def taskflow():
         arguments=[
             "--action",
             "extract_output_to_json",
-            *create_project_metadata_args_for_cli()
+            *create_project_metadata_args_for_cli(),
+            "--json_downsample",
+            "{{ var.value.get('hmse_results_json_downsample', '1') }}"
         ],
         labels={"simulation": "extract-modflow-results-to-json"},
         task_id="extract-to-json",
@@ -138,6 +140,7 @@ def taskflow():
             f"cd /workspace/{project_metadata['project_id']}",
             f"zip -FSr output.zip simulation",
             f"mc cp output.zip {project_metadata['project_minio_location']}/output.zip",
+            f"mc cp --recursive simulation/results/ {project_metadata['project_minio_location']}/results/",
         ],
         labels={"simulation": "upload-results"},
         task_id="upload-simulation-results",
@@ -219,7 +219,10 @@ def taskflow():
         arguments=[
             "--action",
             "initialize_feedback_iteration",
-            *create_project_metadata_args_for_cli()
+            *create_project_metadata_args_for_cli(),
+            "--preparation_workers",
+            "{{ var.value.get('hmse_preparation_workers', '0') }}",
+            "{{ '--binary_heads' if var.value.get('hmse_binary_heads', 'false') == 'true' else '--no_binary_heads' }}"
         ],
         labels={"simulation": "iteration-files"},
         task_id="initialize-feedback-iteration",
@@ -239,7 +242,9 @@ def taskflow():
         arguments=[
             "--action",
             "transfer_data_from_modflow_to_hydrus",
-            *create_project_metadata_args_for_cli()
+            *create_project_metadata_args_for_cli(),
+            "--kh_tolerance",
+            "{{ var.value.get('hmse_kh_tolerance', '1e-6') }}"
         ],
         labels={"simulation": "transfer-modflow-results-to-hydrus"},
         task_id="transfer-modflow-results-to-hydrus",
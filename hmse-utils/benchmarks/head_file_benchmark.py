@@ -0,0 +1,62 @@
+"""
+Compare reading the last time step of Modflow heads from a formatted (.fhd) and a binary (.hds) head file
+of a synthetic grid.
+
+Usage: python benchmarks/head_file_benchmark.py [--nlay 2] [--nrow 1000] [--ncol 1000] [--steps 5]
+"""
+import os
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+from flopy.utils import FormattedHeadFile
+
+from hmse_utils.processing.modflow.modflow_heads import BinaryHeadFile, SINGLE_PRECISION_HEADER
+
+
+def write_head_files(work_dir: str, nlay: int, nrow: int, ncol: int, steps: int):
+    rng = np.random.default_rng(0)
+    binary_path = os.path.join(work_dir, "model.hds")
+    formatted_path = os.path.join(work_dir, "model.fhd")
+    with open(binary_path, 'wb') as binary_fp, open(formatted_path, 'w') as formatted_fp:
+        for step in range(steps):
+            totim = float(step + 1)
+            for layer in range(nlay):
+                heads = rng.uniform(0.0, 100.0, (nrow, ncol)).astype(np.float32)
+                np.array((step + 1, 1, totim, totim, "            HEAD", ncol, nrow, layer + 1),
+                         dtype=SINGLE_PRECISION_HEADER).tofile(binary_fp)
+                heads.tofile(binary_fp)
+
+                formatted_fp.write(f"{step + 1:5d}{1:5d}{totim:15.7E}{totim:15.7E}{'HEAD':>16s}"
+                                   f"{ncol:6d}{nrow:6d}{layer + 1:6d} (10F12.4)\n")
+                for row in heads:
+                    for start in range(0, ncol, 10):
+                        formatted_fp.write("".join(f"{value:12.4f}" for value in row[start:start + 10]) + "\n")
+    return formatted_path, binary_path
+
+
+def measure(label: str, path: str, open_file) -> np.ndarray:
+    start = time.perf_counter()
+    head_file = open_file(path)
+    heads = head_file.get_data()
+    head_file.close()
+    elapsed = time.perf_counter() - start
+    print(f"{label:>10}: {elapsed:8.3f} s, file size: {os.path.getsize(path) / 2 ** 20:8.1f} MiB")
+    return heads
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Formatted vs binary head file reading benchmark")
+    parser.add_argument("--nlay", type=int, default=2)
+    parser.add_argument("--nrow", type=int, default=1000)
+    parser.add_argument("--ncol", type=int, default=1000)
+    parser.add_argument("--steps", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"Writing {args.steps} time steps of {args.nlay}x{args.nrow}x{args.ncol} grid...")
+        fhd_path, hds_path = write_head_files(tmp_dir, args.nlay, args.nrow, args.ncol, args.steps)
+        formatted_heads = measure("formatted", fhd_path, lambda path: FormattedHeadFile(path, precision="single"))
+        binary_heads = measure("binary", hds_path, BinaryHeadFile)
+        np.testing.assert_allclose(formatted_heads, binary_heads, atol=1e-4)
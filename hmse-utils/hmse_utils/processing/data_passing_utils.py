@@ -1,20 +1,22 @@
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import Dict, Union, List
+from typing import Dict, Union, List, Optional
 
 import flopy
 import numpy as np
-import pandas as pd
 from flopy.modflow import Modflow
 
 import phydrus as ph
 from hmse_utils.processing import unit_manager
 from hmse_utils.processing.hydrus import hydrus_utils, hydrus_model_management
-from hmse_utils.processing.hydrus.file_processing.selector_in_processor import SelectorInProcessor
+from hmse_utils.processing.hydrus.file_processing.selector_in import get_selector_in
+from hmse_utils.processing.hydrus.hydrus_conductivity import DEFAULT_TABLE_TOLERANCE
 from hmse_utils.processing.local_fs_configuration import local_paths
 from hmse_utils.processing.local_fs_configuration.feedback_loop_file_management import find_previous_simulation_step_dir
 from hmse_utils.processing.local_fs_configuration.path_constants import get_feedback_loop_hydrus_name
-from hmse_utils.processing.modflow import modflow_utils, modflow_model_management
+from hmse_utils.processing.local_fs_configuration.shape_store import ShapeStore
+from hmse_utils.processing.modflow import modflow_utils, modflow_model_management, modflow_recharge_utils
 from hmse_utils.processing.modflow.modflow_metadata import ModflowMetadata
 from hmse_utils.processing.unit_manager import LengthUnit
 from hmse_utils.processing.weather_data import weather_util
@@ -30,66 +32,82 @@ def recharge_from_hydrus_to_modflow(project_id: str,
                                     modflow_metadata: ModflowMetadata,
                                     spin_up: int,
                                     model_to_shapes_mapping: Dict[Union[str, float], List[str]],
-                                    feedback_loop: bool = False) -> None:
+                                    feedback_loop: bool = False) -> Dict[str, float]:
     """
     @param model_to_shapes_mapping: Hydrus model/float value -> list of shape_id assigned to that shape
+    @return: Time (in seconds) spent on assembling recharge for each Hydrus model/float value
     """
 
     prev_step_dir = find_previous_simulation_step_dir(project_id)
     if prev_step_dir is not None:
         spin_up = 0
 
-    for mapping_val, assigned_shape_ids in model_to_shapes_mapping.items():
-        __process_hydrus_shapes(assigned_shape_ids, mapping_val, modflow_metadata,
-                                project_id, spin_up)
-
-
-def __process_hydrus_shapes(assigned_shape_ids, mapping_val, modflow_metadata: ModflowMetadata,
-                            project_id: str, spin_up: int):
     modflow_path = local_paths.get_modflow_model_path(project_id, modflow_metadata.modflow_id, simulation_mode=True)
     nam_file = modflow_utils.scan_for_modflow_file(modflow_path)
 
-    # load MODFLOW model - basic info and RCH package
+    # load MODFLOW model - basic info and RCH package (once for all mappings)
     modflow_model = flopy.modflow.Modflow.load(nam_file, model_ws=modflow_path,
                                                load_only=["rch"],
                                                forgive=True)
+    recharge_stack = __read_recharge_stack(modflow_model)
+    shape_store = ShapeStore(local_paths.get_shapes_dir(project_id))
 
-    shapes_for_model = [np.load(local_paths.get_shape_path(project_id, shape_id))
-                        for shape_id in assigned_shape_ids]
+    time_measurements = {}
+    for mapping_val, assigned_shape_ids in model_to_shapes_mapping.items():
+        mapping_start = time.time()
+        __process_hydrus_shapes(recharge_stack, modflow_model, shape_store, assigned_shape_ids, mapping_val,
+                                modflow_metadata, project_id, spin_up)
+        time_measurements[str(mapping_val)] = time.time() - mapping_start
+
+    __write_recharge_stack(modflow_model, recharge_stack)
+    logger.info(f"Recharge assembly time measurements for project {project_id}: {time_measurements}")
+    return time_measurements
 
-    sum_v_bot = __get_sum_vbot(project_id, mapping_val, modflow_metadata.grid_unit, spin_up)
-    __recharge_update(modflow_model, shapes_for_model, sum_v_bot)
 
-    new_recharge = modflow_model.rch.rech
+def __read_recharge_stack(modflow_model: Modflow) -> np.ndarray:
+    logger.debug(f"Reading modflow RCH package into memory")
+    return np.array([modflow_model.rch.rech[idx].array for idx in range(modflow_model.nper)])
+
+
+def __write_recharge_stack(modflow_model: Modflow, recharge_stack: np.ndarray) -> None:
+    logger.debug(f"Writing modflow RCH package")
     rch_package = modflow_model.get_package("rch")  # get the RCH package
     # generate and save new RCH (same properties, different recharge)
     flopy.modflow.ModflowRch(modflow_model, nrchop=rch_package.nrchop, ipakcb=rch_package.ipakcb,
-                             rech=new_recharge,
+                             rech={idx: recharge_stack[idx] for idx in range(modflow_model.nper)},
                              irch=rch_package.irch).write_file(check=False)
 
 
+def __process_hydrus_shapes(recharge_stack: np.ndarray, modflow_model: Modflow, shape_store: ShapeStore,
+                            assigned_shape_ids, mapping_val, modflow_metadata: ModflowMetadata,
+                            project_id: str, spin_up: int):
+    mask = shape_store.get_union_mask(assigned_shape_ids)
+
+    sum_v_bot = __get_sum_vbot(project_id, mapping_val, modflow_metadata.grid_unit, spin_up)
+    __recharge_update(recharge_stack, modflow_model, mask, sum_v_bot)
+
+
 def __get_sum_vbot(project_id: str,
                    mapping_val: Union[str, float],
                    modflow_unit: LengthUnit,
-                   spin_up: int) -> Union[pd.DataFrame, float]:
+                   spin_up: int) -> Union[np.ndarray, float]:
     logger.debug(f"Getting sum(vBot) for project {project_id} using hydrus model/static value: {mapping_val}")
     hydrus_model_dir = local_paths.get_hydrus_model_path(project_id,
                                                          hydrus_id=mapping_val,
                                                          simulation_mode=True)
 
     selector_path = hydrus_utils.find_hydrus_file_path(hydrus_model_dir, file_name="selector.in")
-    with open(selector_path, 'r', encoding='utf-8') as fp:
-        hydrus_len_unit = SelectorInProcessor(fp).get_model_length()
+    hydrus_len_unit = get_selector_in(selector_path).get_model_length()
 
     if isinstance(mapping_val, str):
         hydrus_recharge_path = hydrus_utils.find_hydrus_file_path(hydrus_model_dir, file_name="t_level.out")
-        sum_v_bot = ph.read.read_tlevel(path=hydrus_recharge_path)['sum(vBot)']
+        sum_v_bot = ph.read_tlevel_columns(path=hydrus_recharge_path, usecols=["sum(vBot)"])["sum(vBot)"]
 
         # calc difference for each day (excluding spin_up period)
         if spin_up >= len(sum_v_bot):
             raise DataProcessingException('Spin up is longer than hydrus model time')
 
-        sum_v_bot = sum_v_bot.iloc[spin_up:]
+        sum_v_bot = sum_v_bot[spin_up:]
 
         modflow_unit_coef = unit_manager.convert_units(value=1,
                                                        from_unit=hydrus_len_unit,
@@ -102,71 +120,92 @@ def __get_sum_vbot(project_id: str,
         raise DataProcessingException("Unknown mapping in simulation!")
 
 
-def __recharge_update(modflow_model: Modflow, shapes_for_model: List[np.ndarray], sum_v_bot: pd.Series):
-    logger.debug(f"Updating modflow RCH package")
-    shape = np.amax(shapes_for_model, axis=0) if len(shapes_for_model) > 1 else shapes_for_model[0]
-    mask = (shape == 1)  # Frontend sets explicitly 1
-    stress_period_duration_iter = 0
-
-    for idx, stress_period_duration in enumerate(modflow_model.modeltime.perlen):
-        if not modflow_model.modeltime.steady_state[idx]:
-            # modflow rch array for given stress period
-            recharge_modflow_array = modflow_model.rch.rech[idx].array
-
-            # add calculated hydrus average sum(vBot) to modflow recharge array
-            period_duration = int(stress_period_duration)
-            final_sp_recharge = sum_v_bot.values[stress_period_duration_iter + period_duration - 1]
-            starting_sp_recharge = sum_v_bot.values[stress_period_duration_iter]
-            avg_sum_v_bot = (final_sp_recharge - starting_sp_recharge) / stress_period_duration
-            recharge_modflow_array[mask] = avg_sum_v_bot
+def __recharge_update(recharge_stack: np.ndarray, modflow_model: Modflow, mask: np.ndarray,
+                      sum_v_bot: Union[np.ndarray, float]):
+    logger.debug(f"Updating recharge for stress periods in memory")
+    transient_periods, starts, ends = modflow_recharge_utils.get_transient_period_bounds(
+        modflow_model.modeltime.perlen,
+        modflow_model.modeltime.steady_state
+    )
+    sum_v_bot = np.asarray(sum_v_bot, dtype=float)
+    if sum_v_bot.ndim > 0 and len(ends) > 0 and ends[-1] >= len(sum_v_bot):
+        raise DataProcessingException("Hydrus model time is shorter than Modflow simulation time")
 
-            # save calculated recharge to modflow model
-            modflow_model.rch.rech[idx] = recharge_modflow_array
-
-            # update stress period duration iterator
-            stress_period_duration_iter += period_duration
+    # average hydrus sum(vBot) difference for every transient stress period at once
+    period_recharge = modflow_recharge_utils.calculate_average_recharge(sum_v_bot, modflow_model.modeltime.perlen,
+                                                                        transient_periods, starts, ends)
+    modflow_recharge_utils.scatter_recharge(recharge_stack, mask, transient_periods, period_recharge)
 
 
 def transfer_water_level_to_hydrus(project_id: str,
                                    hydrus_id: str,
                                    modflow_metadata: ModflowMetadata,
                                    shape_id: str,
-                                   use_modflow_results: bool = True) -> None:
-    logger.debug(f"Transferring water level to hydrus model {hydrus_id} in project: {project_id}")
-    compound_hydrus_id = get_feedback_loop_hydrus_name(hydrus_id, shape_id)
-    water_avg_depth = modflow_model_management.get_avg_water_depth_for_shape(project_id=project_id,
-                                                                             modflow_id=modflow_metadata.modflow_id,
-                                                                             shape_id=shape_id,
-                                                                             use_modflow_results=use_modflow_results)
-    hydrus_profile_depth, hydrus_depth_unit = hydrus_model_management.get_profile_depth(project_id,
-                                                                                        hydrus_id=compound_hydrus_id)
-    water_avg_depth = unit_manager.convert_units(water_avg_depth,
-                                                 from_unit=modflow_metadata.grid_unit,
-                                                 to_unit=hydrus_depth_unit)
-
-    hydrus_model_management.update_bottom_pressure(project_id=project_id,
-                                                   hydrus_id=compound_hydrus_id,
-                                                   hydrus_profile_depth=hydrus_profile_depth,
-                                                   water_avg_depth=water_avg_depth,
-                                                   hydrus_unit=hydrus_depth_unit)
+                                   use_modflow_results: bool = True,
+                                   kh_tolerance: Optional[float] = DEFAULT_TABLE_TOLERANCE) -> None:
+    transfer_water_levels_to_hydrus(project_id, {shape_id: hydrus_id}, modflow_metadata, use_modflow_results,
+                                    kh_tolerance)
+
+
+def transfer_water_levels_to_hydrus(project_id: str,
+                                    shapes_to_hydrus: Dict[str, str],
+                                    modflow_metadata: ModflowMetadata,
+                                    use_modflow_results: bool = True,
+                                    kh_tolerance: Optional[float] = DEFAULT_TABLE_TOLERANCE) -> None:
+    """
+    @param shapes_to_hydrus: shape_id -> (plain) ID of Hydrus model assigned to that shape
+    @param kh_tolerance: Max relative error of conductivity interpolated from K(h) tables while recalculating
+                         pressure profiles, None to calculate conductivity exactly
+    """
+    logger.debug(f"Transferring water level to hydrus models of {len(shapes_to_hydrus)} shapes "
+                 f"in project: {project_id}")
+    water_avg_depths = modflow_model_management.get_avg_water_depth_for_shapes(
+        project_id=project_id,
+        modflow_id=modflow_metadata.modflow_id,
+        shape_ids=list(shapes_to_hydrus.keys()),
+        use_modflow_results=use_modflow_results
+    )
+
+    water_levels = {}
+    for shape_id, hydrus_id in shapes_to_hydrus.items():
+        compound_hydrus_id = get_feedback_loop_hydrus_name(hydrus_id, shape_id)
+        hydrus_profile_depth, hydrus_depth_unit = hydrus_model_management.get_profile_depth(
+            project_id,
+            hydrus_id=compound_hydrus_id
+        )
+        water_avg_depth = unit_manager.convert_units(water_avg_depths[shape_id],
+                                                     from_unit=modflow_metadata.grid_unit,
+                                                     to_unit=hydrus_depth_unit)
+        water_levels[compound_hydrus_id] = (hydrus_profile_depth, water_avg_depth, hydrus_depth_unit)
+
+    hydrus_model_management.update_bottom_pressures(project_id=project_id, water_levels=water_levels,
+                                                    kh_tolerance=kh_tolerance)
 
 
 def pass_weather_data_to_hydrus(project_id: str, start_date: str, spin_up: int,
                                 modflow_metadata: ModflowMetadata,
                                 hydrus_to_weather_mapping: Dict[str, str]) -> None:
+    data_start_date = datetime.strptime(start_date, "%Y-%m-%d") - timedelta(days=spin_up) if start_date else None
+    record_count = 1 + modflow_metadata.get_duration() + spin_up
+
+    # Models mapped to the same weather file and using the same length unit share adapted data
+    weather_data_cache = {}
     for hydrus_id, weather_id in hydrus_to_weather_mapping.items():
         hydrus_path = local_paths.get_hydrus_model_path(project_id, hydrus_id, simulation_mode=True)
         selector_in_path = hydrus_utils.find_hydrus_file_path(hydrus_path, file_name="selector.in")
-
-        with open(selector_in_path, 'r', encoding='utf-8') as fp:
-            hydrus_length_unit = SelectorInProcessor(fp).get_model_length()
-
-        data_start_date = datetime.strptime(start_date, "%Y-%m-%d") - timedelta(days=spin_up) if start_date else None
-        raw_data = weather_util.read_weather_csv(local_paths.get_weather_model_path(project_id, weather_id),
-                                                 start_date=data_start_date,
-                                                 record_count=1 + modflow_metadata.get_duration() + spin_up)
-        ready_data = weather_util.adapt_data(raw_data, hydrus_length_unit)
-        success = weather_util.add_weather_to_hydrus_model(hydrus_path, ready_data)
+        hydrus_length_unit = get_selector_in(selector_in_path).get_model_length()
+
+        cache_key = (weather_id, data_start_date, record_count, hydrus_length_unit)
+        if cache_key not in weather_data_cache:
+            raw_data = weather_util.read_weather_csv(local_paths.get_weather_model_path(project_id, weather_id),
+                                                     start_date=data_start_date,
+                                                     record_count=record_count,
+                                                     cache_path=local_paths.get_weather_cache_path(project_id,
+                                                                                                   weather_id))
+            weather_data_cache[cache_key] = weather_util.adapt_data(raw_data, hydrus_length_unit)
+        else:
+            logger.debug(f"Reusing weather data {weather_id} for hydrus model {hydrus_id}")
+        success = weather_util.add_weather_to_hydrus_model(hydrus_path, weather_data_cache[cache_key])
         if not success:
             raise DataProcessingException(f"Error occurred during applying "
                                           f"weather file {weather_id} to hydrus model {hydrus_id}")
@@ -1,18 +1,34 @@
 import logging
 from dataclasses import dataclass
-from typing import Tuple
+from typing import Dict, Optional, Sequence, Tuple
 
-from hmse_utils.processing.hydrus.file_processing.line_by_line_processor import LineByLineProcessor
+from hmse_utils.processing.hydrus.file_processing.line_by_line_processor import LineByLineProcessor, HydrusTable
 
 logger = logging.getLogger(__name__)
 
+DATA_CONTENT_LINE_PREFIX = "tAtm"
+TOTAL_RECORD_COUNT_LINE_PREFIX = "MaxAL"
+
 
 @dataclass
 class AtmosphInProcessor(LineByLineProcessor):
 
     def truncate_file(self, data_start_idx: int, data_count: int) -> Tuple[float, float]:
         logger.debug(f"Truncating data in Atmosph.in file preserving {data_count} records starting from {data_start_idx}")
-        return self._perform_truncating(data_content_line_prefix="tAtm",
-                                        total_record_count_line_prefix="MaxAL",
+        return self._perform_truncating(data_content_line_prefix=DATA_CONTENT_LINE_PREFIX,
+                                        total_record_count_line_prefix=TOTAL_RECORD_COUNT_LINE_PREFIX,
                                         data_start_idx=data_start_idx,
                                         data_count=data_count)
+
+    def substitute_columns(self, column_values: Dict[int, Sequence],
+                           header_substitutions: Optional[Dict[str, str]] = None) -> Tuple[float, float]:
+        logger.debug(f"Substituting columns {list(column_values.keys())} of data in Atmosph.in file")
+        return self._rewrite_table(data_content_line_prefix=DATA_CONTENT_LINE_PREFIX,
+                                   total_record_count_line_prefix=TOTAL_RECORD_COUNT_LINE_PREFIX,
+                                   column_values=column_values,
+                                   header_substitutions=header_substitutions)
+
+    def read_table(self) -> HydrusTable:
+        logger.debug("Parsing data in Atmosph.in file")
+        return self._read_table(data_content_line_prefix=DATA_CONTENT_LINE_PREFIX,
+                                total_record_count_line_prefix=TOTAL_RECORD_COUNT_LINE_PREFIX)
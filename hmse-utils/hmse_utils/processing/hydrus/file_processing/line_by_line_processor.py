@@ -1,13 +1,22 @@
+import logging
 from abc import abstractmethod
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 from hmse_utils.processing import julian_calendar_manager
 from hmse_utils.processing.hydrus.file_processing.text_file_processor import TextFileProcessor
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class LineByLineProcessor(TextFileProcessor):
+    """
+    Processor of Hydrus input files consisting of a header followed by a table of time records
+    (e.g. ATMOSPH.IN, METEO.IN).
+    """
 
     @abstractmethod
     def truncate_file(self, data_start_idx: int, data_count: int):
@@ -15,60 +24,139 @@ class LineByLineProcessor(TextFileProcessor):
 
     def _perform_truncating(self, data_content_line_prefix: str, total_record_count_line_prefix: str,
                             data_start_idx: int, data_count: int) -> Tuple[float, float]:
-        lines, data_start, total_data_records = self._preparse_lines(data_content_line_prefix,
-                                                                     total_record_count_line_prefix)
-
-        return self._save_sliced_data(lines, data_start, total_data_records, data_start_idx, data_count)
-
-    def _preparse_lines(self, data_content_line_prefix: str,
-                        total_record_count_line_prefix: str) -> Tuple[List[str], int, int]:
+        return self._rewrite_table(data_content_line_prefix, total_record_count_line_prefix,
+                                   record_start_idx=data_start_idx,
+                                   record_count=data_count,
+                                   rewrite_time_to_julian=True)
+
+    def _rewrite_table(self, data_content_line_prefix: str, total_record_count_line_prefix: str,
+                       column_values: Optional[Dict[int, Sequence]] = None,
+                       record_start_idx: int = 0,
+                       record_count: Optional[int] = None,
+                       rewrite_time_to_julian: bool = False,
+                       header_substitutions: Optional[Dict[str, str]] = None) -> Tuple[float, float]:
+        """
+        Rewrite the file in a single pass: header and lines after the table are copied verbatim,
+        only the kept table records are formatted (column-wise).
+
+        @param data_content_line_prefix: Prefix of the last line before table records
+        @param total_record_count_line_prefix: Prefix of the line followed by the number of table records
+        @param column_values: Column index -> new values of the column for consecutive kept records,
+                              records without new values are dropped
+        @param record_start_idx: Index of the first table record to keep
+        @param record_count: Number of table records to keep, all records from record_start_idx if not specified
+        @param rewrite_time_to_julian: Renumber time column to consecutive julian days, starting from the day
+                                       of the first kept record
+        @param header_substitutions: Text contained by a header line -> replacement of the line following it
+        @return: Time of the first and the last kept table record
+        """
+        table = self._read_table(data_content_line_prefix, total_record_count_line_prefix, header_substitutions)
+        content, first_time, last_time = table.render(column_values=column_values,
+                                                      record_start_idx=record_start_idx,
+                                                      record_count=record_count,
+                                                      rewrite_time_to_julian=rewrite_time_to_julian)
+        self._reset()
+        self.fp.write(content)
+        self.fp.truncate()
+        self._reset()
+        return first_time, last_time
+
+    def _read_table(self, data_content_line_prefix: str, total_record_count_line_prefix: str,
+                    header_substitutions: Optional[Dict[str, str]] = None) -> "HydrusTable":
+        """
+        @param data_content_line_prefix: Prefix of the last line before table records
+        @param total_record_count_line_prefix: Prefix of the line followed by the number of table records
+        @param header_substitutions: Text contained by a header line -> replacement of the line following it
+        @return: File split into header, table records (split into columns) and footer
+        """
+        self._reset()
+        header_substitutions = header_substitutions or {}
+        header = []
+        lines = iter(self.fp.readline, '')
 
-        lines = self.fp.readlines()
+        # Header - kept verbatim except substituted lines
         total_data_records = 0
-        data_start = -1
-
-        for i, line in enumerate(lines):
+        for line in lines:
+            header.append(line)
             stripped = line.strip()
             if stripped.startswith(total_record_count_line_prefix):
-                total_data_records = int(lines[i + 1].strip().split()[0].strip())
+                count_line = next(lines)
+                total_data_records = int(count_line.split()[0])
+                header.append(count_line)
             elif stripped.startswith(data_content_line_prefix):
-                data_start = i + 1
-
+                break
+            else:
+                substitution = next((new_line for text, new_line in header_substitutions.items() if text in line),
+                                    None)
+                if substitution is not None:
+                    next(lines)
+                    header.append(substitution)
+
+        # Table
+        records = []
+        footer = []
+        for _ in range(total_data_records):
+            line = next(lines, None)
+            if line is None:
+                break
+            if line.strip().startswith("end"):
+                footer.append(line)
+                break
+            records.append(line.split())
+
+        # Footer - kept verbatim
+        footer.extend(lines)
         self._reset()
-        return lines, data_start, total_data_records
-
-    def _save_sliced_data(self, lines: List[str], data_start: int, total_data_records: int,
-                          record_start_idx: int, record_count: int) -> Tuple[float, float]:
-
-        new_data_start = data_start + record_start_idx
-        new_data_end = new_data_start + record_count
-        data_end = data_start + total_data_records
-
-        first_original_data_time_step = None
-        first_data_time_step = None
-        last_data_time_step = None
-
-        lines_to_write = []
-        julian_iter = -1
-
-        for i, line in enumerate(lines):
-            # Truncate only data section of a file
-            if i < data_start or new_data_start <= i < new_data_end or i >= data_end:
-                to_write = line
-                if new_data_start <= i < new_data_end:
-                    if first_original_data_time_step is None:
-                        first_original_data_time_step = float(line.split()[0])
-                        julian_iter = julian_calendar_manager.float_to_julian(first_original_data_time_step)
-                    if julian_iter >= 0:
-                        to_write = TextFileProcessor._substitute_in_line(line, julian_iter, col_idx=0)
-                        julian_iter += 1
-                    cur_time_step = float(to_write.split()[0])
-                    if first_data_time_step is None:
-                        first_data_time_step = cur_time_step
-                    last_data_time_step = cur_time_step
-                lines_to_write.append(to_write)
+        return HydrusTable(header=header, records=records, footer=footer)
 
-        self.fp.truncate()
-        self.fp.writelines(lines_to_write)
-        self._reset()
-        return first_data_time_step, last_data_time_step
+
+@dataclass
+class HydrusTable:
+    """
+    Hydrus input file with a table of time records, parsed once so that any slice of the table
+    can be written without parsing the file again.
+    """
+    header: List[str]
+    records: List[List[str]]
+    footer: List[str]
+
+    def render(self, column_values: Optional[Dict[int, Sequence]] = None,
+               record_start_idx: int = 0,
+               record_count: Optional[int] = None,
+               rewrite_time_to_julian: bool = False) -> Tuple[str, Optional[float], Optional[float]]:
+        """
+        @param column_values: Column index -> new values of the column for consecutive kept records,
+                              records without new values are dropped
+        @param record_start_idx: Index of the first table record to keep
+        @param record_count: Number of table records to keep, all records from record_start_idx if not specified
+        @param rewrite_time_to_julian: Renumber time column to consecutive julian days, starting from the day
+                                       of the first kept record
+        @return: File content, time of the first and the last kept table record
+        """
+        record_end_idx = None if record_count is None else record_start_idx + record_count
+        # Kept records are copied, so the parsed table can be rendered many times
+        records = [list(record) for record in self.records[record_start_idx:record_end_idx]]
+        formatted_records = HydrusTable.__format_records(records, column_values or {}, rewrite_time_to_julian)
+        content = ''.join(self.header) + ''.join(formatted_records) + ''.join(self.footer)
+
+        if not records:
+            return content, None, None
+        return content, float(records[0][0]), float(records[-1][0])
+
+    @staticmethod
+    def __format_records(records: List[List[str]], column_values: Dict[int, Sequence],
+                         rewrite_time_to_julian: bool) -> List[str]:
+        # Records are modified in place, new values of each column are formatted at once
+        if column_values:
+            del records[min(len(values) for values in column_values.values()):]
+        for col_idx, values in column_values.items():
+            for record, value in zip(records, np.asarray(values)[:len(records)].astype(str)):
+                record[col_idx] = value
+
+        if rewrite_time_to_julian and records:
+            first_julian_day = julian_calendar_manager.float_to_julian(float(records[0][0]))
+            julian_days = np.char.mod("%.3f", first_julian_day + np.arange(len(records)))
+            for record, julian_day in zip(records, julian_days):
+                record[0] = julian_day
+
+        return ['\t'.join(record) + '\n' for record in records]
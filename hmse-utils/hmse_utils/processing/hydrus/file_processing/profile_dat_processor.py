@@ -1,7 +1,7 @@
 import logging
 import re
 from dataclasses import dataclass
-from typing import List, Union
+from typing import List, Tuple, Union
 
 from hmse_utils.processing.hydrus.file_processing.text_file_processor import TextFileProcessor
 
@@ -37,49 +37,30 @@ class ProfileDatProcessor(TextFileProcessor):
         """
 
         logger.debug("Swapping pressure in the Hydrus profile")
-        self._reset()
-
-        swap_only_at_bottom = isinstance(pressure, float)
-        profile_info_entries = None
-        profile_info_counter = 0
-
-        # line_start_ptr = self.fp.tell()
-        # line = self.fp.readline()
-        # while line:
-        #     line = line.replace('\t', ' ')
-        #     if profile_info_entries is None and 'x' in line and 'h' in line:
-        #         profile_info_entries = int(line.strip().split()[0])
-        #     elif profile_info_entries is not None and profile_info_counter < profile_info_entries:
-        #
-        #         if swap_only_at_bottom and profile_info_counter == profile_info_entries - 1:
-        #             new_line = TextFileProcessor._substitute_in_line(line, pressure, col_idx=2)
-        #             self.fp.seek(line_start_ptr)
-        #             self.fp.write(new_line)
-        #             break
-        #         elif not swap_only_at_bottom:
-        #             new_line = TextFileProcessor._substitute_in_line(line, pressure[profile_info_counter], col_idx=2)
-        #             self.fp.seek(line_start_ptr)
-        #             self.fp.write(new_line)
-        #         profile_info_counter += 1
-        #
-        #     line_start_ptr = self.fp.tell()
-        #     line = self.fp.readline()
-        lines = self.fp.readlines()
-        for i, line in enumerate(lines):
-            if profile_info_entries is None and 'x' in line and 'h' in line:
-                profile_info_entries = int(line.strip().split()[0])
-            elif profile_info_entries is not None and profile_info_counter < profile_info_entries:
+        lines, node_line_indices = self.read_node_lines()
 
-                if swap_only_at_bottom and profile_info_counter == profile_info_entries - 1:
-                    new_line = TextFileProcessor._substitute_in_line(line, pressure, col_idx=2)
-                    lines[i] = new_line
-                    break
-                elif not swap_only_at_bottom:
-                    new_line = TextFileProcessor._substitute_in_line(line, pressure[profile_info_counter],
-                                                                     col_idx=2)
-                    lines[i] = new_line
-                profile_info_counter += 1
+        if isinstance(pressure, float):
+            if node_line_indices:
+                lines[node_line_indices[-1]] = TextFileProcessor._substitute_in_line(lines[node_line_indices[-1]],
+                                                                                     pressure, col_idx=2)
+        else:
+            for node_idx, i in enumerate(node_line_indices):
+                lines[i] = TextFileProcessor._substitute_in_line(lines[i], pressure[node_idx], col_idx=2)
 
         self._reset()
         self.fp.writelines(lines)
         self.fp.truncate()
+
+    def read_node_lines(self) -> Tuple[List[str], List[int]]:
+        """
+        @return: All lines of the file and indices of the profile node lines (pressure head in the third column)
+        """
+        self._reset()
+        lines = self.fp.readlines()
+        node_line_indices = []
+        for i, line in enumerate(lines):
+            if 'x' in line and 'h' in line:
+                node_count = int(line.strip().split()[0])
+                node_line_indices = list(range(i + 1, min(i + 1 + node_count, len(lines))))
+                break
+        return lines, node_line_indices
@@ -0,0 +1,144 @@
+import copy
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from hmse_utils.processing.hydrus.file_processing.text_file_processor import TextFileProcessor
+from hmse_utils.processing.hydrus.hydrus_number_formatter import FloatFormat
+from hmse_utils.processing.unit_manager import LengthUnit
+
+logger = logging.getLogger(__name__)
+
+# Absolute path -> (mtime_ns, size, parsed file)
+__SELECTOR_IN_CACHE: Dict[str, Tuple[int, int, "SelectorIn"]] = {}
+
+
+@dataclass
+class SelectorIn:
+    """
+    SELECTOR.IN file parsed once into memory. Getters do not touch the file, edits are kept pending
+    until save() writes the whole file at once.
+    """
+    path: str
+    lines: List[str]
+    length_unit_line_idx: Optional[int] = None
+    i_model_line_idx: Optional[int] = None
+    material_line_indices: List[int] = field(default_factory=list)
+    mpl_line_indices: List[int] = field(default_factory=list)
+    t_init_line_indices: List[int] = field(default_factory=list)
+    t_print_line_indices: List[int] = field(default_factory=list)
+    pending_edits: Dict[int, str] = field(default_factory=dict)
+
+    @staticmethod
+    def read(path: str) -> "SelectorIn":
+        logger.debug(f"Parsing SELECTOR.IN file under path: {path}")
+        with open(path, 'r', encoding='utf-8') as fp:
+            selector_in = SelectorIn(path=path, lines=fp.readlines())
+        selector_in.__index_lines()
+        return selector_in
+
+    def get_model_length(self) -> LengthUnit:
+        if self.length_unit_line_idx is None:
+            raise RuntimeError(f"Invalid data, no length unit found file ({self.path})")
+        return LengthUnit(self.lines[self.length_unit_line_idx].strip().split()[0].strip())
+
+    def get_waterflow_config(self) -> Dict:
+        if self.i_model_line_idx is None:
+            raise RuntimeError(f"Invalid data, water iModel specified in ({self.path})")
+        return {"iModel": int(self.lines[self.i_model_line_idx].strip().split()[0].strip())}
+
+    def get_material_properties(self) -> pd.DataFrame:
+        if not self.material_line_indices:
+            raise RuntimeError(f"Invalid data, no material properties found in ({self.path})")
+        return pd.DataFrame([list(map(float, self.lines[i].strip().split())) for i in self.material_line_indices])
+
+    def update_initial_and_final_step(self, first_day: float, last_day: float) -> None:
+        logger.debug(f"Updating initial and final steps in Hydrus profile to respectively: {first_day}, {last_day}")
+        for i in self.mpl_line_indices:
+            self.pending_edits[i] = TextFileProcessor._substitute_in_line(self.__get_line(i), 1, col_idx=7,
+                                                                          float_format=FloatFormat.INTEGER)
+        for i in self.t_init_line_indices:
+            new_line = TextFileProcessor._substitute_in_line(self.__get_line(i), first_day - 0.1, col_idx=0)
+            self.pending_edits[i] = TextFileProcessor._substitute_in_line(new_line, last_day - 0.1, col_idx=1)
+        for i in self.t_print_line_indices:
+            self.pending_edits[i] = TextFileProcessor._substitute_in_line(self.__get_line(i), last_day - 0.1,
+                                                                          col_idx=0)
+
+    def save(self, path: Optional[str] = None) -> None:
+        """
+        Write the file with all pending edits applied in a single write.
+
+        @param path: Path of the written file, path of the parsed file if not specified
+        """
+        path = path or self.path
+        logger.debug(f"Saving SELECTOR.IN file with {len(self.pending_edits)} edits under path: {path}")
+        self.lines = [line if line.endswith('\n') else line + '\n'
+                      for line in (self.pending_edits.get(i, line) for i, line in enumerate(self.lines))]
+        self.pending_edits = {}
+        self.path = path
+        with open(path, 'w', encoding='utf-8') as fp:
+            fp.writelines(self.lines)
+
+    def copy(self) -> "SelectorIn":
+        # Lines are never modified in place, only replaced on save
+        selector_in = copy.copy(self)
+        selector_in.pending_edits = dict(self.pending_edits)
+        return selector_in
+
+    def __get_line(self, i: int) -> str:
+        return self.pending_edits.get(i, self.lines[i])
+
+    def __index_lines(self) -> None:
+        block = None
+        materials_found = False
+        for i, line in enumerate(self.lines):
+            stripped = line.strip()
+            block_match = re.search(r'(?<=BLOCK )[A-G](?=:)', line)
+            if block_match:
+                block = block_match[0].strip()
+                continue
+
+            if "LUnit" in line and self.length_unit_line_idx is None:
+                self.length_unit_line_idx = i + 1
+            if block == "B" and "Model" in line and self.i_model_line_idx is None:
+                self.i_model_line_idx = i + 1
+            if block == "B" and "thr" in line and not materials_found:
+                materials_found = True
+                self.material_line_indices = self.__find_material_lines(i + 1)
+            if stripped.endswith("MPL"):
+                self.mpl_line_indices.append(i + 1)
+            elif stripped.startswith("tInit"):
+                self.t_init_line_indices.append(i + 1)
+            elif stripped.startswith("TPrint(1)"):
+                self.t_print_line_indices.append(i + 1)
+
+    def __find_material_lines(self, first_line_idx: int) -> List[int]:
+        material_lines = []
+        for i in range(first_line_idx, len(self.lines)):
+            if not re.search(r'\d', self.lines[i]) or re.search(r'(?<=BLOCK )[A-G](?=:)', self.lines[i]):
+                break
+            material_lines.append(i)
+        return material_lines
+
+
+def get_selector_in(path: str) -> SelectorIn:
+    """
+    Get parsed SELECTOR.IN file. Files are parsed once and cached until their modification time changes,
+    so the file of a reference model is parsed once for all models created from it.
+
+    @param path: Path to the SELECTOR.IN file
+    @return: Parsed file (a private copy, so pending edits are not shared between callers)
+    """
+    cache_key = os.path.abspath(path)
+    stat = os.stat(path)
+    cached = __SELECTOR_IN_CACHE.get(cache_key)
+    if cached is None or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+        selector_in = SelectorIn.read(path)
+        __SELECTOR_IN_CACHE[cache_key] = (stat.st_mtime_ns, stat.st_size, selector_in)
+    else:
+        selector_in = cached[2]
+    return selector_in.copy()
@@ -0,0 +1,177 @@
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Tuple, Optional, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TABLE_TOLERANCE = 1e-6  # max relative error of interpolated conductivity
+TABLE_MAX_SUCTION = 1e4  # suction (-h) range covered by tables; pressure solver stays within -1000
+__TABLE_INITIAL_POINTS = 1024
+__TABLE_MAX_POINTS = 2 ** 20
+
+
+# Credit to Adam Szymkiewicz
+def calculate_conductivity(h: np.ndarray, materials: np.ndarray) -> np.ndarray:
+    """
+    Hydraulic conductivity as a function of pressure head (iModel 0 - van Genuchten),
+    required to modify Hydrus pressure profiles after each Modflow period.
+
+    @param h: Pressure heads
+    @param materials: Van Genuchten parameters (thr, ths, alpha, n, ks, l) matching h, shape (..., 6)
+    @return: Hydraulic conductivity for each pressure head
+    """
+    ks = np.maximum(materials[..., 4], 1.0e-37)
+    return np.where(h < get_saturation_head(materials), __calculate_unsaturated_conductivity(h, materials), ks)
+
+
+def get_saturation_head(materials: np.ndarray) -> np.ndarray:
+    """
+    @param materials: Van Genuchten parameters (thr, ths, alpha, n, ks, l), shape (..., 6)
+    @return: Pressure head above which conductivity is equal to ks (Hk, equal to Hs for iModel 0)
+    """
+    alfa = materials[..., 2]
+    n = materials[..., 3]
+    m = 1.0 - 1.0 / n
+    qees = 0.999999999999999  # min((Qs - Qa) / (Qm - Qa), 0.999999999999999) for Qm = Qs, Qa = Qr
+    return -1.0 / alfa * (qees ** (-1.0 / m) - 1.0) ** (1.0 / n)
+
+
+# Credit to Adam Szymkiewicz
+def __calculate_unsaturated_conductivity(h: np.ndarray, materials: np.ndarray) -> np.ndarray:
+    alfa = materials[..., 2]
+    n = materials[..., 3]
+    ks = np.maximum(materials[..., 4], 1.0e-37)
+    b_par = materials[..., 5]
+    p_par = 2
+    m = 1.0 - 1.0 / n
+
+    h_min = -1.0e300 ** (1.0 / n) / np.maximum(alfa, 1.0)
+    hh = np.maximum(h, h_min)
+
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        qee = (1.0 + (-alfa * hh) ** n) ** (-m)
+        ffq = 1.0 - (1.0 - qee ** (1.0 / m)) ** (-m)
+        ffq = np.where(ffq <= 0.0, m * qee ** (1.0 / m), ffq)
+        return np.maximum(ks * qee ** b_par * ffq ** p_par, 1.0e-37)
+
+
+@dataclass
+class ExactConductivity:
+    """
+    Conductivity of a material set calculated exactly on every lookup.
+    """
+    materials: np.ndarray
+
+    def lookup(self, h: np.ndarray, material_idx: np.ndarray) -> np.ndarray:
+        """
+        @param h: Pressure heads
+        @param material_idx: Index of material (row of the material set) for each pressure head
+        @return: Hydraulic conductivity for each pressure head
+        """
+        return calculate_conductivity(h, self.materials[material_idx])
+
+
+@dataclass
+class ConductivityTable:
+    """
+    Dense K(h) tables of a material set - log10(K) sampled on a uniform log10(-h) grid for every material,
+    between the saturation head and TABLE_MAX_SUCTION. Lookups interpolate linearly in log-log space;
+    pressure heads outside the table range are calculated exactly.
+    """
+    materials: np.ndarray
+    saturation_heads: np.ndarray
+    log_suction_start: np.ndarray
+    log_suction_step: np.ndarray
+    log_conductivity: np.ndarray
+
+    def lookup(self, h: np.ndarray, material_idx: np.ndarray) -> np.ndarray:
+        """
+        @param h: Pressure heads
+        @param material_idx: Index of material (row of the material set) for each pressure head
+        @return: Hydraulic conductivity for each pressure head
+        """
+        ks = np.maximum(self.materials[material_idx, 4], 1.0e-37)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            position = (np.log10(-h) - self.log_suction_start[material_idx]) / self.log_suction_step[material_idx]
+        is_saturated = h >= self.saturation_heads[material_idx]
+        in_table = ~is_saturated & (position <= self.log_conductivity.shape[1] - 1)
+
+        position = np.clip(np.where(in_table, position, 0.0), 0.0, self.log_conductivity.shape[1] - 1)
+        left_idx = np.minimum(position.astype(int), self.log_conductivity.shape[1] - 2)
+        fraction = position - left_idx
+        log_k = (self.log_conductivity[material_idx, left_idx] * (1 - fraction)
+                 + self.log_conductivity[material_idx, left_idx + 1] * fraction)
+
+        conductivity = np.where(is_saturated, ks, 10.0 ** log_k)
+        out_of_table = ~is_saturated & ~in_table
+        if np.any(out_of_table):
+            conductivity[out_of_table] = calculate_conductivity(h[out_of_table],
+                                                                self.materials[material_idx[out_of_table]])
+        return conductivity
+
+
+ConductivityModel = Union[ExactConductivity, ConductivityTable]
+
+
+def get_conductivity_model(materials: np.ndarray, tolerance: Optional[float] = DEFAULT_TABLE_TOLERANCE) \
+        -> ConductivityModel:
+    """
+    @param materials: Van Genuchten parameters (thr, ths, alpha, n, ks, l) of each material, shape (materials, 6)
+    @param tolerance: Max relative error of interpolated conductivity, None for exact conductivity
+    @return: Conductivity tables of the material set or exact conductivity if tolerance is not specified
+    """
+    if tolerance is None:
+        return ExactConductivity(np.asarray(materials, dtype=float))
+    return get_conductivity_table(materials, tolerance)
+
+
+def get_conductivity_table(materials: np.ndarray, tolerance: float = DEFAULT_TABLE_TOLERANCE) -> ConductivityTable:
+    """
+    Get K(h) tables for a material set (e.g. read from SELECTOR.IN). Tables are built once per material set
+    and tolerance, then reused by all profiles (shapes) and iterations sharing the same materials.
+
+    @param materials: Van Genuchten parameters (thr, ths, alpha, n, ks, l) of each material, shape (materials, 6)
+    @param tolerance: Max relative error of interpolated conductivity
+    @return: Conductivity tables of the material set
+    """
+    material_rows = tuple(tuple(float(param) for param in material[:6]) for material in np.asarray(materials))
+    return __build_conductivity_table(material_rows, tolerance)
+
+
+@lru_cache(maxsize=32)
+def __build_conductivity_table(material_rows: Tuple[Tuple[float, ...], ...], tolerance: float) -> ConductivityTable:
+    logger.debug(f"Building conductivity tables for {len(material_rows)} materials (tolerance: {tolerance})")
+    materials = np.array(material_rows, dtype=float).reshape(-1, 6)
+    saturation_heads = get_saturation_head(materials)
+    log_suction_start = np.log10(-saturation_heads)
+    log_suction_stop = np.maximum(np.log10(TABLE_MAX_SUCTION), log_suction_start)
+
+    point_count = __TABLE_INITIAL_POINTS
+    while True:
+        log_suction = np.linspace(log_suction_start, log_suction_stop, point_count, axis=1)
+        log_conductivity = np.log10(__calculate_unsaturated_conductivity(-10.0 ** log_suction,
+                                                                         materials[:, np.newaxis, :]))
+        max_error = __get_max_interpolation_error(log_suction, log_conductivity, materials)
+        if max_error <= tolerance or point_count >= __TABLE_MAX_POINTS:
+            break
+        point_count = 2 * (point_count - 1) + 1  # keeps previous grid points
+
+    logger.debug(f"Conductivity tables built with {point_count} points per material "
+                 f"(max relative error: {max_error})")
+    return ConductivityTable(materials=materials,
+                             saturation_heads=saturation_heads,
+                             log_suction_start=log_suction_start,
+                             log_suction_step=(log_suction_stop - log_suction_start) / (point_count - 1),
+                             log_conductivity=log_conductivity)
+
+
+def __get_max_interpolation_error(log_suction: np.ndarray, log_conductivity: np.ndarray,
+                                  materials: np.ndarray) -> float:
+    # Interpolation error is the largest between grid points
+    mid_log_suction = 0.5 * (log_suction[:, :-1] + log_suction[:, 1:])
+    interpolated = 10.0 ** (0.5 * (log_conductivity[:, :-1] + log_conductivity[:, 1:]))
+    exact = __calculate_unsaturated_conductivity(-10.0 ** mid_log_suction, materials[:, np.newaxis, :])
+    return float(np.max(np.abs(interpolated - exact) / exact))
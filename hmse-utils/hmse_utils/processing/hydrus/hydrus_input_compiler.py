@@ -0,0 +1,208 @@
+import logging
+import os
+import shutil
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import phydrus as ph
+
+from hmse_utils.processing.hydrus import hydrus_utils
+from hmse_utils.processing.hydrus.file_processing.atmosph_in_processor import AtmosphInProcessor
+from hmse_utils.processing.hydrus.file_processing.line_by_line_processor import HydrusTable
+from hmse_utils.processing.hydrus.file_processing.meteo_in_processor import MeteoInProcessor
+from hmse_utils.processing.hydrus.file_processing.profile_dat_processor import ProfileDatProcessor, \
+    UnknownProfileDatFormat
+from hmse_utils.processing.hydrus.file_processing.selector_in import SelectorIn, get_selector_in
+from hmse_utils.processing.hydrus.hydrus_utils import HYDRUS_PROPER_CASING
+
+logger = logging.getLogger(__name__)
+
+# Outputs of the previous iteration passed to the next one (read by the pressure calculator)
+PREVIOUS_ITERATION_OUTPUTS = ("nod_inf.out", "t_level.out")
+
+# Absolute path of reference model dir -> (state of model files, parsed model)
+__TEMPLATE_CACHE: Dict[str, Tuple[Tuple, "HydrusModelTemplate"]] = {}
+
+
+@dataclass
+class ProfileDatTemplate:
+    """
+    PROFILE.DAT file with node lines split around the pressure head column, so new initial pressure
+    is written without parsing the file again.
+    """
+    content: bytes
+    lines: List[str]
+    node_line_indices: List[int]
+    node_line_prefixes: List[str]
+    node_line_suffixes: List[str]
+
+    @staticmethod
+    def read(path: str) -> "ProfileDatTemplate":
+        with open(path, 'rb') as fp:
+            content = fp.read()
+        with open(path, 'r', encoding='utf-8') as fp:
+            lines, node_line_indices = ProfileDatProcessor(fp).read_node_lines()
+
+        node_line_prefixes = []
+        node_line_suffixes = []
+        for i in node_line_indices:
+            cols = lines[i].split()
+            if len(cols) < 3:
+                raise UnknownProfileDatFormat(f"No pressure head in profile node line: {lines[i]} (file: {path})")
+            node_line_prefixes.append('\t'.join(cols[:2]) + '\t')
+            node_line_suffixes.append(''.join('\t' + col for col in cols[3:]) + '\n')
+
+        return ProfileDatTemplate(content=content,
+                                  lines=lines,
+                                  node_line_indices=node_line_indices,
+                                  node_line_prefixes=node_line_prefixes,
+                                  node_line_suffixes=node_line_suffixes)
+
+    def render(self, pressure: List[float]) -> str:
+        """
+        @param pressure: Pressure head for each profile node (ordered from the top)
+        @return: File content with pressure head of every node replaced
+        """
+        lines = list(self.lines)
+        for i, prefix, node_pressure, suffix in zip(self.node_line_indices, self.node_line_prefixes,
+                                                    pressure, self.node_line_suffixes):
+            lines[i] = f"{prefix}{node_pressure:.3f}{suffix}"
+        return ''.join(lines)
+
+
+@dataclass
+class HydrusModelTemplate:
+    """
+    Reference Hydrus model parsed once into memory. Models for consecutive simulation steps are emitted
+    directly from it - only the initial pressure, the time range and the weather slice differ between them.
+    """
+    ref_hydrus_dir: str
+    static_files: Dict[str, bytes]
+    static_dirs: List[str]
+    output_file_names: Dict[str, str]
+    profile_dat_name: str
+    profile_dat: ProfileDatTemplate
+    atmosph_in_name: str
+    atmosph_in: HydrusTable
+    meteo_in_name: str
+    meteo_in: HydrusTable
+    selector_in_name: str
+    selector_in: SelectorIn
+
+    @staticmethod
+    def read(ref_hydrus_dir: str) -> "HydrusModelTemplate":
+        logger.debug(f"Parsing Hydrus model template from reference model: {ref_hydrus_dir}")
+        file_names = {name.lower(): name for name in os.listdir(ref_hydrus_dir)
+                      if os.path.isfile(os.path.join(ref_hydrus_dir, name))}
+        # Subdirectories are copied unchanged from the reference model on every emit
+        static_dirs = sorted(name for name in os.listdir(ref_hydrus_dir)
+                             if os.path.isdir(os.path.join(ref_hydrus_dir, name)))
+        for required_file in ("profile.dat", "atmosph.in", "meteo.in", "selector.in"):
+            if required_file not in file_names:
+                raise FileNotFoundError(f"No {HYDRUS_PROPER_CASING[required_file]} file in Hydrus model: "
+                                        f"{ref_hydrus_dir}")
+
+        with open(os.path.join(ref_hydrus_dir, file_names["atmosph.in"]), 'r', encoding='utf-8') as fp:
+            atmosph_in = AtmosphInProcessor(fp).read_table()
+        with open(os.path.join(ref_hydrus_dir, file_names["meteo.in"]), 'r', encoding='utf-8') as fp:
+            meteo_in = MeteoInProcessor(fp).read_table()
+
+        # Hydrus outputs of the reference model are not copied, each step creates them anew
+        static_files = {}
+        for lowercase_name, name in file_names.items():
+            if lowercase_name.endswith(".out") or lowercase_name in ("profile.dat", "atmosph.in",
+                                                                     "meteo.in", "selector.in"):
+                continue
+            with open(os.path.join(ref_hydrus_dir, name), 'rb') as fp:
+                static_files[name] = fp.read()
+
+        return HydrusModelTemplate(
+            ref_hydrus_dir=ref_hydrus_dir,
+            static_files=static_files,
+            static_dirs=static_dirs,
+            output_file_names={output: file_names.get(output, HYDRUS_PROPER_CASING[output])
+                               for output in PREVIOUS_ITERATION_OUTPUTS},
+            profile_dat_name=file_names["profile.dat"],
+            profile_dat=ProfileDatTemplate.read(os.path.join(ref_hydrus_dir, file_names["profile.dat"])),
+            atmosph_in_name=file_names["atmosph.in"],
+            atmosph_in=atmosph_in,
+            meteo_in_name=file_names["meteo.in"],
+            meteo_in=meteo_in,
+            selector_in_name=file_names["selector.in"],
+            selector_in=get_selector_in(os.path.join(ref_hydrus_dir, file_names["selector.in"]))
+        )
+
+    def emit(self, new_hydrus_dir: str, first_step: int, step_count: int,
+             prev_hydrus_dir: Optional[str] = None) -> None:
+        """
+        Write Hydrus model for a simulation step.
+
+        @param new_hydrus_dir: Directory of the new model, replaced if it already exists
+        @param first_step: Index of the first weather record of the step
+        @param step_count: Number of weather records of the step
+        @param prev_hydrus_dir: Model of the previous step providing initial pressure, None for the first step
+        """
+        logger.debug(f"Emitting Hydrus model {new_hydrus_dir} from template {self.ref_hydrus_dir} "
+                     f"and previous model: {prev_hydrus_dir}")
+        atmosph_in, atmo_first_jul_day, atmo_last_jul_day = self.atmosph_in.render(record_start_idx=first_step,
+                                                                                  record_count=step_count,
+                                                                                  rewrite_time_to_julian=True)
+        meteo_in, meteo_first_jul_day, meteo_last_jul_day = self.meteo_in.render(record_start_idx=first_step,
+                                                                                record_count=step_count,
+                                                                                rewrite_time_to_julian=True)
+        if atmo_first_jul_day != meteo_first_jul_day or atmo_last_jul_day != meteo_last_jul_day:
+            raise RuntimeError(f"ATMPOSH.IN and METEO.IN record ranges do not match: "
+                               f"ATMOSPH.IN: ({atmo_first_jul_day}, {atmo_last_jul_day}) "
+                               f"METEO.IN: ({meteo_first_jul_day}, {meteo_last_jul_day})")
+
+        shutil.rmtree(new_hydrus_dir, ignore_errors=True)
+        os.makedirs(new_hydrus_dir)
+        for name, content in self.static_files.items():
+            with open(os.path.join(new_hydrus_dir, name), 'wb') as fp:
+                fp.write(content)
+        for name in self.static_dirs:
+            shutil.copytree(os.path.join(self.ref_hydrus_dir, name), os.path.join(new_hydrus_dir, name))
+
+        # Initial conditions from previous iteration
+        if prev_hydrus_dir:
+            prev_outputs = {output: hydrus_utils.find_hydrus_file_path(prev_hydrus_dir, file_name=output)
+                            for output in PREVIOUS_ITERATION_OUTPUTS}
+            for output, prev_output_path in prev_outputs.items():
+                shutil.copyfile(prev_output_path, os.path.join(new_hydrus_dir, self.output_file_names[output]))
+            _, prev_nod_inf = ph.read_nod_inf_block(prev_outputs["nod_inf.out"])
+            with open(os.path.join(new_hydrus_dir, self.profile_dat_name), 'w', encoding='utf-8') as fp:
+                fp.write(self.profile_dat.render(prev_nod_inf["Head"].tolist()))
+        else:
+            with open(os.path.join(new_hydrus_dir, self.profile_dat_name), 'wb') as fp:
+                fp.write(self.profile_dat.content)
+
+        with open(os.path.join(new_hydrus_dir, self.atmosph_in_name), 'w', encoding='utf-8') as fp:
+            fp.write(atmosph_in)
+        with open(os.path.join(new_hydrus_dir, self.meteo_in_name), 'w', encoding='utf-8') as fp:
+            fp.write(meteo_in)
+
+        selector_in = self.selector_in.copy()
+        selector_in.update_initial_and_final_step(meteo_first_jul_day, meteo_last_jul_day)
+        selector_in.save(os.path.join(new_hydrus_dir, self.selector_in_name))
+
+
+def get_model_template(ref_hydrus_dir: str) -> HydrusModelTemplate:
+    """
+    Get parsed reference Hydrus model. Models are parsed once and cached until any of their files changes,
+    so all shapes and steps simulated with a reference model share a single template.
+
+    @param ref_hydrus_dir: Directory of the reference Hydrus model
+    @return: Template of the reference model
+    """
+    cache_key = os.path.abspath(ref_hydrus_dir)
+    model_state = tuple(sorted((name, stat.st_mtime_ns, stat.st_size)
+                               for name, stat in __stat_model_files(ref_hydrus_dir)))
+    cached = __TEMPLATE_CACHE.get(cache_key)
+    if cached is None or cached[0] != model_state:
+        __TEMPLATE_CACHE[cache_key] = (model_state, HydrusModelTemplate.read(ref_hydrus_dir))
+    return __TEMPLATE_CACHE[cache_key][1]
+
+
+def __stat_model_files(hydrus_dir: str) -> List[Tuple[str, os.stat_result]]:
+    with os.scandir(hydrus_dir) as entries:
+        return [(entry.name, entry.stat()) for entry in entries if entry.is_file() or entry.is_dir()]
@@ -1,18 +1,16 @@
 import json
 import logging
 import os
-import shutil
-from typing import Dict, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 import hmse_utils.processing.hydrus.hydrus_utils as hydrus_utils
-from hmse_utils.processing.hydrus.file_processing.atmosph_in_processor import AtmosphInProcessor
-from hmse_utils.processing.hydrus.file_processing.meteo_in_processor import MeteoInProcessor
-from hmse_utils.processing.hydrus.file_processing.nod_inf_out_processor import NodInfOutProcessor
+from hmse_utils.processing.hydrus import hydrus_input_compiler
 from hmse_utils.processing.hydrus.file_processing.profile_dat_processor import ProfileDatProcessor
-from hmse_utils.processing.hydrus.file_processing.selector_in_processor import SelectorInProcessor
-from hmse_utils.processing.hydrus.hydrus_profile_pressure_calculator import calculate_pressure_for_hydrus_model, \
+from hmse_utils.processing.hydrus.file_processing.selector_in import get_selector_in
+from hmse_utils.processing.hydrus.hydrus_conductivity import DEFAULT_TABLE_TOLERANCE
+from hmse_utils.processing.hydrus.hydrus_profile_pressure_calculator import calculate_pressure_for_hydrus_models, \
     calculate_hydrostatic_pressure
-from hmse_utils.processing.hydrus.hydrus_utils import HYDRUS_PROPER_CASING
 from hmse_utils.processing.local_fs_configuration import local_paths
 from hmse_utils.processing.local_fs_configuration.feedback_loop_file_management import find_previous_simulation_step_dir
 from hmse_utils.processing.unit_manager import LengthUnit
@@ -20,46 +18,124 @@ from hmse_utils.processing.unit_manager import LengthUnit
 logger = logging.getLogger(__name__)
 
 
+class HydrusModelPreparationError(RuntimeError):
+
+    def __init__(self, errors: Dict[str, str]):
+        """
+        @param errors: compound_hydrus_id -> error that occurred while preparing the model
+        """
+        super().__init__(f"Failed to prepare {len(errors)} Hydrus models for next iteration: "
+                         + "; ".join(f"{hydrus_id}: {error}" for hydrus_id, error in errors.items()))
+        self.errors = errors
+
+
 def prepare_model_for_next_iteration(project_id: str, ref_hydrus_id: str, compound_hydrus_id: str, spin_up: int):
-    logger.debug(f"Preparing Hydrus model {ref_hydrus_id} for next iteration in simulation project: {project_id}")
-    ref_hydrus_dir = local_paths.get_hydrus_model_path(project_id, ref_hydrus_id,
-                                                       simulation_mode=True, simulation_ref=True)
+    prepare_models_for_next_iteration(project_id, [(ref_hydrus_id, compound_hydrus_id)], spin_up)
+
+
+def prepare_models_for_next_iteration(project_id: str, hydrus_ids: List[Tuple[str, str]], spin_up: int,
+                                      workers: Optional[int] = 1) -> None:
+    """
+    Prepare Hydrus models of many shapes for the next iteration. Previous simulation step and project metadata
+    are resolved once for all models, models are prepared by a pool of processes.
+
+    @param project_id: ID of the simulated project
+    @param hydrus_ids: (reference hydrus_id, compound hydrus_id) of every model to prepare
+    @param spin_up: Spin-up length in days
+    @param workers: Number of processes preparing models (None - one per CPU available to the process,
+                    1 - no process pool)
+    @raise HydrusModelPreparationError: Errors of all models that could not be prepared
+    """
+    logger.debug(f"Preparing {len(hydrus_ids)} Hydrus models for next iteration in simulation project: "
+                 f"{project_id} (workers: {workers})")
     prev_sim_step_dir = find_previous_simulation_step_dir(project_id)
 
-    prev_hydrus_dir = os.path.join(prev_sim_step_dir, 'hydrus',
-                                   compound_hydrus_id) if prev_sim_step_dir else None  # FIXME: kind of bad
-    new_hydrus_dir = local_paths.get_hydrus_model_path(project_id, compound_hydrus_id, simulation_mode=True)
-
     metadata_path = local_paths.get_project_metadata_path(project_id)
     with open(metadata_path, 'r', encoding='utf-8') as fp:
         project_metadata = json.load(fp)
 
     step = 0 if not prev_sim_step_dir else int(prev_sim_step_dir.split('_')[-1]) + 1
-    __create_temporary_model(ref_hydrus_dir=ref_hydrus_dir,
-                             prev_hydrus_dir=prev_hydrus_dir,
-                             new_hydrus_dir=new_hydrus_dir,
-                             project_metadata=project_metadata,
-                             step=step,
-                             spin_up=spin_up)
+    first_step, step_count = __get_hydrus_time_range(project_metadata, step, spin_up)
+
+    models = {}
+    errors = {}
+    for ref_hydrus_id, compound_hydrus_id in hydrus_ids:
+        ref_hydrus_dir = local_paths.get_hydrus_model_path(project_id, ref_hydrus_id,
+                                                           simulation_mode=True, simulation_ref=True)
+        prev_hydrus_dir = os.path.join(prev_sim_step_dir, 'hydrus',
+                                       compound_hydrus_id) if prev_sim_step_dir else None  # FIXME: kind of bad
+        new_hydrus_dir = local_paths.get_hydrus_model_path(project_id, compound_hydrus_id, simulation_mode=True)
+        try:
+            # Parses the template early, so errors of the reference model are reported for every shape using it
+            # (worker processes reuse the cached template only with the fork start method)
+            hydrus_input_compiler.get_model_template(ref_hydrus_dir)
+            models[compound_hydrus_id] = (ref_hydrus_dir, prev_hydrus_dir, new_hydrus_dir, first_step, step_count)
+        except Exception as e:
+            errors[compound_hydrus_id] = f"{type(e).__name__}: {e}"
+
+    workers = min(workers or __get_available_cpu_count(), max(len(models), 1))
+    if workers == 1:
+        for compound_hydrus_id, model_args in models.items():
+            try:
+                __prepare_model(*model_args)
+            except Exception as e:
+                errors[compound_hydrus_id] = f"{type(e).__name__}: {e}"
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {compound_hydrus_id: executor.submit(__prepare_model, *model_args)
+                       for compound_hydrus_id, model_args in models.items()}
+            for compound_hydrus_id, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    errors[compound_hydrus_id] = f"{type(e).__name__}: {e}"
+
+    if errors:
+        raise HydrusModelPreparationError(errors)
 
 
 def update_bottom_pressure(project_id: str,
                            hydrus_id: str,
                            hydrus_profile_depth: float,
                            water_avg_depth: float,
-                           hydrus_unit: LengthUnit) -> None:
-    logger.debug(f"Updating bottom pressure for Hydrus model {hydrus_id} in simulation project {project_id}")
-    model_dir = local_paths.get_hydrus_model_path(project_id, hydrus_id, simulation_mode=True)
+                           hydrus_unit: LengthUnit,
+                           kh_tolerance: Optional[float] = DEFAULT_TABLE_TOLERANCE) -> None:
+    update_bottom_pressures(project_id, {hydrus_id: (hydrus_profile_depth, water_avg_depth, hydrus_unit)},
+                            kh_tolerance)
+
+
+def update_bottom_pressures(project_id: str,
+                            water_levels: Dict[str, Tuple[float, float, LengthUnit]],
+                            kh_tolerance: Optional[float] = DEFAULT_TABLE_TOLERANCE) -> None:
+    """
+    Update pressure in many Hydrus models at once (pressure profiles are recalculated in a single batch).
+
+    @param project_id: ID of the simulated project
+    @param water_levels: hydrus_id -> (Hydrus profile depth, average water depth, Hydrus length unit)
+    @param kh_tolerance: Max relative error of conductivity interpolated from K(h) tables,
+                         None to calculate conductivity exactly
+    """
+    logger.debug(f"Updating bottom pressure for Hydrus models {list(water_levels.keys())} "
+                 f"in simulation project {project_id}")
+    model_dirs = {hydrus_id: local_paths.get_hydrus_model_path(project_id, hydrus_id, simulation_mode=True)
+                  for hydrus_id in water_levels.keys()}
 
     if not find_previous_simulation_step_dir(project_id):
-        new_pressure_in_profile = calculate_hydrostatic_pressure(model_dir, water_avg_depth, hydrus_unit)
+        new_pressures = {hydrus_id: calculate_hydrostatic_pressure(model_dirs[hydrus_id], water_avg_depth, hydrus_unit)
+                         for hydrus_id, (_, water_avg_depth, hydrus_unit) in water_levels.items()}
     else:
-        water_depth_in_profile = hydrus_profile_depth - water_avg_depth  # FIXME: Sign correction?
-        new_pressure_in_profile = calculate_pressure_for_hydrus_model(model_dir,
-                                                                      water_depth_in_profile=water_depth_in_profile)
-    profile_dat_path = hydrus_utils.find_hydrus_file_path(model_dir, file_name="profile.dat")
-    with open(profile_dat_path, 'r+', encoding="utf-8") as fp:
-        ProfileDatProcessor(fp).swap_pressure(new_pressure_in_profile)
+        # FIXME: Sign correction?
+        water_depths_in_profile = [hydrus_profile_depth - water_avg_depth
+                                   for hydrus_profile_depth, water_avg_depth, _ in water_levels.values()]
+        new_pressures = dict(zip(water_levels.keys(),
+                                 calculate_pressure_for_hydrus_models(list(model_dirs.values()),
+                                                                      water_depths_in_profile,
+                                                                      kh_tolerance)))
+
+    for hydrus_id, new_pressure_in_profile in new_pressures.items():
+        profile_dat_path = hydrus_utils.find_hydrus_file_path(model_dirs[hydrus_id], file_name="profile.dat")
+        with open(profile_dat_path, 'r+', encoding="utf-8") as fp:
+            ProfileDatProcessor(fp).swap_pressure(new_pressure_in_profile)
 
 
 def get_profile_depth(project_id: str, hydrus_id: str) -> Tuple[float, LengthUnit]:
@@ -71,60 +147,20 @@ def get_profile_depth(project_id: str, hydrus_id: str) -> Tuple[float, LengthUni
         profile_depth = profile_dat_processor.read_profile_depth()
 
     selector_file_path = hydrus_utils.find_hydrus_file_path(model_dir, file_name="selector.in")
-    with open(selector_file_path, 'r', encoding='utf-8') as fp:
-        selector_in_processor = SelectorInProcessor(fp)
-        depth_unit = selector_in_processor.get_model_length()
+    depth_unit = get_selector_in(selector_file_path).get_model_length()
 
     return profile_depth, depth_unit
 
 
-def __create_temporary_model(ref_hydrus_dir: str, prev_hydrus_dir: str, new_hydrus_dir: str,
-                             project_metadata: Dict, step: int, spin_up: int) -> None:
+def __prepare_model(ref_hydrus_dir: str, prev_hydrus_dir: Optional[str], new_hydrus_dir: str,
+                    first_step: int, step_count: int) -> None:
     logger.debug(f"Creating temporary Hydrus model based on reference model: {ref_hydrus_dir} "
                  f"and previous model: {prev_hydrus_dir}")
-    shutil.rmtree(new_hydrus_dir, ignore_errors=True)
-    shutil.copytree(ref_hydrus_dir, new_hydrus_dir)
-
-    # Initial conditions from previous iteration
-    if prev_hydrus_dir:
-        prev_iter_nod_inf_path = hydrus_utils.find_hydrus_file_path(prev_hydrus_dir, file_name="nod_inf.out")
-        new_iter_nod_inf_path = (hydrus_utils.find_hydrus_file_path(new_hydrus_dir, file_name="nod_inf.out")
-                                 or os.path.join(new_hydrus_dir, HYDRUS_PROPER_CASING["nod_inf.out"]))
-        shutil.copy(prev_iter_nod_inf_path, new_iter_nod_inf_path)
-        with open(prev_iter_nod_inf_path, 'r', encoding='utf-8') as fp:
-            prev_node_pressure = NodInfOutProcessor(fp).read_node_pressure()
-
-        profile_dat_path = hydrus_utils.find_hydrus_file_path(new_hydrus_dir, file_name="profile.dat")
-        with open(profile_dat_path, 'r+', encoding='utf-8') as fp:
-            ProfileDatProcessor(fp).swap_pressure(prev_node_pressure)
-
-        prev_iter_t_level_out = hydrus_utils.find_hydrus_file_path(prev_hydrus_dir, file_name="t_level.out")
-        new_t_level_out = (hydrus_utils.find_hydrus_file_path(new_hydrus_dir, file_name="t_level.out")
-                           or os.path.join(new_hydrus_dir, HYDRUS_PROPER_CASING["t_level.out"]))
-        shutil.copy(prev_iter_t_level_out, new_t_level_out)
-
-    # Crop packages to match Modflow timestep
-    first_step, step_count = __get_hydrus_time_range(project_metadata, step, spin_up)
-
-    atmosph_in_path = hydrus_utils.find_hydrus_file_path(new_hydrus_dir, file_name="atmosph.in")
-    with open(atmosph_in_path, 'r+', encoding='utf-8') as fp:
-        atmo_first_jul_day, atmo_last_jul_day = AtmosphInProcessor(fp).truncate_file(first_step, step_count)
-
-    meteo_in_path = hydrus_utils.find_hydrus_file_path(new_hydrus_dir, file_name="meteo.in")
-    with open(meteo_in_path, 'r+', encoding='utf-8') as fp:
-        meteo_first_jul_day, meteo_last_jul_day = MeteoInProcessor(fp).truncate_file(first_step, step_count)
-
-    if atmo_first_jul_day != meteo_first_jul_day or atmo_last_jul_day != meteo_last_jul_day:
-        raise RuntimeError(f"ATMPOSH.IN and METEO.IN record ranges do not match: "
-                           f"ATMOSPH.IN: ({atmo_first_jul_day}, {atmo_last_jul_day}) "
-                           f"METEO.IN: ({meteo_first_jul_day}, {meteo_last_jul_day})")
-
-    first_record_day = meteo_first_jul_day
-    last_record_day = meteo_last_jul_day
-    selector_in_path = hydrus_utils.find_hydrus_file_path(new_hydrus_dir, file_name="selector.in")
-    with open(selector_in_path, 'r+', encoding='utf-8') as fp:
-        selector_in_processor = SelectorInProcessor(fp)
-        selector_in_processor.update_initial_and_final_step(first_record_day, last_record_day)
+    # Reference model is parsed once for all shapes and steps, new model files are written straight from memory
+    hydrus_input_compiler.get_model_template(ref_hydrus_dir).emit(new_hydrus_dir=new_hydrus_dir,
+                                                                  first_step=first_step,
+                                                                  step_count=step_count,
+                                                                  prev_hydrus_dir=prev_hydrus_dir)
 
 
 def __get_hydrus_time_range(project_metadata: Dict, step: int, spin_up: int) -> Tuple[int, int]:
@@ -146,3 +182,27 @@ def __get_hydrus_time_range(project_metadata: Dict, step: int, spin_up: int) ->
 
     logger.debug(f"Calculated Hydrus model time range: {step_count + 1}, starting from step: {first_step}")
     return first_step, step_count + 1
+
+
+def __get_available_cpu_count() -> int:
+    # CPUs the process may run on (not all cores of the node in a container), limited by the CPU quota if set
+    cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    cpu_quota = __read_cgroup_cpu_quota()
+    return max(1, min(cpu_count, cpu_quota)) if cpu_quota else cpu_count
+
+
+def __read_cgroup_cpu_quota() -> Optional[int]:
+    # cgroup v2: "<quota> <period>" ("max" - no quota), cgroup v1: separate quota (-1 - no quota) and period files
+    try:
+        with open("/sys/fs/cgroup/cpu.max", 'r') as fp:
+            quota, period = fp.read().split()[:2]
+        return int(quota) // int(period) if quota != "max" else None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", 'r') as quota_fp, \
+                open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", 'r') as period_fp:
+            quota, period = int(quota_fp.read()), int(period_fp.read())
+        return quota // period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
@@ -1,15 +1,24 @@
 import logging
+from dataclasses import dataclass
+from typing import List, Optional
 
-from scipy.optimize import root_scalar
+import numpy as np
 import phydrus as ph
 
 from hmse_utils.processing import unit_manager
 from hmse_utils.processing.hydrus import hydrus_utils
-from hmse_utils.processing.hydrus.file_processing.selector_in_processor import SelectorInProcessor
+from hmse_utils.processing.hydrus.file_processing.selector_in import get_selector_in
+from hmse_utils.processing.hydrus.hydrus_conductivity import ConductivityModel, DEFAULT_TABLE_TOLERANCE, \
+    get_conductivity_model
 from hmse_utils.processing.unit_manager import LengthUnit
 
 logger = logging.getLogger(__name__)
 
+# Same defaults as scipy.optimize.brentq used previously by the scalar solver
+__BRENTQ_XTOL = 2e-12
+__BRENTQ_RTOL = 4 * np.finfo(float).eps
+__BRENTQ_MAX_ITER = 100
+
 
 def calculate_hydrostatic_pressure(hydrus_root_dir: str, water_depth_in_profile: float, hydrus_unit: LengthUnit):
     logger.debug(f"Calculating hydrostatic pressure for hydrus model under path: {hydrus_root_dir}")
@@ -25,183 +34,243 @@ def calculate_hydrostatic_pressure(hydrus_root_dir: str, water_depth_in_profile:
     return pressure.tolist()
 
 
-# Credit to Adam Szymkiewicz
-def calculate_pressure_for_hydrus_model(hydrus_root_dir: str, water_depth_in_profile: float):
-    logger.debug(f"Recalculating pressure for hydrus model under path: {hydrus_root_dir}")
-    time_inf2 = ph.read_tlevel(hydrus_utils.find_hydrus_file_path(hydrus_root_dir, file_name="t_level.out"))
-    rval2 = time_inf2["vBot"].to_numpy()
+@dataclass
+class ProfileFlowState:
+    """
+    Flow state of a Hydrus profile at the end of the last simulation step (nodes ordered from the top).
+
+    @param x: Node coordinates
+    @param head: Node pressure heads, the bottom one already replaced with the new water table based value
+    @param conductivity: Node hydraulic conductivities (K)
+    @param flux: Node fluxes
+    @param bottom_flux: Bottom flux (vBot) from the last Hydrus time step
+    @param materials: Van Genuchten parameters of every node material (nodes, 6): thr, ths, alpha, n, ks, l
+    @param i_model: Hydraulic model of the profile (SELECTOR.IN iModel)
+    """
+    x: np.ndarray
+    head: np.ndarray
+    conductivity: np.ndarray
+    flux: np.ndarray
+    bottom_flux: float
+    materials: np.ndarray
+    i_model: int
+
+
+def calculate_pressure_for_hydrus_model(hydrus_root_dir: str, water_depth_in_profile: float,
+                                        kh_tolerance: Optional[float] = DEFAULT_TABLE_TOLERANCE) -> np.ndarray:
+    return calculate_pressure_for_hydrus_models([hydrus_root_dir], [water_depth_in_profile], kh_tolerance)[0]
+
+
+def calculate_pressure_for_hydrus_models(hydrus_root_dirs: List[str],
+                                         water_depths_in_profile: List[float],
+                                         kh_tolerance: Optional[float] = DEFAULT_TABLE_TOLERANCE) -> List[np.ndarray]:
+    """
+    Recalculate pressure heads of many Hydrus profiles at once, see: solve_pressure_profiles.
+
+    @param hydrus_root_dirs: Paths of Hydrus models
+    @param water_depths_in_profile: New pressure head at the bottom of each profile
+    @param kh_tolerance: Max relative error of conductivity interpolated from K(h) tables,
+                         None to calculate conductivity exactly
+    @return: New pressure heads of every profile (nodes ordered from the top)
+    """
+    profile_states = [read_profile_flow_state(hydrus_root_dir, water_depth_in_profile)
+                      for hydrus_root_dir, water_depth_in_profile in zip(hydrus_root_dirs, water_depths_in_profile)]
+    return solve_pressure_profiles(profile_states, kh_tolerance)
+
+
+def read_profile_flow_state(hydrus_root_dir: str, water_depth_in_profile: float) -> ProfileFlowState:
+    logger.debug(f"Reading flow state of hydrus model under path: {hydrus_root_dir}")
+    rval2 = ph.read_tlevel_columns(hydrus_utils.find_hydrus_file_path(hydrus_root_dir, file_name="t_level.out"),
+                                   usecols=["vBot"])["vBot"]
 
     profile = ph.profile.profile_from_file(hydrus_utils.find_hydrus_file_path(hydrus_root_dir, file_name="profile.dat"),
                                            ws="")
-    nod_inf2 = ph.read_nod_inf(hydrus_utils.find_hydrus_file_path(hydrus_root_dir, file_name="nod_inf.out"))
-    perlen = max(nod_inf2.keys())
-    if not (isinstance(perlen, float) or isinstance(perlen, int)):
-        raise RuntimeError(f"Model {hydrus_root_dir} contains only initial profile nodes data in NOD_INF.OUT file!")
-
-    selector_in_path = hydrus_utils.find_hydrus_file_path(hydrus_root_dir, file_name="selector.in")
-    with open(selector_in_path, 'r', encoding='utf-8') as fp:
-        selector_processor = SelectorInProcessor(fp)
-        waterflow_config = selector_processor.read_waterflow_config()
-        material_properties = selector_processor.read_material_properties()
-
-    qbot = rval2[-1]  # bottom flux from the last Hydrus time step
-    kold = nod_inf2[perlen].K.to_numpy()
-    qold = nod_inf2[perlen].Flux.to_numpy()
-    matid = profile["Mat"]
-    h2new = nod_inf2[perlen].Head.to_numpy()
-    h2new[-1] = water_depth_in_profile  # new pressure head at the bottom
-    h_low = h2new[-1]
-    k_low = kold[-1]
-
-    for idx in range(len(h2new) - 2, 0, -1):
-        qold1 = 0.5 * (qold[idx] + qold[idx + 1])
-        # check if the profile update should be terminated
-        if qold1 * qbot < 0:
-            # flux changes direction
-            break
-        qmax = max(abs(qold1), abs(qbot))
-        if abs(qold1 - qbot) > (1e-12 + 0.1 * qmax):
-            # flux value significantly different from the value in the saturated zone
-            break
-
-        dz = abs(profile["x"].iloc[idx + 1] - profile["x"].iloc[idx])
-        midx = matid.iloc[idx]
-        iModel = waterflow_config["iModel"]
-        ThR = material_properties.iloc[midx - 1, 0]
-        ThS = material_properties.iloc[midx - 1, 1]
-        alpha = material_properties.iloc[midx - 1, 2]
-        nvg = material_properties.iloc[midx - 1, 3]
-        ks = material_properties.iloc[midx - 1, 4]
-        tau = material_properties.iloc[midx - 1, 5]
-
-        args = [qbot, h_low, k_low, dz, iModel, ThR, ThS, alpha, nvg, ks, tau]
-        targs = tuple(args)
-
-        hmin = -1000.
-        kmin = __kh(hmin, iModel, ThR, ThS, alpha, nvg, ks, tau)
-        fluxmax = -0.5 * (kmin + k_low) * ((hmin - h_low) / dz + 1)
-        hmax = 100.
-        kmax = ks
-        fluxmin = -0.5 * (kmax + k_low) * ((hmax - h_low) / dz + 1)
-        hz = h_low - dz
-        if abs(qbot) < 1e-12:
-            # almost hydrostatic
-            h_up = hz
-        elif qbot < 0:
-            # downward flux
-            if qbot < fluxmin:
-                h_up = hmax
-            else:
-                my_bracket = [hz, hmax]
-                sol = root_scalar(__flux_bal, args=targs, bracket=my_bracket)
-                print(sol.root, sol.converged, sol.flag)
-                h_up = sol.root
-        else:
-            # upward flux
-            if qbot > fluxmax:
-                h_up = hmin
-            else:
-                my_bracket = [hmin, hz]
-                sol = root_scalar(__flux_bal, args=targs, bracket=my_bracket)
-                print(sol.root, sol.converged, sol.flag)
-                h_up = sol.root
-        h2new[idx] = h_up
-        h_low = h_up
-        k_low = __kh(h_low, iModel, ThR, ThS, alpha, nvg, ks, tau)
-    return h2new
+    try:
+        _, nod_inf2 = ph.read_nod_inf_block(hydrus_utils.find_hydrus_file_path(hydrus_root_dir,
+                                                                               file_name="nod_inf.out"))
+    except ValueError:
+        raise RuntimeError(f"Model {hydrus_root_dir} contains no profile nodes data in NOD_INF.OUT file!")
+
+    selector_in = get_selector_in(hydrus_utils.find_hydrus_file_path(hydrus_root_dir, file_name="selector.in"))
+    waterflow_config = selector_in.get_waterflow_config()
+    material_properties = selector_in.get_material_properties()
+
+    head = nod_inf2["Head"].copy()
+    head[-1] = water_depth_in_profile  # new pressure head at the bottom
+    material_ids = profile["Mat"].to_numpy(dtype=int)
+    return ProfileFlowState(x=profile["x"].to_numpy(dtype=float),
+                            head=head,
+                            conductivity=nod_inf2["K"],
+                            flux=nod_inf2["Flux"],
+                            bottom_flux=float(rval2[-1]),
+                            materials=material_properties.to_numpy(dtype=float)[material_ids - 1, :6],
+                            i_model=waterflow_config["iModel"])
 
 
 # Credit to Adam Szymkiewicz
-def __kh(h, *args):
-    # calculates hydraulic conductivity as a function of pressure head
-    # required to modify Hydrus pressure profiles after each Modflow period
-    iModel = args[0]
-    Qr = args[1]
-    Qs = args[2]
-    Alfa = args[3]
-    n = args[4]
-    Ks = max(args[5], 1.0e-37)
-    BPar = args[6]
-
-    if iModel not in (0, 1, 3):
-        raise RuntimeError(f"Not implemented: iModel {iModel}!")
-
-    PPar = 2
-    if iModel == 0 or iModel == 3:
-        Qm = Qs
-        Qa = Qr
-        Qk = Qs
-        Kk = Ks
-    elif iModel == 1:
-        # DEAD CODE
-        ###
-        lAltern = False
-        if not lAltern:
-            Qm = args[7]
-            Qa = args[8]
-            Qk = args[9]
-            Kk = args[10]
-        ###
-        else:
-            Qm = Qs
-            Qa = Qr
-            Qk = Qs
-            Kk = Ks
-            Alfa = args[9]
-            n = args[10]
-
-    if iModel == 3:
-        Qm = args[7]
-    m = 1.0 - 1.0 / n
-
-    # DEAD CODE
-    ###
-    lUnbound = False
-    if lUnbound:
-        m = args[6]
-        BPar = 0.5
-    ###
-
-    HMin = -1.0e300 ** (1.0 / n) / max(Alfa, 1.0)
-    HH = max(h, HMin)
-    Qees = min((Qs - Qa) / (Qm - Qa), 0.999999999999999)
-    Qeek = min((Qk - Qa) / (Qm - Qa), Qees)
-    Hs = -1.0 / Alfa * (Qees ** (-1.0 / m) - 1.0) ** (1.0 / n)
-    Hk = -1.0 / Alfa * (Qeek ** (-1.0 / m) - 1.0) ** (1.0 / n)
-    if h < Hk:
-        if not lUnbound:
-            Qee = (1.0 + (-Alfa * HH) ** n) ** (-m)
-            Qe = (Qm - Qa) / (Qs - Qa) * Qee
-            Qek = (Qm - Qa) / (Qs - Qa) * Qeek
-            FFQ = 1.0 - (1.0 - Qee ** (1.0 / m)) ** (-m)
-            FFQk = 1.0 - (1.0 - Qeek ** (1.0 / m)) ** (-m)
-            if FFQ <= 0.0:
-                FFQ = m * Qee ** (1.0 / m)
-            Kr = (Qe / Qek) ** BPar * (FFQ / FFQk) ** PPar * Kk / Ks
-            if iModel == 0:
-                Kr = Qe ** BPar * FFQ ** PPar
-            return max(Ks * Kr, 1.0e-37)
-        # DEAD CODE
-        ###
-        else:
-            raise RuntimeError("Not implemented case!")
-        ###
-    if Hk <= h < Hs:
-        Kr = (1.0 - Kk / Ks) / (Hs - Hk) * (h - Hs) + 1
-        return Ks * Kr
-    if h >= Hs:
-        return Ks
+def solve_pressure_profiles(profile_states: List[ProfileFlowState],
+                            kh_tolerance: Optional[float] = DEFAULT_TABLE_TOLERANCE) -> List[np.ndarray]:
+    """
+    Update pressure heads of profiles walking upward from the bottom node, as long as the flux
+    in the profile is close to the bottom flux (saturated zone). Pressure head of every node solves
+    the steady flow equation between the node and the one below. All profiles are processed together:
+    at each step the next node of every still active profile is solved with a single batched Brent's method.
+
+    @param profile_states: Flow states of the profiles
+    @param kh_tolerance: Max relative error of conductivity interpolated from K(h) tables of profile materials,
+                         None to calculate conductivity exactly
+    @return: New pressure heads of every profile (nodes ordered from the top)
+    """
+    logger.debug(f"Recalculating pressure for {len(profile_states)} hydrus profiles")
+    if not profile_states:
+        return []
+
+    unique_materials, node_material_idx = np.unique(np.concatenate([state.materials for state in profile_states]),
+                                                    axis=0, return_inverse=True)
+    conductivity = get_conductivity_model(unique_materials, kh_tolerance)
+    material_idx_per_profile = np.split(node_material_idx.ravel(),
+                                        np.cumsum([len(state.materials) for state in profile_states])[:-1])
+
+    # Arrays of shape (profiles, max nodes) ordered from the bottom node, padded with NaN
+    node_counts = np.array([len(state.head) for state in profile_states])
+    x = __stack_from_bottom([state.x for state in profile_states])
+    heads = __stack_from_bottom([state.head for state in profile_states])
+    fluxes = __stack_from_bottom([state.flux for state in profile_states])
+    material_idx = np.nan_to_num(__stack_from_bottom(material_idx_per_profile)).astype(int)
+    conductivities = __stack_from_bottom([state.conductivity for state in profile_states])
+    i_models = np.array([state.i_model for state in profile_states])
+    q_bot = np.array([state.bottom_flux for state in profile_states])
+
+    h_low = heads[:, 0].copy()
+    k_low = conductivities[:, 0].copy()
+    is_active = np.ones(len(profile_states), dtype=bool)
+    with np.errstate(invalid='ignore'):
+        for node in range(1, heads.shape[1] - 1):
+            is_active &= node <= node_counts - 2
+            q_old = 0.5 * (fluxes[:, node] + fluxes[:, node - 1])
+            q_max = np.maximum(np.abs(q_old), np.abs(q_bot))
+            # terminate when flux changes direction or differs significantly from the value in the saturated zone
+            is_active &= ~((q_old * q_bot < 0) | (np.abs(q_old - q_bot) > (1e-12 + 0.1 * q_max)))
+            if not np.any(is_active):
+                break
+
+            idx = np.flatnonzero(is_active)
+            unsupported_models = set(i_models[idx]) - {0}
+            if unsupported_models:
+                raise RuntimeError(f"Not implemented: iModel {unsupported_models.pop()}!")
+
+            node_material_idx = material_idx[idx, node]
+            dz = np.abs(x[idx, node - 1] - x[idx, node])
+            h_up = __solve_node_pressure(q_bot[idx], h_low[idx], k_low[idx], dz, node_material_idx, conductivity)
+            heads[idx, node] = h_up
+            h_low[idx] = h_up
+            k_low[idx] = conductivity.lookup(h_up, node_material_idx)
+
+    return [heads[i, :node_count][::-1].copy() for i, node_count in enumerate(node_counts)]
+
+
+def __stack_from_bottom(arrays: List[np.ndarray]) -> np.ndarray:
+    max_len = max(len(array) for array in arrays)
+    stacked = np.full((len(arrays), max_len) + np.shape(arrays[0])[1:], np.nan)
+    for i, array in enumerate(arrays):
+        stacked[i, :len(array)] = array[::-1]
+    return stacked
+
+
+def __solve_node_pressure(q_bot: np.ndarray, h_low: np.ndarray, k_low: np.ndarray, dz: np.ndarray,
+                          material_idx: np.ndarray, conductivity: ConductivityModel) -> np.ndarray:
+    h_min = -1000.
+    k_min = conductivity.lookup(np.full(len(q_bot), h_min), material_idx)
+    flux_max = -0.5 * (k_min + k_low) * ((h_min - h_low) / dz + 1)
+    h_max = 100.
+    k_max = conductivity.materials[material_idx, 4]
+    flux_min = -0.5 * (k_max + k_low) * ((h_max - h_low) / dz + 1)
+
+    # almost hydrostatic by default
+    h_z = h_low - dz
+    h_up = h_z.copy()
+
+    is_downward = (np.abs(q_bot) >= 1e-12) & (q_bot < 0)
+    is_upward = (np.abs(q_bot) >= 1e-12) & (q_bot > 0)
+    h_up[is_downward & (q_bot < flux_min)] = h_max
+    h_up[is_upward & (q_bot > flux_max)] = h_min
+
+    solve_down = is_downward & (q_bot >= flux_min)
+    solve_up = is_upward & (q_bot <= flux_max)
+    to_solve = solve_down | solve_up
+    if np.any(to_solve):
+        lower = np.where(solve_down, h_z, h_min)[to_solve]
+        upper = np.where(solve_down, h_max, h_z)[to_solve]
+        h_up[to_solve] = __brentq_flux_bal(lower, upper, q_bot[to_solve], h_low[to_solve], k_low[to_solve],
+                                           dz[to_solve], material_idx[to_solve], conductivity)
+    return h_up
+
+
+def __brentq_flux_bal(lower: np.ndarray, upper: np.ndarray, q: np.ndarray, h0: np.ndarray, k0: np.ndarray,
+                      dz: np.ndarray, material_idx: np.ndarray, conductivity: ConductivityModel) -> np.ndarray:
+    """
+    Element-wise Brent's method following scipy.optimize.brentq step by step, so that the same root is
+    selected as by the scalar solver even if flux balance changes sign more than once inside the bracket.
+    """
+    x_pre, x_cur = lower.copy(), upper.copy()
+    f_pre = __flux_bal(x_pre, q, h0, k0, dz, material_idx, conductivity)
+    f_cur = __flux_bal(x_cur, q, h0, k0, dz, material_idx, conductivity)
+    if np.any((f_pre != 0) & (f_cur != 0) & (np.signbit(f_pre) == np.signbit(f_cur))):
+        raise RuntimeError("Pressure head root is not bracketed - flux balance has the same sign at both ends!")
+
+    root = np.where(f_pre == 0, x_pre, x_cur)
+    is_running = (f_pre != 0) & (f_cur != 0)
+    x_blk, f_blk = np.zeros_like(x_pre), np.zeros_like(x_pre)
+    s_pre, s_cur = np.zeros_like(x_pre), np.zeros_like(x_pre)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(__BRENTQ_MAX_ITER):
+            new_bracket = (f_pre != 0) & (f_cur != 0) & (np.signbit(f_pre) != np.signbit(f_cur))
+            x_blk = np.where(new_bracket, x_pre, x_blk)
+            f_blk = np.where(new_bracket, f_pre, f_blk)
+            s_pre = np.where(new_bracket, x_cur - x_pre, s_pre)
+            s_cur = np.where(new_bracket, x_cur - x_pre, s_cur)
+
+            # keep the best estimate in x_cur
+            swap = np.abs(f_blk) < np.abs(f_cur)
+            x_pre, x_cur, x_blk = np.where(swap, x_cur, x_pre), np.where(swap, x_blk, x_cur), \
+                np.where(swap, x_cur, x_blk)
+            f_pre, f_cur, f_blk = np.where(swap, f_cur, f_pre), np.where(swap, f_blk, f_cur), \
+                np.where(swap, f_cur, f_blk)
+
+            delta = (__BRENTQ_XTOL + __BRENTQ_RTOL * np.abs(x_cur)) / 2
+            s_bis = (x_blk - x_cur) / 2
+            converged = is_running & ((f_cur == 0) | (np.abs(s_bis) < delta))
+            root = np.where(converged, x_cur, root)
+            is_running &= ~converged
+            if not np.any(is_running):
+                break
+
+            # interpolate (secant) or extrapolate (inverse quadratic)
+            d_pre = (f_pre - f_cur) / (x_pre - x_cur)
+            d_blk = (f_blk - f_cur) / (x_blk - x_cur)
+            s_try = np.where(x_pre == x_blk,
+                             -f_cur * (x_cur - x_pre) / (f_cur - f_pre),
+                             -f_cur * (f_blk * d_blk - f_pre * d_pre) / (d_blk * d_pre * (f_blk - f_pre)))
+            try_step = (np.abs(s_pre) > delta) & (np.abs(f_cur) < np.abs(f_pre))
+            good_step = try_step & (2 * np.abs(s_try) < np.minimum(np.abs(s_pre), 3 * np.abs(s_bis) - delta))
+            s_pre = np.where(good_step, s_cur, s_bis)
+            s_cur = np.where(good_step, s_try, s_bis)
+
+            x_pre, f_pre = x_cur, f_cur
+            x_cur = np.where(is_running,
+                             x_cur + np.where(np.abs(s_cur) > delta, s_cur, np.where(s_bis > 0, delta, -delta)),
+                             x_cur)
+            f_cur = np.where(is_running, __flux_bal(x_cur, q, h0, k0, dz, material_idx, conductivity), f_cur)
+
+    return np.where(is_running, x_cur, root)
 
 
 # Credit to Adam Szymkiewicz
-def __flux_bal(h, *args):
-    # calculates residuum for steady flow equation
+def __flux_bal(h: np.ndarray, q: np.ndarray, h0: np.ndarray, k0: np.ndarray, dz: np.ndarray,
+               material_idx: np.ndarray, conductivity: ConductivityModel) -> np.ndarray:
+    # calculates residuum for steady flow equation (q - flux, negative downward;
+    # h0, k0 - pressure and hyd. cond. at lower node; dz - node spacing)
     # required to modify Hydrus pressure profiles after each Modflow period
-    q = args[0]  # flux (negative downward)
-    h0 = args[1]  # pressure at lower node
-    k0 = args[2]  # hyd. cond. at lower node
-    dz = args[3]  # node spacing
-    my_kh = __kh(h, *args[4:])
-    kaver = 0.5 * (k0 + my_kh)
-    bal = q + kaver * ((h - h0) / dz + 1)
-    return bal
+    k_aver = 0.5 * (k0 + conductivity.lookup(h, material_idx))
+    return q + k_aver * ((h - h0) / dz + 1)
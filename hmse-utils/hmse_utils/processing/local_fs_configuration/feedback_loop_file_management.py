@@ -3,7 +3,8 @@ import os
 import shutil
 from typing import Dict, List, Optional
 
-from hmse_utils.processing.local_fs_configuration import local_paths
+from hmse_utils.processing.local_fs_configuration import local_paths, snapshot_store, simulation_state
+from hmse_utils.processing.local_fs_configuration.simulation_state import StepStatus
 
 logger = logging.getLogger(__name__)
 
@@ -26,25 +27,19 @@ def create_per_shape_hydrus_models(project_id: str, used_hydrus_models: Dict[str
 def pre_configure_iteration(project_id: str) -> None:
     logger.debug(f"Preconfiguring for project: {project_id}")
     prev_sim_step_dir = find_previous_simulation_step_dir(project_id)
-    if not prev_sim_step_dir:
-        step_dir_name = "sim_step_0"
-    else:
-        last_step = int(prev_sim_step_dir.split('_')[-1])
-        step_dir_name = f"sim_step_{last_step + 1}"
-
-    step_dir_path = os.path.join(local_paths.get_simulation_dir(project_id), step_dir_name)
+    step_dir_path = os.path.join(local_paths.get_simulation_dir(project_id),
+                                 simulation_state.start_simulation_step(project_id).dir_name)
+    # Leftovers of an interrupted configuration of the step
+    shutil.rmtree(step_dir_path, ignore_errors=True)
     os.makedirs(step_dir_path)
 
-    shutil.copytree(local_paths.get_modflow_dir(project_id, simulation_mode=True),
-                    os.path.join(step_dir_path, "modflow"))
-    shutil.copytree(local_paths.get_hydrus_dir(project_id, simulation_mode=True),
-                    os.path.join(step_dir_path, "hydrus"))
+    # Content unchanged since the previous step is hardlinked instead of copied
+    source_dirs = {"modflow": local_paths.get_modflow_dir(project_id, simulation_mode=True),
+                   "hydrus": local_paths.get_hydrus_dir(project_id, simulation_mode=True)}
+    snapshot_store.create_snapshot(source_dirs, step_dir_path, prev_snapshot_dir=prev_sim_step_dir)
+    simulation_state.update_current_step_status(project_id, StepStatus.CONFIGURED)
 
 
 def find_previous_simulation_step_dir(project_id: str) -> Optional[str]:
-    step_nums = [int(file.split('_')[-1]) for file in os.listdir(local_paths.get_simulation_dir(project_id))
-                 if file.startswith("sim_step_")]  # WARNING
-    latest_step = sorted(step_nums, reverse=True)[0] if step_nums else None
-    return (os.path.join(local_paths.get_simulation_dir(project_id), f"sim_step_{latest_step}")
-            if latest_step is not None
-            else None)
+    # Read from the simulation state file instead of listing the simulation dir
+    return simulation_state.get_last_configured_step_dir(project_id)
@@ -3,7 +3,7 @@ import os
 from typing import Optional
 
 from hmse_utils.processing.local_fs_configuration.path_constants import get_workspace_local_path, SIMULATION_DIR, \
-    METADATA_FILENAME, MODFLOW_OUTPUT_JSON, get_feedback_loop_hydrus_name
+    METADATA_FILENAME, MODFLOW_OUTPUT_JSON, MODFLOW_OUTPUT_DIR, get_feedback_loop_hydrus_name
 
 logger = logging.getLogger(__name__)
 
@@ -71,18 +71,19 @@ def get_weather_model_path(project_id: str, weather_id: str, simulation_mode: bo
     return os.path.join(get_weather_dir(project_id, simulation_mode), f"{weather_id}.csv")
 
 
-def get_shape_path(project_id: str, shape_id: str, simulation_mode: bool = False) -> str:
-    return os.path.join(get_shapes_dir(project_id, simulation_mode), f"{shape_id}.npy")
-
-
-def get_rch_shape_filepath(project_id: str, shape_id: str, simulation_mode: bool = False) -> str:
-    return os.path.join(get_rch_shapes_dir(project_id, simulation_mode), f"{shape_id}.npy")
+def get_weather_cache_path(project_id: str, weather_id: str, simulation_mode: bool = False) -> str:
+    # Local file only - in simulation jobs (k8s) it lives as long as the job workspace, it is not uploaded to MinIO
+    return os.path.join(get_weather_dir(project_id, simulation_mode), f"{weather_id}.npz")
 
 
 def get_output_json_path(project_id: str) -> str:
     return os.path.join(get_simulation_dir(project_id), MODFLOW_OUTPUT_JSON)
 
 
+def get_output_dir(project_id: str) -> str:
+    return os.path.join(get_simulation_dir(project_id), MODFLOW_OUTPUT_DIR)
+
+
 def fix_model_name(name: str):
     """
     Takes a filename string and makes it safe for further use. This method will probably need expanding.
@@ -5,6 +5,13 @@ SIMULATION_DIR = "simulation"
 
 METADATA_FILENAME = "metadata.json"
 MODFLOW_OUTPUT_JSON = "results.json"
+MODFLOW_OUTPUT_DIR = "results"
+RESULTS_MANIFEST_FILENAME = "results_manifest.json"
+SNAPSHOT_MANIFEST_FILENAME = "manifest.json"
+SIMULATION_STATE_FILENAME = "simulation_state.json"
+
+SHAPE_STORE_FILENAME = "shape_store.bin"
+SHAPE_STORE_LOCK_FILENAME = ".shape_store.lock"
 
 logger = logging.getLogger(__name__)
 
@@ -0,0 +1,288 @@
+import itertools
+import json
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from hmse_utils.processing.local_fs_configuration.path_constants import SHAPE_STORE_FILENAME, \
+    SHAPE_STORE_LOCK_FILENAME
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+SHAPE_STORE_MAGIC = b"HMSESHP1"
+HEADER_LENGTH_FORMAT = "<Q"
+HEADER_LENGTH_SIZE = struct.calcsize(HEADER_LENGTH_FORMAT)
+# Packed masks start at an aligned offset after the JSON header
+DATA_ALIGNMENT = 64
+LOCK_RETRY_INTERVAL = 0.05
+
+
+@dataclass
+class ShapeStore:
+    """
+    Store of all shape masks kept in a single directory (e.g. project shapes or RCH shapes).
+    Every mask is a row of one packed uint8 bitset array (one bit per grid cell). The store file starts with
+    a JSON index holding the grid shape and the shape ids in row order, followed by the packed rows. Masks are
+    read through a memory map, so only rows of requested shapes are loaded. Modifications are serialized
+    by a lock and replace the whole file at once. Legacy per-shape .npy masks found in the directory are migrated
+    on access.
+    """
+    store_dir: str
+
+    # Thread locks of store directories (by real path) - lock files alone do not exclude threads on every platform
+    __thread_locks = {}
+    __thread_locks_guard = threading.Lock()
+
+    def __post_init__(self):
+        self.__migrate_legacy_masks()
+
+    def get_shape_ids(self) -> List[str]:
+        return list(self.__read_store()[0]["shape_ids"])
+
+    def contains(self, shape_id: str) -> bool:
+        return shape_id in self.__read_store()[0]["shape_ids"]
+
+    def get_mask(self, shape_id: str) -> np.ndarray:
+        return self.get_masks([shape_id])[shape_id]
+
+    def get_masks(self, shape_ids: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        @param shape_ids: Ids of shapes to read, all stored shapes if not specified
+        @return: Dictionary shape_id -> boolean mask of shape (nrow, ncol)
+        """
+        index, packed = self.__read_store()
+        shape_ids = index["shape_ids"] if shape_ids is None else list(shape_ids)
+        if not shape_ids:
+            return {}
+
+        packed_rows = self.__select_rows(index, packed, shape_ids)
+        grid_shape = tuple(index["grid_shape"])
+        return {shape_id: ShapeStore.__unpack(packed_row, grid_shape)
+                for shape_id, packed_row in zip(shape_ids, packed_rows)}
+
+    def get_union_mask(self, shape_ids: Iterable[str]) -> np.ndarray:
+        """
+        @param shape_ids: Ids of shapes to merge
+        @return: Boolean mask of shape (nrow, ncol) marking cells belonging to any of the shapes
+        """
+        index, packed = self.__read_store()
+        packed_rows = self.__select_rows(index, packed, list(shape_ids))
+        return ShapeStore.__unpack(np.bitwise_or.reduce(packed_rows, axis=0), tuple(index["grid_shape"]))
+
+    def save_mask(self, shape_id: str, mask: np.ndarray) -> None:
+        self.save_masks({shape_id: mask})
+
+    def save_masks(self, masks: Dict[str, np.ndarray]) -> None:
+        self.save_mask_items(masks.items())
+
+    def save_mask_items(self, mask_items: Iterable[Tuple[str, np.ndarray]]) -> None:
+        """
+        Add new or replace existing masks. Cells equal to 1 are treated as part of the shape.
+        Masks are packed one at a time, so the items may be generated lazily.
+        Masks stored for a different grid shape are dropped, as they no longer match the Modflow model.
+
+        @param mask_items: Iterable of (shape_id, mask of shape (nrow, ncol)) pairs
+        """
+        with self.__locked():
+            self.__save_mask_items(mask_items)
+
+    def delete_mask(self, shape_id: str) -> None:
+        self.delete_masks([shape_id])
+
+    def delete_masks(self, shape_ids: Iterable[str]) -> None:
+        with self.__locked():
+            index, packed = self.__read_store()
+            to_delete = set(shape_ids).intersection(index["shape_ids"])
+            if not to_delete:
+                return
+
+            logger.debug(f"Deleting {len(to_delete)} masks from shape store {self.store_dir}")
+            kept_rows = [i for i, shape_id in enumerate(index["shape_ids"]) if shape_id not in to_delete]
+            self.__write([index["shape_ids"][i] for i in kept_rows], tuple(index["grid_shape"]), packed[kept_rows])
+
+    def clear(self) -> None:
+        logger.debug(f"Clearing shape store {self.store_dir}")
+        with self.__locked():
+            self.__write([], None, None)
+
+    def __save_mask_items(self, mask_items: Iterable[Tuple[str, np.ndarray]]) -> None:
+        mask_items = iter(mask_items)
+        first_item = next(mask_items, None)
+        if first_item is None:
+            return
+
+        grid_shape = np.shape(first_item[1])
+        index, packed = self.__read_store()
+        shape_ids = index["shape_ids"]
+        packed = None if packed is None else np.array(packed)
+        if shape_ids and tuple(index["grid_shape"]) != grid_shape:
+            logger.warning(f"Dropping {len(shape_ids)} shapes of grid {tuple(index['grid_shape'])} "
+                           f"from shape store {self.store_dir} (new grid: {grid_shape})")
+            shape_ids, packed = [], None
+
+        row_idx = {shape_id: i for i, shape_id in enumerate(shape_ids)}
+        stored_count = len(shape_ids)
+        new_rows = []
+        saved_count = 0
+        for shape_id, mask in itertools.chain([first_item], mask_items):
+            if np.shape(mask) != grid_shape:
+                raise ValueError(f"Shape {shape_id} has grid {np.shape(mask)}, expected: {grid_shape}")
+            packed_row = np.packbits((np.asarray(mask) == 1).ravel())  # Frontend sets explicitly 1
+            if shape_id not in row_idx:
+                row_idx[shape_id] = len(shape_ids)
+                shape_ids.append(shape_id)
+                new_rows.append(packed_row)
+            elif row_idx[shape_id] < stored_count:
+                packed[row_idx[shape_id]] = packed_row
+            else:
+                new_rows[row_idx[shape_id] - stored_count] = packed_row
+            saved_count += 1
+
+        if new_rows:
+            packed = np.array(new_rows) if packed is None else np.concatenate([packed, np.array(new_rows)])
+
+        logger.debug(f"Saving {saved_count} masks in shape store {self.store_dir}")
+        self.__write(shape_ids, grid_shape, packed)
+
+    def __read_store(self) -> Tuple[Dict, Optional[np.ndarray]]:
+        """
+        @return: Index (grid shape and shape ids in row order) and read-only, memory-mapped packed masks,
+                 both from the same version of the store file
+        """
+        store_path = os.path.join(self.store_dir, SHAPE_STORE_FILENAME)
+        try:
+            handle = open(store_path, 'rb')
+        except FileNotFoundError:
+            return {"grid_shape": None, "shape_ids": []}, None
+
+        with handle:
+            prefix = handle.read(len(SHAPE_STORE_MAGIC) + HEADER_LENGTH_SIZE)
+            if prefix[:len(SHAPE_STORE_MAGIC)] != SHAPE_STORE_MAGIC:
+                raise ValueError(f"File {store_path} is not a shape store")
+            header_length, = struct.unpack(HEADER_LENGTH_FORMAT, prefix[len(SHAPE_STORE_MAGIC):])
+            index = json.loads(handle.read(header_length).decode('utf-8'))
+            if not index["shape_ids"]:
+                return index, None
+            # The map keeps the read version of the file even if the store gets replaced meanwhile
+            packed = np.memmap(handle, dtype=np.uint8, mode='r', offset=ShapeStore.__get_data_offset(header_length),
+                               shape=(len(index["shape_ids"]), index["row_size"]))
+        return index, packed
+
+    def __select_rows(self, index: Dict, packed: Optional[np.ndarray], shape_ids: List[str]) -> np.ndarray:
+        row_idx = {shape_id: i for i, shape_id in enumerate(index["shape_ids"])}
+        missing = [shape_id for shape_id in shape_ids if shape_id not in row_idx]
+        if missing:
+            raise KeyError(f"Shapes {missing} not found in shape store {self.store_dir}")
+        return np.array(packed[[row_idx[shape_id] for shape_id in shape_ids]])
+
+    def __write(self, shape_ids: List[str], grid_shape: Optional[Tuple[int, ...]], packed: Optional[np.ndarray]):
+        store_path = os.path.join(self.store_dir, SHAPE_STORE_FILENAME)
+        if not shape_ids:
+            if os.path.isfile(store_path):
+                os.remove(store_path)
+            return
+
+        header = json.dumps({"grid_shape": list(grid_shape),
+                             "shape_ids": shape_ids,
+                             "row_size": packed.shape[1]}).encode('utf-8')
+        # Index and masks are in a single file replaced at once - readers see either the old or the new version
+        fd, tmp_path = tempfile.mkstemp(dir=self.store_dir, prefix=f"{SHAPE_STORE_FILENAME}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(SHAPE_STORE_MAGIC)
+                handle.write(struct.pack(HEADER_LENGTH_FORMAT, len(header)))
+                handle.write(header)
+                handle.write(b'\0' * (ShapeStore.__get_data_offset(len(header)) - handle.tell()))
+                handle.write(np.ascontiguousarray(packed, dtype=np.uint8).tobytes())
+            os.replace(tmp_path, store_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @contextmanager
+    def __locked(self) -> Iterator[None]:
+        """
+        Exclusive access to the store for read-modify-write - among threads (thread lock)
+        and processes (lock file in the store directory).
+        """
+        os.makedirs(self.store_dir, exist_ok=True)
+        with ShapeStore.__get_thread_lock(self.store_dir):
+            with open(os.path.join(self.store_dir, SHAPE_STORE_LOCK_FILENAME), 'a+b') as lock_file:
+                ShapeStore.__lock_file(lock_file, lock=True)
+                try:
+                    yield
+                finally:
+                    ShapeStore.__lock_file(lock_file, lock=False)
+
+    def __migrate_legacy_masks(self) -> None:
+        if not self.__list_legacy_files():
+            return
+
+        with self.__locked():
+            # Listed again - another thread or process may have migrated the masks meanwhile
+            legacy_files = self.__list_legacy_files()
+            if not legacy_files:
+                return
+
+            logger.info(f"Migrating {len(legacy_files)} legacy shape masks into shape store {self.store_dir}")
+            legacy_masks = {filename[:-4]: np.load(os.path.join(self.store_dir, filename))
+                            for filename in legacy_files}
+            grid_shapes = [np.shape(mask) for mask in legacy_masks.values()]
+            grid_shape = max(set(grid_shapes), key=grid_shapes.count)
+            stale_ids = [shape_id for shape_id, mask in legacy_masks.items() if np.shape(mask) != grid_shape]
+            if stale_ids:
+                logger.warning(f"Skipping legacy shapes {stale_ids} not matching grid {grid_shape}")
+            self.__save_mask_items((shape_id, mask) for shape_id, mask in legacy_masks.items()
+                                   if shape_id not in stale_ids)
+
+            for filename in legacy_files:
+                os.remove(os.path.join(self.store_dir, filename))
+
+    def __list_legacy_files(self) -> List[str]:
+        if not os.path.isdir(self.store_dir):
+            return []
+        return sorted(filename for filename in os.listdir(self.store_dir) if filename.endswith(".npy"))
+
+    @staticmethod
+    def __get_thread_lock(store_dir: str) -> threading.Lock:
+        with ShapeStore.__thread_locks_guard:
+            return ShapeStore.__thread_locks.setdefault(os.path.realpath(store_dir), threading.Lock())
+
+    @staticmethod
+    def __lock_file(lock_file: BinaryIO, lock: bool) -> None:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if lock else fcntl.LOCK_UN)
+            return
+        lock_file.seek(0)
+        if not lock:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            return
+        while True:
+            try:
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+                return
+            except OSError:
+                time.sleep(LOCK_RETRY_INTERVAL)
+
+    @staticmethod
+    def __get_data_offset(header_length: int) -> int:
+        header_end = len(SHAPE_STORE_MAGIC) + HEADER_LENGTH_SIZE + header_length
+        return -(-header_end // DATA_ALIGNMENT) * DATA_ALIGNMENT
+
+    @staticmethod
+    def __unpack(packed_row: np.ndarray, grid_shape: Tuple[int, ...]) -> np.ndarray:
+        return np.unpackbits(packed_row, count=int(np.prod(grid_shape))).reshape(grid_shape).astype(bool)
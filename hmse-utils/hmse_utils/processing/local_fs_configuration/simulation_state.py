@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from enum import auto
+from typing import List, Optional
+
+from strenum import StrEnum
+
+from hmse_utils.processing.local_fs_configuration import local_paths
+from hmse_utils.processing.local_fs_configuration.path_constants import SIMULATION_STATE_FILENAME
+
+logger = logging.getLogger(__name__)
+
+SIMULATION_STEP_DIR_PREFIX = "sim_step_"
+
+
+class StepStatus(StrEnum):
+    CONFIGURING = auto()
+    CONFIGURED = auto()
+    MODELS_PREPARED = auto()
+    RECHARGE_TRANSFERRED = auto()
+
+
+@dataclass
+class SimulationStep:
+    step: int
+    dir_name: str  # relative to the simulation dir
+    status: StepStatus
+
+
+@dataclass
+class SimulationState:
+    """
+    Progress of a feedback loop simulation - steps (sim_step_N dirs) created so far with their status.
+    """
+    steps: List[SimulationStep] = field(default_factory=list)
+
+    def get_current_step(self) -> Optional[SimulationStep]:
+        return self.steps[-1] if self.steps else None
+
+    def get_last_configured_step(self) -> Optional[SimulationStep]:
+        # Steps still CONFIGURING were interrupted before their snapshot was complete
+        return next((step for step in reversed(self.steps) if step.status != StepStatus.CONFIGURING), None)
+
+    def to_json(self) -> dict:
+        current_step = self.get_current_step()
+        return {
+            "current_step": current_step.step if current_step else None,
+            "steps": [{"step": step.step, "dir": step.dir_name, "status": str(step.status)} for step in self.steps]
+        }
+
+    @staticmethod
+    def from_json(state_json: dict) -> "SimulationState":
+        return SimulationState([SimulationStep(step=step["step"],
+                                               dir_name=step["dir"],
+                                               status=StepStatus(step["status"]))
+                                for step in state_json["steps"]])
+
+
+def get_simulation_state(project_id: str) -> SimulationState:
+    """
+    @param project_id: ID of the simulated project
+    @return: State of the simulation, recreated from sim_step_N dirs if the simulation has no state file
+    """
+    state_path = __get_state_path(project_id)
+    try:
+        with open(state_path, 'r', encoding='utf-8') as fp:
+            return SimulationState.from_json(json.load(fp))
+    except FileNotFoundError:
+        return __scan_simulation_dir(project_id)
+
+
+def get_last_configured_step_dir(project_id: str) -> Optional[str]:
+    """
+    @param project_id: ID of the simulated project
+    @return: Path of the latest configured sim_step_N dir, None if no step was configured yet
+    """
+    configured_step = get_simulation_state(project_id).get_last_configured_step()
+    return os.path.join(local_paths.get_simulation_dir(project_id),
+                        configured_step.dir_name) if configured_step else None
+
+
+def start_simulation_step(project_id: str) -> SimulationStep:
+    """
+    Register a new simulation step (status CONFIGURING), following the current one. The current step is reused if
+    its configuration was interrupted (status still CONFIGURING) - its dir has to be created again.
+
+    @param project_id: ID of the simulated project
+    @return: New simulation step
+    """
+    state = get_simulation_state(project_id)
+    current_step = state.get_current_step()
+    if current_step and current_step.status == StepStatus.CONFIGURING:
+        logger.warning(f"Configuration of simulation step {current_step.step} in project {project_id} "
+                       f"was interrupted, configuring it again")
+        return current_step
+    step = current_step.step + 1 if current_step else 0
+    new_step = SimulationStep(step=step, dir_name=f"{SIMULATION_STEP_DIR_PREFIX}{step}", status=StepStatus.CONFIGURING)
+    state.steps.append(new_step)
+    __save_simulation_state(project_id, state)
+    return new_step
+
+
+def update_current_step_status(project_id: str, status: StepStatus) -> None:
+    """
+    @param project_id: ID of the simulated project
+    @param status: New status of the current simulation step, ignored if no step was created (no feedback loop)
+    """
+    state = get_simulation_state(project_id)
+    current_step = state.get_current_step()
+    if current_step is None:
+        return
+    logger.debug(f"Updating status of simulation step {current_step.step} in project {project_id} to: {status}")
+    current_step.status = status
+    __save_simulation_state(project_id, state)
+
+
+def __save_simulation_state(project_id: str, state: SimulationState) -> None:
+    state_path = __get_state_path(project_id)
+    tmp_state_path = f"{state_path}.tmp-{os.getpid()}"
+    with open(tmp_state_path, 'w', encoding='utf-8') as fp:
+        json.dump(state.to_json(), fp, indent=2)
+    os.replace(tmp_state_path, state_path)
+
+
+def __scan_simulation_dir(project_id: str) -> SimulationState:
+    # Simulations started before the state file was introduced
+    step_nums = sorted(int(file.split('_')[-1]) for file in os.listdir(local_paths.get_simulation_dir(project_id))
+                       if file.startswith(SIMULATION_STEP_DIR_PREFIX))
+    return SimulationState([SimulationStep(step=step, dir_name=f"{SIMULATION_STEP_DIR_PREFIX}{step}",
+                                           status=StepStatus.CONFIGURED)
+                            for step in step_nums])
+
+
+def __get_state_path(project_id: str) -> str:
+    return os.path.join(local_paths.get_simulation_dir(project_id), SIMULATION_STATE_FILENAME)
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from hmse_utils.processing.local_fs_configuration.path_constants import SNAPSHOT_MANIFEST_FILENAME
+
+logger = logging.getLogger(__name__)
+
+__HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class SnapshotStats:
+    file_count: int = 0
+    linked_count: int = 0
+    written_count: int = 0
+    written_bytes: int = 0
+
+
+def create_snapshot(source_dirs: Dict[str, str], snapshot_dir: str,
+                    prev_snapshot_dir: Optional[str] = None) -> SnapshotStats:
+    """
+    Create a deduplicated snapshot of directories. Files are identified by content digest - a file with content
+    already stored in the previous snapshot (or earlier in this one) is hardlinked, only new content is written.
+    Each snapshot gets a manifest (relative path -> digest, size, modification time and inode of the source file).
+    Snapshot files share inodes, so they must never be modified in place.
+
+    @param source_dirs: Name of directory in the snapshot -> path of the directory to store
+    @param snapshot_dir: Directory of the new snapshot
+    @param prev_snapshot_dir: Directory of the previous snapshot, files are only copied if not specified
+    @return: Number of stored, linked and written files and size of written files
+    """
+    logger.debug(f"Creating snapshot {snapshot_dir} of {list(source_dirs.values())} "
+                 f"(previous snapshot: {prev_snapshot_dir})")
+    prev_files = read_manifest(prev_snapshot_dir) if prev_snapshot_dir else {}
+    # Digest -> path of a snapshot file with that content
+    stored_content = {entry["digest"]: os.path.join(prev_snapshot_dir, *rel_path.split('/'))
+                      for rel_path, entry in prev_files.items()}
+
+    stats = SnapshotStats()
+    files = {}
+    for snapshot_name, source_dir in source_dirs.items():
+        for dir_path, _, file_names in os.walk(source_dir):
+            rel_dir = os.path.relpath(dir_path, source_dir)
+            target_dir = os.path.normpath(os.path.join(snapshot_dir, snapshot_name, rel_dir))
+            os.makedirs(target_dir, exist_ok=True)
+            for file_name in file_names:
+                source_path = os.path.join(dir_path, file_name)
+                target_path = os.path.join(target_dir, file_name)
+                rel_path = os.path.normpath(os.path.join(snapshot_name, rel_dir, file_name)).replace(os.sep, '/')
+
+                stat = os.stat(source_path)
+                prev_entry = prev_files.get(rel_path)
+                source_state = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "inode": stat.st_ino}
+                if prev_entry and all(prev_entry.get(key) == value for key, value in source_state.items()):
+                    digest = prev_entry["digest"]  # same file, not modified since the previous snapshot
+                else:
+                    digest = __get_digest(source_path)
+
+                if digest in stored_content and __link(stored_content[digest], target_path):
+                    stats.linked_count += 1
+                else:
+                    shutil.copy2(source_path, target_path)
+                    stored_content[digest] = target_path
+                    stats.written_count += 1
+                    stats.written_bytes += stat.st_size
+                stats.file_count += 1
+                files[rel_path] = {"digest": digest, **source_state}
+
+    with open(os.path.join(snapshot_dir, SNAPSHOT_MANIFEST_FILENAME), 'w', encoding='utf-8') as fp:
+        json.dump({"files": files}, fp)
+    logger.debug(f"Snapshot {snapshot_dir} created: {stats}")
+    return stats
+
+
+def read_manifest(snapshot_dir: str) -> Dict[str, Dict]:
+    """
+    @param snapshot_dir: Directory of the snapshot
+    @return: Relative path (with '/' separators) -> digest, size, modification time and inode of the source file,
+             empty for directories without manifest (e.g. copied without snapshot store)
+    """
+    manifest_path = os.path.join(snapshot_dir, SNAPSHOT_MANIFEST_FILENAME)
+    if not os.path.isfile(manifest_path):
+        return {}
+    with open(manifest_path, 'r', encoding='utf-8') as fp:
+        return json.load(fp)["files"]
+
+
+def __get_digest(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(__HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def __link(stored_path: str, target_path: str) -> bool:
+    try:
+        os.link(stored_path, target_path)
+        return True
+    except OSError as e:
+        # Filesystem without hardlinks, link count limit reached or stored file removed
+        logger.debug(f"Could not link {stored_path} to {target_path}, copying instead: {e}")
+        return False
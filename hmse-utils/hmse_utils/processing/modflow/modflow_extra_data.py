@@ -1,12 +1,12 @@
 from dataclasses import dataclass
-from typing import Optional, List, Dict
+from typing import Optional, Dict
 
-import numpy as np
+from hmse_utils.processing.modflow.rch_zoning import RchZoning
 
 
 @dataclass
 class ModflowExtraData:
-    rch_shapes: List[np.ndarray]
+    rch_shapes: RchZoning
     start_date: Optional[str]
 
 
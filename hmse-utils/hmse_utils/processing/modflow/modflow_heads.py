@@ -0,0 +1,286 @@
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from flopy.modflow import Modflow, ModflowOc
+from flopy.utils import FormattedHeadFile
+
+from hmse_utils.processing.modflow import modflow_utils
+
+logger = logging.getLogger(__name__)
+
+# Used only for models without OC package, preferred first
+HEAD_FILE_EXTENSIONS = (".hds", ".bhd", ".hed", ".fhd")
+BINARY_HEAD_FILE_EXTENSION = ".hds"
+
+SINGLE_PRECISION_HEADER = np.dtype([("kstp", "<i4"), ("kper", "<i4"), ("pertim", "<f4"), ("totim", "<f4"),
+                                    ("text", "S16"), ("ncol", "<i4"), ("nrow", "<i4"), ("ilay", "<i4")])
+DOUBLE_PRECISION_HEADER = np.dtype([("kstp", "<i4"), ("kper", "<i4"), ("pertim", "<f8"), ("totim", "<f8"),
+                                    ("text", "S16"), ("ncol", "<i4"), ("nrow", "<i4"), ("ilay", "<i4")])
+RECORD_INDEX_DTYPE = np.dtype([("kstp", "<i4"), ("kper", "<i4"), ("pertim", "<f8"), ("totim", "<f8"),
+                               ("ncol", "<i4"), ("nrow", "<i4"), ("ilay", "<i4"), ("data_offset", "<i8")])
+
+
+class UnknownHeadFileFormat(RuntimeError):
+    pass
+
+
+class HeadOutputNotConfigured(RuntimeError):
+    pass
+
+
+class BinaryHeadFile:
+    """
+    Binary (unformatted) Modflow head file. The file is memory-mapped and only record headers are read on opening -
+    the record index allows accessing heads of any time step (by default the last one) without reading other records.
+    Exposes the subset of FormattedHeadFile interface used for coupling.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.header_dtype = get_binary_header_dtype(path)
+        self.value_dtype = np.dtype("<f4") if self.header_dtype is SINGLE_PRECISION_HEADER else np.dtype("<f8")
+        self.mmap = np.memmap(path, dtype=np.uint8, mode='r')
+        self.records = self.__read_record_index()
+        if len(self.records) == 0:
+            raise UnknownHeadFileFormat(f"No head records in file: {path}")
+        self.nlay = int(self.records["ilay"].max())
+        self.nrow = int(self.records["nrow"][0])
+        self.ncol = int(self.records["ncol"][0])
+
+    def get_times(self) -> List[float]:
+        return list(dict.fromkeys(self.records["totim"].tolist()))
+
+    def get_data(self, idx: Optional[int] = None, totim: Optional[float] = None) -> np.ndarray:
+        """
+        @param idx: Index of a record, heads of all layers of its time step are returned
+        @param totim: Simulation time of the time step, the last time step is used if neither idx nor totim is given
+        @return: Heads of the time step (copy), array of shape (nlay, nrow, ncol)
+        """
+        return np.array(self.get_view(idx, totim))
+
+    def get_view(self, idx: Optional[int] = None, totim: Optional[float] = None) -> np.ndarray:
+        """
+        Heads of a time step without reading the file - pages are loaded only for the accessed cells.
+        The view is read-only and must not be used after the file is overwritten (e.g. by a next Modflow run).
+
+        @param idx: Index of a record, heads of all layers of its time step are returned
+        @param totim: Simulation time of the time step, the last time step is used if neither idx nor totim is given
+        @return: Read-only array of shape (nlay, nrow, ncol) backed by the memory-mapped file
+        """
+        step_records = self.__get_step_records(idx, totim)
+        offsets = step_records["data_offset"]
+        is_strided = (len(step_records) == self.nlay
+                      and np.array_equal(step_records["ilay"], np.arange(1, self.nlay + 1))
+                      and len(np.unique(np.diff(offsets))) <= 1)
+        if is_strided:
+            # Layer records of a time step are equally spaced - a single strided view over all layers
+            layer_stride = int(offsets[1] - offsets[0]) if self.nlay > 1 else 0
+            return np.ndarray((self.nlay, self.nrow, self.ncol), dtype=self.value_dtype, buffer=self.mmap,
+                              offset=int(offsets[0]),
+                              strides=(layer_stride, self.ncol * self.value_dtype.itemsize,
+                                       self.value_dtype.itemsize))
+        # Layers missing or out of order - layers are copied into a new array
+        heads = np.stack([self.get_layer_view(layer, totim=step_records["totim"][0]) for layer in range(self.nlay)])
+        heads.flags.writeable = False
+        return heads
+
+    def get_layer_view(self, layer: int, idx: Optional[int] = None, totim: Optional[float] = None) -> np.ndarray:
+        """
+        @param layer: Zero-based layer index
+        @param idx: Index of a record, heads of the layer at the time step of the record are returned
+        @param totim: Simulation time of the time step, the last time step is used if neither idx nor totim is given
+        @return: Read-only array of shape (nrow, ncol) backed by the memory-mapped file
+        """
+        step_records = self.__get_step_records(idx, totim)
+        layer_records = step_records[step_records["ilay"] == layer + 1]
+        if len(layer_records) == 0:
+            raise ValueError(f"No heads of layer {layer} for time {step_records['totim'][0]} in file: {self.path}")
+        offset = int(layer_records["data_offset"][0])
+        layer_size = self.nrow * self.ncol * self.value_dtype.itemsize
+        return self.mmap[offset:offset + layer_size].view(self.value_dtype).reshape(self.nrow, self.ncol)
+
+    def close(self) -> None:
+        # Views returned earlier keep their own reference to the mapping
+        self.mmap = None
+
+    def __enter__(self) -> "BinaryHeadFile":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __get_step_records(self, idx: Optional[int], totim: Optional[float]) -> np.ndarray:
+        if idx is not None:
+            totim = self.records["totim"][idx]
+        elif totim is None:
+            totim = self.records["totim"][-1]
+        step_records = self.records[self.records["totim"] == totim]
+        if len(step_records) == 0:
+            raise ValueError(f"No heads for time {totim} in file: {self.path}")
+        return step_records
+
+    def __read_record_index(self) -> np.ndarray:
+        file_size = len(self.mmap)
+        header_size = self.header_dtype.itemsize
+        records = []
+        offset = 0
+        while offset + header_size <= file_size:
+            header = np.frombuffer(self.mmap, dtype=self.header_dtype, count=1, offset=offset)[0]
+            data_offset = offset + header_size
+            records.append((header["kstp"], header["kper"], header["pertim"], header["totim"],
+                            header["ncol"], header["nrow"], header["ilay"], data_offset))
+            offset = data_offset + int(header["ncol"]) * int(header["nrow"]) * self.value_dtype.itemsize
+        if offset > file_size:
+            # Record of a time step still being written by Modflow
+            logger.warning(f"Head file {self.path} ends with an incomplete record, ignoring it")
+            records.pop()
+        return np.array(records, dtype=RECORD_INDEX_DTYPE)
+
+
+def get_heads(head_file: Union[BinaryHeadFile, FormattedHeadFile], totim: Optional[float] = None) -> np.ndarray:
+    """
+    @param head_file: Opened head file
+    @param totim: Simulation time of the time step, the last time step is used if not given
+    @return: Heads of all layers at the time step - memory-mapped for binary head files
+    """
+    if isinstance(head_file, BinaryHeadFile):
+        return head_file.get_view(totim=totim)
+    return head_file.get_data(totim=totim)
+
+
+def get_period_times(head_file: Union[BinaryHeadFile, FormattedHeadFile]) -> Dict[int, float]:
+    """
+    @param head_file: Opened head file
+    @return: Zero-based stress period -> simulation time of its last time step with saved heads
+    """
+    records = head_file.records if isinstance(head_file, BinaryHeadFile) else head_file.recordarray
+    # Records are ordered by time, the last record of a stress period wins
+    return {int(kper) - 1: float(totim) for kper, totim in zip(records["kper"], records["totim"])}
+
+
+def get_layer_heads(head_file: Union[BinaryHeadFile, FormattedHeadFile], layer: int = 0) -> np.ndarray:
+    """
+    @param head_file: Opened head file
+    @param layer: Zero-based layer index
+    @return: Heads of the layer at the last time step - memory-mapped for binary head files
+    """
+    if isinstance(head_file, BinaryHeadFile):
+        return head_file.get_layer_view(layer)
+    return head_file.get_data(mflay=layer)
+
+
+def find_head_file(model_dir: str) -> Optional[str]:
+    """
+    Head file is the name file entry of the head save unit of the OC package - the model directory may also contain
+    head files the model does not write (e.g. stale ones uploaded with the model). Head files are searched
+    by extension only if the model has no name file or OC package.
+
+    @param model_dir: Directory of the Modflow model
+    @return: Name of the head file (binary or formatted), None if the model has no head output
+    """
+    name_file_entries = __read_name_file_entries(model_dir)
+    oc_file_name = next((file_name for file_type, file_name in name_file_entries.values() if file_type == "OC"), None)
+    if oc_file_name is not None and os.path.isfile(os.path.join(model_dir, oc_file_name)):
+        head_unit = ModflowOc.get_ocoutput_units(os.path.join(model_dir, oc_file_name))[0]
+        if head_unit in name_file_entries:
+            return name_file_entries[head_unit][1]
+        logger.warning(f"Head save unit {head_unit} of model in {model_dir} not found in name file")
+        return None
+
+    file_names = sorted(os.listdir(model_dir))
+    for ext in HEAD_FILE_EXTENSIONS:
+        for file_name in file_names:
+            if file_name.lower().endswith(ext):
+                return file_name
+    return None
+
+
+def get_head_file(model_dir: str) -> str:
+    """
+    @param model_dir: Directory of the Modflow model
+    @return: Name of the head file (binary or formatted)
+    @raise HeadOutputNotConfigured: The model does not save heads
+    """
+    head_file_name = find_head_file(model_dir)
+    if head_file_name is None:
+        raise HeadOutputNotConfigured(f"Modflow model in {model_dir} has no head output configured in OC package")
+    return head_file_name
+
+
+def open_head_file(path: str) -> Union[BinaryHeadFile, FormattedHeadFile]:
+    """
+    Open head file, format is detected from the file content (formatted head files
+    may also use binary head file extensions).
+
+    @param path: Path to the head file
+    @return: Head file providing heads of time steps with get_data()
+    """
+    if is_binary_head_file(path):
+        return BinaryHeadFile(path)
+    logger.debug(f"Reading formatted head file: {path}")
+    return FormattedHeadFile(path, precision="single")
+
+
+def is_binary_head_file(path: str) -> bool:
+    with open(path, 'rb') as fp:
+        # Formatted file starts with a text header, binary one with time step and stress period numbers
+        start = fp.read(8)
+    return any(byte not in b" \t\r\n0123456789" for byte in start)
+
+
+def get_binary_header_dtype(path: str) -> np.dtype:
+    """
+    @param path: Path to the binary head file
+    @return: Dtype of the record header (single or double precision)
+    @raise UnknownHeadFileFormat: No head record header found at the beginning of the file
+    """
+    with open(path, 'rb') as fp:
+        start = fp.read(DOUBLE_PRECISION_HEADER.itemsize)
+    for header_dtype in (SINGLE_PRECISION_HEADER, DOUBLE_PRECISION_HEADER):
+        text_offset = header_dtype.fields["text"][1]
+        if start[text_offset:text_offset + 16].strip().upper().endswith(b"HEAD"):
+            return header_dtype
+    raise UnknownHeadFileFormat(f"Unknown head file format: {path}")
+
+
+def configure_binary_heads(model: Modflow, nam_content: str) -> Optional[str]:
+    """
+    Switch head output of the model to binary - remove head format from the OC package (not written)
+    and redirect the head unit to a binary file in the name file.
+
+    @param model: Modflow model with OC package loaded
+    @param nam_content: Content of the model name file
+    @return: Name file content with binary head file, None if the model does not save heads
+    """
+    oc = model.get_package("OC")
+    head_unit = getattr(oc, "iuhead", None) if oc is not None else None
+    if not head_unit:
+        logger.warning(f"Model {model.name} does not save heads, binary heads not configured")
+        return None
+
+    head_file_name = f"{os.path.splitext(model.namefile)[0]}{BINARY_HEAD_FILE_EXTENSION}"
+    # Name file line: <file type> <unit> <file name> [options]
+    head_unit_line = re.compile(rf"^\s*DATA(\(BINARY\))?\s+{head_unit}\s+\S+.*$", re.IGNORECASE | re.MULTILINE)
+    if head_unit_line.search(nam_content) is None:
+        logger.warning(f"Head unit {head_unit} of model {model.name} not found in name file, "
+                       f"binary heads not configured")
+        return None
+    oc.chedfm = None
+    return head_unit_line.sub(f"DATA(BINARY) {head_unit} {head_file_name} REPLACE", nam_content, count=1)
+
+
+def __read_name_file_entries(model_dir: str) -> Dict[int, Tuple[str, str]]:
+    # Name file line: <file type> <unit> <file name> [options]
+    nam_file_name = modflow_utils.scan_for_modflow_file(model_dir, ext=".nam")
+    if nam_file_name is None:
+        return {}
+    entries = {}
+    with open(os.path.join(model_dir, nam_file_name), 'r') as fp:
+        for line in fp:
+            items = line.split()
+            if len(items) >= 3 and not items[0].startswith('#') and items[1].isdigit():
+                entries[int(items[1])] = (items[0].upper(), items[2])
+    return entries
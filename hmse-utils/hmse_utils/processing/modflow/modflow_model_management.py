@@ -1,93 +1,149 @@
 import logging
 import os
 import shutil
-from typing import Optional
+from typing import Optional, List, Dict
 
 import flopy
 import numpy as np
 from flopy.modflow import Modflow, ModflowBas
-from flopy.utils import FormattedHeadFile
 
 from hmse_utils.processing.local_fs_configuration import local_paths
 from hmse_utils.processing.local_fs_configuration.feedback_loop_file_management import find_previous_simulation_step_dir
-from hmse_utils.processing.modflow import modflow_utils, modflow_package_manager
+from hmse_utils.processing.local_fs_configuration.shape_store import ShapeStore
+from hmse_utils.processing.modflow import modflow_utils, modflow_package_manager, modflow_heads
 
 logger = logging.getLogger(__name__)
 
 
-def prepare_model_for_next_iteration(project_id: str, modflow_id: str) -> None:
+def prepare_model_for_next_iteration(project_id: str, modflow_id: str, binary_heads: bool = False) -> None:
     logger.debug(f"Preparing Modflow model {modflow_id} for next iteration in simulation project: {project_id}")
     prev_sim_step_dir = find_previous_simulation_step_dir(project_id)
     prev_modflow_dir = os.path.join(prev_sim_step_dir, 'modflow', modflow_id) if prev_sim_step_dir else None
     next_modflow_dir = local_paths.get_modflow_model_path(project_id, modflow_id, simulation_mode=True)
     ref_modflow_dir = local_paths.get_modflow_model_path(project_id, modflow_id, simulation_mode=False)
+    steps_dir = local_paths.get_modflow_model_path(project_id, modflow_id, simulation_mode=True, simulation_ref=True)
     step = 0 if not prev_sim_step_dir else int(prev_sim_step_dir.split('_')[-1]) + 1
-    __create_temporary_model(ref_modflow_dir, prev_modflow_dir, next_modflow_dir, step)
+    __create_temporary_model(ref_modflow_dir, steps_dir, prev_modflow_dir, next_modflow_dir, step, binary_heads)
 
 
 def get_avg_water_depth_for_shape(project_id: str,
                                   modflow_id: str,
                                   shape_id: str,
                                   use_modflow_results: bool) -> float:
-    logger.debug(f"Getting average water depth for Modflow model {modflow_id} in simulation project {project_id}")
+    return get_avg_water_depth_for_shapes(project_id, modflow_id, [shape_id], use_modflow_results)[shape_id]
+
+
+def get_avg_water_depth_for_shapes(project_id: str,
+                                   modflow_id: str,
+                                   shape_ids: List[str],
+                                   use_modflow_results: bool) -> Dict[str, float]:
+    """
+    Calculate average water depth (terrain level - water level) for many shapes at once.
+    Modflow model, heads and shape masks are read only once for all shapes.
+
+    @param project_id: ID of the simulated project
+    @param modflow_id: ID of the Modflow model
+    @param shape_ids: IDs of shapes to calculate water depth for
+    @param use_modflow_results: Use heads from Modflow results (binary or formatted head file) instead of starting heads
+    @return: Dictionary shape_id -> average water depth
+    """
+    logger.debug(f"Getting average water depth of {len(shape_ids)} shapes for Modflow model {modflow_id} "
+                 f"in simulation project {project_id}")
+    if not shape_ids:
+        return {}
+
     model_dir = local_paths.get_modflow_model_path(project_id, modflow_id, simulation_mode=True)
     nam_file_name = modflow_utils.scan_for_modflow_file(model_dir, ext=".nam")
 
     packages = ["dis", "bas6"]
-    if use_modflow_results:
-        fhd_file_name = modflow_utils.scan_for_modflow_file(model_dir, ext=".fhd")
-        fhd_data = FormattedHeadFile(os.path.join(model_dir, fhd_file_name))
-    else:
-        fhd_data = None
-
     model = Modflow.load(nam_file_name, model_ws=model_dir, load_only=packages, forgive=True)
-    mask = np.load(local_paths.get_shape_path(project_id, shape_id))
-    avg_terrain_lvl = __get_avg_terrain_level(model, shape_mask=mask)
-
-    inbound = next(pkg for pkg in model.packagelist if isinstance(pkg, ModflowBas)).ibound[0].array
-    avg_water_lvl = __get_avg_water_level(model, shape_mask=mask * inbound, fhd_data=fhd_data)
-
+    bas_package = next(pkg for pkg in model.packagelist if isinstance(pkg, ModflowBas))
     if use_modflow_results:
-        fhd_data.close()
-    return avg_terrain_lvl - avg_water_lvl
-
-
-def __get_avg_terrain_level(model: Modflow, shape_mask: np.ndarray) -> float:
-    logger.debug(f"Calculating average terrain level")
-    return float(np.average(model.modelgrid.top[shape_mask == 1]))
-
-
-def __get_avg_water_level(model: Modflow, shape_mask: np.ndarray,
-                          fhd_data: Optional[FormattedHeadFile] = None) -> float:
-    logger.debug(f"Calculating average water level")
-    if fhd_data:
-        water_lvl_array = fhd_data.get_data()[0]
+        head_file = modflow_heads.open_head_file(os.path.join(model_dir, modflow_heads.get_head_file(model_dir)))
+        water_lvl_array = modflow_heads.get_layer_heads(head_file, layer=0)
+        head_file.close()
     else:
-        bas_package = next(pkg for pkg in model.packagelist if isinstance(pkg, ModflowBas))
         water_lvl_array = bas_package.strt[0].array
-    return float(np.average(water_lvl_array[shape_mask == 1]))
 
+    masks = ShapeStore(local_paths.get_shapes_dir(project_id)).get_masks(shape_ids)
+    stacked_masks = np.array([masks[shape_id] for shape_id in shape_ids])
+    is_active = bas_package.ibound[0].array == 1
+
+    avg_terrain_lvl = __get_zonal_averages(stacked_masks, model.modelgrid.top)
+    avg_water_lvl = __get_zonal_averages(stacked_masks & is_active, water_lvl_array)
+    empty_shape_ids = [shape_id for shape_id, water_lvl in zip(shape_ids, avg_water_lvl) if np.isnan(water_lvl)]
+    if empty_shape_ids:
+        logger.warning(f"Shapes without active cells in Modflow model {modflow_id}, "
+                       f"average water depth is NaN: {empty_shape_ids}")
+    return {shape_id: float(terrain_lvl - water_lvl)
+            for shape_id, terrain_lvl, water_lvl in zip(shape_ids, avg_terrain_lvl, avg_water_lvl)}
+
+
+def __get_zonal_averages(stacked_masks: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    @param stacked_masks: Boolean array of shape (shapes, nrow, ncol)
+    @param values: Array of shape (nrow, ncol) to average
+    @return: Average of values inside every mask, NaN for empty masks
+    """
+    logger.debug(f"Calculating zonal averages for {len(stacked_masks)} shapes")
+    flat_masks = stacked_masks.reshape(len(stacked_masks), -1)
+    # Only cells inside shapes are read - values may be memory-mapped
+    covered_cells = np.flatnonzero(flat_masks.any(axis=0))
+    flat_masks = flat_masks[:, covered_cells]
+    flat_values = np.asarray(values).reshape(-1)[covered_cells].astype(float)
+    shape_cnt = len(flat_masks)
+
+    if np.all(flat_masks.sum(axis=0) <= 1):
+        # Disjoint shapes - single pass over labels of covered cells
+        labels = flat_masks.argmax(axis=0)
+        sums = np.bincount(labels, weights=flat_values, minlength=shape_cnt)
+        counts = np.bincount(labels, minlength=shape_cnt)
+    else:
+        sums = np.array([flat_values[flat_mask].sum() for flat_mask in flat_masks])
+        counts = flat_masks.sum(axis=1)
+
+    with np.errstate(invalid='ignore'):
+        return sums / counts
 
-def __create_temporary_model(ref_modflow_dir: str, prev_modflow_dir: Optional[str], new_modflow_dir: str, step: int):
+
+def __create_temporary_model(ref_modflow_dir: str, steps_dir: str, prev_modflow_dir: Optional[str],
+                             new_modflow_dir: str, step: int, binary_heads: bool):
     logger.debug(f"Creating temporary Modflow model based on reference model: {ref_modflow_dir} "
                  f"and previous model: {prev_modflow_dir}")
+    # Packages of all steps are compiled once per simulation, no step requires loading the whole model
+    try:
+        step_file_names = modflow_package_manager.get_compiled_step_file_names(steps_dir)
+    except FileNotFoundError:
+        shutil.rmtree(steps_dir, ignore_errors=True)
+        step_file_names = modflow_package_manager.compile_steps(ref_modflow_dir, steps_dir, binary_heads)
+
     shutil.rmtree(new_modflow_dir, ignore_errors=True)
-    shutil.copytree(ref_modflow_dir, new_modflow_dir)
-    dst_model = flopy.modflow.Modflow.load(modflow_utils.scan_for_modflow_file(new_modflow_dir, ext=".nam"),
-                                           model_ws=new_modflow_dir,
-                                           forgive=True)
+    shutil.copytree(ref_modflow_dir, new_modflow_dir,
+                    ignore=lambda src_dir, _: step_file_names if src_dir == ref_modflow_dir else [])
+    step_dir = modflow_package_manager.get_step_dir(steps_dir, step)
+    for file_name in step_file_names:
+        __link_or_copy(os.path.join(step_dir, file_name), os.path.join(new_modflow_dir, file_name))
 
     # Initial conditions from previous iteration
     if prev_modflow_dir is not None:
-        fhd_filename = modflow_utils.scan_for_modflow_file(prev_modflow_dir, ext=".fhd")
-        prev_model_fhd_path = os.path.join(prev_modflow_dir, fhd_filename)
-        shutil.copy(prev_model_fhd_path, os.path.join(new_modflow_dir, fhd_filename))
-
-        prev_model_fhd = FormattedHeadFile(prev_model_fhd_path)
+        head_file_name = modflow_heads.get_head_file(prev_modflow_dir)
+        prev_model_head_file_path = os.path.join(prev_modflow_dir, head_file_name)
+        shutil.copy(prev_model_head_file_path, os.path.join(new_modflow_dir, head_file_name))
+
+        dst_model = flopy.modflow.Modflow.load(modflow_utils.scan_for_modflow_file(new_modflow_dir, ext=".nam"),
+                                               model_ws=new_modflow_dir,
+                                               load_only=["dis", "bas6"],
+                                               forgive=True)
+        prev_model_heads = modflow_heads.open_head_file(prev_model_head_file_path)
         bas_package = next(pkg for pkg in dst_model.packagelist if isinstance(pkg, ModflowBas))
-        bas_package.strt = prev_model_fhd.get_data()
+        bas_package.strt = modflow_heads.get_heads(prev_model_heads)
         bas_package.write_file()
-        prev_model_fhd.close()
+        prev_model_heads.close()
+
 
-    # Crop packages to one timestep
-    modflow_package_manager.create_packages_for_step(dst_model, step)
+def __link_or_copy(src_path: str, dst_path: str) -> None:
+    # Compiled step packages are never modified, so models can share them
+    try:
+        os.link(src_path, dst_path)
+    except OSError:
+        shutil.copyfile(src_path, dst_path)
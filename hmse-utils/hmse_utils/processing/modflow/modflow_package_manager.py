@@ -1,10 +1,20 @@
+import json
 import logging
-from typing import Dict
+import os
+from typing import Dict, List, Union
 
 import flopy
+import numpy as np
 from flopy.modflow import Modflow, ModflowDis
+from flopy.utils import MfList
+
+from hmse_utils.processing.modflow import modflow_utils, modflow_heads
 
 logger = logging.getLogger(__name__)
+
+COMPILED_STEPS_FILENAME = "steps.json"
+
+
 def create_packages_for_step(model: Modflow, step: int):
     logger.debug("Creating modflow packages for next step")
     for pkg in model.packagelist:
@@ -16,11 +26,79 @@ def create_packages_for_step(model: Modflow, step: int):
             if any(map(lambda p: isinstance(pkg, p), __SPECIAL_TREATMENT_PACKAGES.keys())):
                 pkg.stress_period_data = __SPECIAL_TREATMENT_PACKAGES[pkg.__class__](stress_period_data, step)
             else:
-                stress_period_data.__data = {0: pkg.stress_period_data.data[step]}
-                stress_period_data.__vtype = {0: pkg.stress_period_data.vtype[step]}
+                pkg.stress_period_data = {0: handle_stress_periods_list(stress_period_data, step)}
             pkg.write_file()
 
 
+def compile_steps(ref_modflow_dir: str, steps_dir: str, binary_heads: bool = False) -> List[str]:
+    """
+    Split packages of a Modflow model into one-stress-period packages of every step, so that models
+    for consecutive simulation steps are created without loading the whole model.
+
+    @param ref_modflow_dir: Directory of the reference Modflow model
+    @param steps_dir: Directory for compiled steps, packages of each step are written to its step dir
+    @param binary_heads: Configure steps to save heads to a binary head file (name file is replaced as well)
+    @return: Names of files (packages) replaced in each step
+    """
+    logger.debug(f"Compiling steps of Modflow model {ref_modflow_dir} into {steps_dir} (binary heads: {binary_heads})")
+    nam_file_name = modflow_utils.scan_for_modflow_file(ref_modflow_dir, ext=".nam")
+    model = Modflow.load(nam_file_name, model_ws=ref_modflow_dir, forgive=True)
+    step_count = model.nper
+    step_packages = [pkg for pkg in model.packagelist
+                     if isinstance(pkg, ModflowDis) or 'stress_period_data' in pkg.__dict__]
+
+    nam_content = None
+    if binary_heads:
+        with open(os.path.join(ref_modflow_dir, nam_file_name), 'r') as fp:
+            nam_content = modflow_heads.configure_binary_heads(model, fp.read())
+
+    for step in range(step_count):
+        step_dir = get_step_dir(steps_dir, step)
+        os.makedirs(step_dir, exist_ok=True)
+        model.change_model_ws(step_dir)
+        # Slicing only rebinds package attributes, so the whole model is restored by restoring attribute dicts
+        package_attributes = [dict(vars(pkg)) for pkg in step_packages]
+        create_packages_for_step(model, step)
+        if nam_content is not None:
+            with open(os.path.join(step_dir, nam_file_name), 'w') as fp:
+                fp.write(nam_content)
+        for pkg, attributes in zip(step_packages, package_attributes):
+            vars(pkg).clear()
+            vars(pkg).update(attributes)
+
+    step_file_names = [pkg.file_name[0] for pkg in step_packages]
+    if nam_content is not None:
+        step_file_names.append(nam_file_name)
+    with open(os.path.join(steps_dir, COMPILED_STEPS_FILENAME), 'w', encoding='utf-8') as fp:
+        json.dump({"step_count": step_count,
+                   "step_file_names": step_file_names,
+                   "binary_heads": nam_content is not None}, fp)
+    return step_file_names
+
+
+def get_compiled_step_file_names(steps_dir: str) -> List[str]:
+    """
+    @param steps_dir: Directory of compiled steps
+    @return: Names of files (packages) replaced in each step
+    @raise FileNotFoundError: Steps were not compiled (or compilation was not finished)
+    """
+    with open(os.path.join(steps_dir, COMPILED_STEPS_FILENAME), 'r', encoding='utf-8') as fp:
+        return json.load(fp)["step_file_names"]
+
+
+def get_step_dir(steps_dir: str, step: int) -> str:
+    return os.path.join(steps_dir, f"step_{step:04d}")
+
+
+def handle_stress_periods_list(stress_period_data: MfList, step: int) -> Union[np.recarray, int]:
+    # Stress periods without data reuse data of the previous stress period
+    data = stress_period_data.data
+    for kper in sorted((kper for kper in data.keys() if kper <= step), reverse=True):
+        if not isinstance(data[kper], int) or data[kper] >= 0:
+            return data[kper]
+    return 0
+
+
 # TODO: Verify
 def handle_stress_periods_oc(stress_period_data: Dict, step: int):
     new_data = {}
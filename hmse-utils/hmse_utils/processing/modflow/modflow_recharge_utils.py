@@ -0,0 +1,66 @@
+import logging
+from typing import Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def get_transient_period_bounds(perlen: Sequence[float],
+                                steady_state: Sequence[bool]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Map each transient stress period to the range of daily Hydrus records it covers.
+    Steady state periods do not consume any Hydrus records.
+
+    @param perlen: Duration of each Modflow stress period
+    @param steady_state: Flags marking steady state stress periods
+    @return: Tuple (transient stress period indices, first record index, last record index)
+    """
+    durations = np.asarray(perlen).astype(int)
+    is_transient = ~np.asarray(steady_state, dtype=bool)
+    consumed = np.where(is_transient, durations, 0)
+
+    starts = np.cumsum(consumed) - consumed
+    ends = starts + consumed - 1
+    transient_periods = np.flatnonzero(is_transient)
+    return transient_periods, starts[transient_periods], ends[transient_periods]
+
+
+def calculate_average_recharge(sum_v_bot: np.ndarray,
+                               perlen: Sequence[float],
+                               transient_periods: np.ndarray,
+                               starts: np.ndarray,
+                               ends: np.ndarray) -> np.ndarray:
+    """
+    Calculate average recharge of every transient stress period based on cumulative Hydrus bottom flux.
+
+    @param sum_v_bot: Daily cumulative bottom flux (sum(vBot)) or a single manual recharge value
+    @param perlen: Duration of each Modflow stress period
+    @param transient_periods: Indices of transient stress periods
+    @param starts: Index of the first record of each transient stress period
+    @param ends: Index of the last record of each transient stress period
+    @return: Average recharge for each transient stress period
+    """
+    if np.ndim(sum_v_bot) == 0:
+        return np.full(len(transient_periods), float(sum_v_bot))
+
+    durations = np.asarray(perlen, dtype=float)[transient_periods]
+    return (sum_v_bot[ends] - sum_v_bot[starts]) / durations
+
+
+def scatter_recharge(recharge_stack: np.ndarray,
+                     mask: np.ndarray,
+                     transient_periods: np.ndarray,
+                     period_recharge: np.ndarray) -> None:
+    """
+    Assign recharge of each transient stress period to the masked cells of the recharge stack (in place).
+
+    @param recharge_stack: Recharge array of shape (nper, nrow, ncol)
+    @param mask: Boolean mask of shape (nrow, ncol) marking cells to update
+    @param transient_periods: Indices of transient stress periods
+    @param period_recharge: Recharge value for each transient stress period
+    """
+    logger.debug(f"Scattering recharge of {len(transient_periods)} stress periods")
+    flat_stack = recharge_stack.reshape(recharge_stack.shape[0], -1)
+    cell_idx = np.flatnonzero(mask)
+    flat_stack[transient_periods[:, np.newaxis], cell_idx[np.newaxis, :]] = period_recharge[:, np.newaxis]
@@ -0,0 +1,193 @@
+import json
+import logging
+import os
+import shutil
+import uuid
+from dataclasses import dataclass, field
+from typing import List, Tuple, Union
+
+import numpy as np
+from flopy.utils import FormattedHeadFile
+
+from hmse_utils.processing.local_fs_configuration.path_constants import RESULTS_MANIFEST_FILENAME
+from hmse_utils.processing.modflow import modflow_heads
+from hmse_utils.processing.modflow.modflow_heads import BinaryHeadFile
+
+logger = logging.getLogger(__name__)
+
+RESULTS_FORMAT_VERSION = 2
+# Pyramid levels are added until the coarsest level fits in a tile of this size
+PYRAMID_TILE_SIZE = 256
+# Heads of dry and inactive cells (HDRY, HNOFLO) are usually marked with huge values
+NO_DATA_THRESHOLD = 1e20
+
+
+class NoHeadsSaved(RuntimeError):
+    pass
+
+
+@dataclass
+class ResultsChunk:
+    period: int  # zero-based stress period
+    totim: float  # simulation time of the exported time step (last one of the stress period)
+    file_name: str  # .npy file with heads of all layers, relative to the results dir
+
+
+@dataclass
+class PyramidLevel:
+    level: int
+    factor: int  # each cell of the level averages factor x factor cells of the grid
+    shape: Tuple[int, int, int]  # nlay, nrow, ncol of the level
+    data_offset: int  # offset of array data in .npy files of the level
+
+
+@dataclass
+class ResultsManifest:
+    """
+    Chunked Modflow results - heads of each stress period are stored in a separate .npy file,
+    so periods can be read (or memory-mapped) one at a time. Each period has a pyramid of downsampled
+    copies (level 0 - full grid), so any area can be read at a limited resolution.
+    """
+    shape: Tuple[int, int, int]  # nlay, nrow, ncol
+    dtype: str
+    results_id: str = field(default_factory=lambda: uuid.uuid4().hex)  # changed by every export
+    chunks: List[ResultsChunk] = field(default_factory=list)
+    levels: List[PyramidLevel] = field(default_factory=list)
+
+    def to_json(self) -> dict:
+        return {
+            "format_version": RESULTS_FORMAT_VERSION,
+            "results_id": self.results_id,
+            "shape": list(self.shape),
+            "dtype": self.dtype,
+            "chunks": [{"period": chunk.period, "totim": chunk.totim, "file": chunk.file_name}
+                       for chunk in self.chunks],
+            "levels": [{"level": level.level, "factor": level.factor, "shape": list(level.shape),
+                        "data_offset": level.data_offset}
+                       for level in self.levels]
+        }
+
+    @staticmethod
+    def from_json(manifest_json: dict) -> "ResultsManifest":
+        return ResultsManifest(shape=tuple(manifest_json["shape"]),
+                               dtype=manifest_json["dtype"],
+                               results_id=manifest_json.get("results_id", ""),
+                               chunks=[ResultsChunk(period=chunk["period"],
+                                                    totim=chunk["totim"],
+                                                    file_name=chunk["file"])
+                                       for chunk in manifest_json["chunks"]],
+                               levels=[PyramidLevel(level=level["level"],
+                                                    factor=level["factor"],
+                                                    shape=tuple(level["shape"]),
+                                                    data_offset=level["data_offset"])
+                                       for level in manifest_json.get("levels", [])])
+
+
+def export_heads(head_file: Union[BinaryHeadFile, FormattedHeadFile], results_dir: str) -> ResultsManifest:
+    """
+    Export heads of every stress period (last time step with saved heads) to chunked results with pyramids
+    of downsampled heads, one period at a time. The manifest is written last, results without manifest are incomplete.
+
+    @param head_file: Opened head file of the simulated Modflow model
+    @param results_dir: Directory for results, previous results are removed
+    @return: Manifest of exported results
+    @raise NoHeadsSaved: Head file contains no heads
+    """
+    logger.debug(f"Exporting heads to chunked results in {results_dir}")
+    shutil.rmtree(results_dir, ignore_errors=True)
+    os.makedirs(results_dir)
+
+    period_times = modflow_heads.get_period_times(head_file)
+    if not period_times:
+        raise NoHeadsSaved("No heads saved in the head file - check output control settings of the Modflow model")
+
+    manifest = None
+    for period, totim in sorted(period_times.items()):
+        heads = modflow_heads.get_heads(head_file, totim=totim)
+        if manifest is None:
+            manifest = ResultsManifest(shape=heads.shape, dtype=heads.dtype.str)
+        chunk = ResultsChunk(period=period, totim=totim, file_name=f"period_{period:05d}.npy")
+        levels = [__save_level(os.path.join(results_dir, chunk.file_name), heads, level=0, factor=1)]
+
+        # Sums and counts of cells with data in each cell of the level - averages over the grid are exact
+        has_data = np.abs(heads) < NO_DATA_THRESHOLD
+        sums, counts = np.where(has_data, heads, 0.0), has_data.astype(np.int64)
+        while max(sums.shape[1:]) > PYRAMID_TILE_SIZE:
+            sums, counts = __sum_blocks(sums), __sum_blocks(counts)
+            level_heads = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan).astype(heads.dtype)
+            level = len(levels)
+            levels.append(__save_level(os.path.join(results_dir, get_level_file_name(chunk, level)), level_heads,
+                                       level=level, factor=2 ** level))
+        manifest.levels = levels
+        manifest.chunks.append(chunk)
+
+    manifest_path = os.path.join(results_dir, RESULTS_MANIFEST_FILENAME)
+    with open(f"{manifest_path}.tmp", 'w', encoding='utf-8') as fp:
+        json.dump(manifest.to_json(), fp, indent=2)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    return manifest
+
+
+def get_level_file_name(chunk: ResultsChunk, level: int) -> str:
+    """
+    @param chunk: Chunk of the stress period
+    @param level: Pyramid level, 0 - full grid
+    @return: Name of the .npy file with heads of the period at the pyramid level
+    """
+    if level == 0:
+        return chunk.file_name
+    return f"{os.path.splitext(chunk.file_name)[0]}_level_{level}.npy"
+
+
+def read_manifest(results_dir: str) -> ResultsManifest:
+    """
+    @param results_dir: Directory with chunked results
+    @return: Manifest of results
+    @raise FileNotFoundError: Results were not exported (or export was not finished)
+    """
+    with open(os.path.join(results_dir, RESULTS_MANIFEST_FILENAME), 'r', encoding='utf-8') as fp:
+        return ResultsManifest.from_json(json.load(fp))
+
+
+def load_period_heads(results_dir: str, chunk: ResultsChunk) -> np.ndarray:
+    """
+    @param results_dir: Directory with chunked results
+    @param chunk: Chunk of the stress period
+    @return: Read-only, memory-mapped heads of the stress period, array of shape (nlay, nrow, ncol)
+    """
+    return np.load(os.path.join(results_dir, chunk.file_name), mmap_mode='r')
+
+
+def export_json_view(results_dir: str, json_path: str, downsample: int = 1) -> None:
+    """
+    Write results as JSON list of heads of each stress period ([period][layer][row][col]),
+    periods are written one at a time.
+
+    @param results_dir: Directory with chunked results
+    @param json_path: Path of the JSON file
+    @param downsample: Only every n-th row and column is written
+    """
+    logger.debug(f"Exporting JSON view of results {results_dir} (downsampled {downsample}x) to {json_path}")
+    manifest = read_manifest(results_dir)
+    with open(json_path, 'w') as handle:
+        handle.write('[')
+        for i, chunk in enumerate(manifest.chunks):
+            heads = load_period_heads(results_dir, chunk)[:, ::downsample, ::downsample]
+            if i > 0:
+                handle.write(', ')
+            json.dump(heads.tolist(), handle)
+        handle.write(']')
+
+
+def __save_level(path: str, heads: np.ndarray, level: int, factor: int) -> PyramidLevel:
+    np.save(path, heads)
+    return PyramidLevel(level=level, factor=factor, shape=heads.shape,
+                        data_offset=os.path.getsize(path) - heads.nbytes)
+
+
+def __sum_blocks(values: np.ndarray) -> np.ndarray:
+    # Sum of 2x2 blocks of each layer, grid is padded with zeros to even size
+    nlay, nrow, ncol = values.shape
+    padded = np.zeros((nlay, nrow + nrow % 2, ncol + ncol % 2), dtype=values.dtype)
+    padded[:, :nrow, :ncol] = values
+    return padded.reshape(nlay, padded.shape[1] // 2, 2, padded.shape[2] // 2, 2).sum(axis=(2, 4))
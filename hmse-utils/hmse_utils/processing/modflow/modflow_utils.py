@@ -1,7 +1,6 @@
 import copy
 import logging
 import os
-from collections import deque
 from typing import List, Tuple, Optional
 from zipfile import ZipFile
 
@@ -14,6 +13,7 @@ from hmse_utils.processing.model_exceptions import ModflowMissingFileError, Modf
 from hmse_utils.processing.modflow.modflow_extra_data import ModflowExtraData, extract_extra_from_model
 from hmse_utils.processing.modflow.modflow_metadata import ModflowMetadata
 from hmse_utils.processing.modflow.modflow_step import ModflowStepType, ModflowStep
+from hmse_utils.processing.modflow.rch_zoning import RchZoning, label_rch_zones
 from hmse_utils.processing.unit_manager import LengthUnit
 
 logger = logging.getLogger(__name__)
@@ -90,13 +90,13 @@ def scale_cells_size(row_cells: List[float],
     return list(row_cells), list(col_cells), int(total_width), int(total_height)
 
 
-def get_shapes_from_rch(model_path: str, model_shape: Tuple[int, int]) -> Tuple[List[np.ndarray], np.ndarray]:
+def get_shapes_from_rch(model_path: str, model_shape: Tuple[int, int]) -> Tuple[RchZoning, np.ndarray]:
     """
-    Defines shapes masks for uploaded Modflow model based on recharge
+    Defines shapes for uploaded Modflow model based on recharge
 
     @param model_path: Path of Modflow model
     @param model_shape: Tuple representing size of the Modflow project (rows, cols)
-    @return: List of shapes read from Modflow project
+    @return: Zoning of the recharge array (masks of shapes are generated on demand) and inactive cells mask
     """
 
     logger.debug(f"Extracting RCH shapes for modflow mode under path: {model_path}")
@@ -109,64 +109,12 @@ def get_shapes_from_rch(model_path: str, model_shape: Tuple[int, int]) -> Tuple[
     stress_period = 0
     layer = 0
 
-    recharge_masks = []
-    is_checked_array = np.full(model_shape, False)
     recharge_array = modflow_model.rch.rech.array[stress_period][layer]
-    modflow_rows, modflow_cols = model_shape
-
-    for row in range(modflow_rows):
-        for col in range(modflow_cols):
-            if not is_checked_array[row][col]:
-                recharge_masks.append(np.zeros(model_shape))
-                __fill_mask_iterative(mask=recharge_masks[-1], recharge_array=recharge_array,
-                                      is_checked_array=is_checked_array,
-                                      project_shape=model_shape,
-                                      row=row, col=col,
-                                      value=recharge_array[row][col])
+    rch_zoning = label_rch_zones(recharge_array.reshape(model_shape))
 
     ibound = next(pkg for pkg in modflow_model.packagelist if isinstance(pkg, ModflowBas)).ibound[0].array
     inactive_cells = np.where(ibound == 0, 1, 0)
-    return recharge_masks, inactive_cells
-
-
-def __fill_mask_iterative(mask: np.ndarray,
-                          recharge_array: np.ndarray,
-                          is_checked_array: np.ndarray,
-                          project_shape: Tuple[int, int],
-                          row: int,
-                          col: int,
-                          value: float):
-    """
-    Fill given mask with 1's according to recharge array (using DFS)
-
-    @param mask: Binary mask of current shape - initially filled with 0's
-    @param recharge_array: 2d array filled with modflow model recharge values
-    @param is_checked_array: Control array - 'True' means that given cell was already used in one of the masks
-    @param project_shape: Tuple representing shape of the Modflow project (rows, cols)
-    @param row: Current column index
-    @param col: Current row index
-    @param value: Recharge value of current mask
-    @return: None (result inside variable @mask)
-    """
-    modflow_rows, modflow_cols = project_shape
-
-    stack = deque()
-    stack.append((row, col))
-
-    while stack:
-        cur_row, cur_col = stack.pop()
-        # return condition - out of bounds or given cell was already used
-        if cur_row < 0 or cur_row >= modflow_rows or cur_col < 0 or cur_col >= modflow_cols or \
-                is_checked_array[cur_row][cur_col]:
-            continue
-
-        if recharge_array[cur_row][cur_col] == value:
-            is_checked_array[cur_row][cur_col] = True
-            mask[cur_row][cur_col] = 1
-            stack.append((cur_row - 1, cur_col))
-            stack.append((cur_row + 1, cur_col))
-            stack.append((cur_row, cur_col - 1))
-            stack.append((cur_row, cur_col + 1))
+    return rch_zoning, inactive_cells
 
 
 def scan_for_modflow_file(model_path: str, ext: str = ".nam") -> Optional[str]:
@@ -0,0 +1,100 @@
+import logging
+from dataclasses import dataclass
+from typing import Tuple, Iterator
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RchZoning:
+    """
+    Zones of an RCH array - 4-connected regions of cells with equal recharge value.
+    Zones are numbered from 1 in row-major order of their first cell.
+
+    @param labels: Label raster of shape (nrow, ncol) - zone number of every cell
+    @param zone_values: Recharge value of each zone
+    @param bounding_boxes: Array of shape (zones, 4) - (row start, row stop, col start, col stop) of each zone
+    @param cell_counts: Number of cells of each zone
+    """
+    labels: np.ndarray
+    zone_values: np.ndarray
+    bounding_boxes: np.ndarray
+    cell_counts: np.ndarray
+
+    @property
+    def zone_count(self) -> int:
+        return len(self.zone_values)
+
+    def get_bounding_box(self, zone_idx: int) -> Tuple[slice, slice]:
+        row_start, row_stop, col_start, col_stop = self.bounding_boxes[zone_idx]
+        return slice(row_start, row_stop), slice(col_start, col_stop)
+
+    def get_mask(self, zone_idx: int) -> np.ndarray:
+        """
+        @param zone_idx: Index of the zone (0-based, zone number - 1)
+        @return: Dense boolean mask of shape (nrow, ncol) marking cells of the zone
+        """
+        bounding_box = self.get_bounding_box(zone_idx)
+        mask = np.zeros(self.labels.shape, dtype=bool)
+        mask[bounding_box] = self.labels[bounding_box] == zone_idx + 1
+        return mask
+
+    def iter_masks(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Lazily generate dense masks of all zones, one at a time.
+
+        @return: Iterator of (zone index, boolean mask of shape (nrow, ncol))
+        """
+        for zone_idx in range(self.zone_count):
+            yield zone_idx, self.get_mask(zone_idx)
+
+
+def label_rch_zones(recharge_array: np.ndarray) -> RchZoning:
+    """
+    Split recharge array into zones of 4-connected cells sharing the same recharge value.
+    Neighbouring cells with equal values are linked in a sparse graph, zones are its connected components.
+
+    @param recharge_array: 2d array filled with Modflow model recharge values
+    @return: Zoning of the recharge array
+    """
+    logger.debug(f"Labeling RCH zones for recharge array of shape: {recharge_array.shape}")
+    cell_count = recharge_array.size
+    cell_idx = np.arange(cell_count).reshape(recharge_array.shape)
+
+    same_as_right = recharge_array[:, :-1] == recharge_array[:, 1:]
+    same_as_below = recharge_array[:-1, :] == recharge_array[1:, :]
+    edges_from = np.concatenate([cell_idx[:, :-1][same_as_right], cell_idx[:-1, :][same_as_below]])
+    edges_to = np.concatenate([cell_idx[:, 1:][same_as_right], cell_idx[1:, :][same_as_below]])
+    graph = scipy.sparse.coo_matrix((np.ones(len(edges_from), dtype=np.int8), (edges_from, edges_to)),
+                                    shape=(cell_count, cell_count))
+    zone_count, components = scipy.sparse.csgraph.connected_components(graph, directed=False)
+
+    # Renumber zones by the position of their first cell (row-major)
+    _, first_cells = np.unique(components, return_index=True)
+    zone_order = np.argsort(first_cells)
+    zone_numbers = np.empty(zone_count, dtype=np.int32)
+    zone_numbers[zone_order] = np.arange(1, zone_count + 1, dtype=np.int32)
+    labels = zone_numbers[components].reshape(recharge_array.shape)
+
+    cell_counts = np.bincount(labels.ravel(), minlength=zone_count + 1)[1:]
+    logger.debug(f"Found {zone_count} RCH zones")
+    return RchZoning(labels=labels,
+                     zone_values=recharge_array.ravel()[first_cells[zone_order]],
+                     bounding_boxes=__get_bounding_boxes(labels, cell_counts),
+                     cell_counts=cell_counts)
+
+
+def __get_bounding_boxes(labels: np.ndarray, cell_counts: np.ndarray) -> np.ndarray:
+    # Cells grouped by zone, kept in row-major order inside each group
+    cells_by_zone = np.argsort(labels.ravel(), kind="stable")
+    rows, cols = np.divmod(cells_by_zone, labels.shape[1])
+    group_starts = np.cumsum(cell_counts) - cell_counts
+    group_ends = group_starts + cell_counts - 1
+    return np.stack([rows[group_starts],
+                     rows[group_ends] + 1,
+                     np.minimum.reduceat(cols, group_starts),
+                     np.maximum.reduceat(cols, group_starts) + 1], axis=1)
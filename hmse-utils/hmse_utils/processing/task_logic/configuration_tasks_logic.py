@@ -1,15 +1,12 @@
-import json
 import logging
 import os
 import shutil
-from typing import Dict, Union
-
-import flopy
-import numpy as np
+from typing import Dict, Optional, Union
 
 from hmse_utils.processing.hydrus import hydrus_utils, hydrus_model_management
-from hmse_utils.processing.local_fs_configuration import local_paths, feedback_loop_file_management
-from hmse_utils.processing.modflow import modflow_model_management, modflow_utils
+from hmse_utils.processing.local_fs_configuration import local_paths, feedback_loop_file_management, simulation_state
+from hmse_utils.processing.local_fs_configuration.simulation_state import StepStatus
+from hmse_utils.processing.modflow import modflow_model_management, modflow_heads, modflow_results
 
 logger = logging.getLogger(__name__)
 
@@ -32,42 +29,39 @@ def preserve_reference_hydrus_models(project_id: str, **kwargs):
                     local_paths.get_hydrus_dir(project_id, simulation_mode=True, simulation_ref=True))
 
 
-def extract_output_to_json(project_id: str, modflow_id: str, **kwargs):
-    logger.debug(f"Extracting simulation output to JSON file for project: {project_id}")
+def extract_output_to_json(project_id: str, modflow_id: str, json_downsample: Optional[int] = 1, **kwargs):
+    logger.debug(f"Extracting simulation output for project: {project_id}")
     modflow_dir = local_paths.get_modflow_model_path(project_id, modflow_id, simulation_mode=True)
-    nam_file = modflow_utils.scan_for_modflow_file(modflow_dir)
-    modflow_model = flopy.modflow.Modflow.load(nam_file, model_ws=modflow_dir, forgive=True)
-
-    fhd_path = modflow_utils.scan_for_modflow_file(modflow_dir, ext=".fhd")
-    if fhd_path is not None:
-        fhd_path = os.path.join(modflow_dir, fhd_path)
-        modflow_output = flopy.utils.formattedfile.FormattedHeadFile(fhd_path, precision="single")
-
-        result_fhd = np.array([modflow_output.get_data(idx=stress_period)
-                               for stress_period in range(modflow_model.nper)])
+    head_file_name = modflow_heads.find_head_file(modflow_dir)
+    if head_file_name is None:
+        logger.warning(f"Skipping output export for modflow model {modflow_id} in project {project_id} "
+                       f"- no head output file configured.")
+        return
 
-        with open(local_paths.get_output_json_path(project_id), 'w') as handle:
-            json.dump(result_fhd.tolist(), handle, indent=2)
-            modflow_output.close()
-    else:
-        logger.warning(f"Skipping JSON output export for modflow model {modflow_id} in project {project_id} "
-                       f"- no FHD output file configured.")
+    modflow_output = modflow_heads.open_head_file(os.path.join(modflow_dir, head_file_name))
+    results_dir = local_paths.get_output_dir(project_id)
+    modflow_results.export_heads(modflow_output, results_dir)
+    modflow_output.close()
+    if json_downsample:
+        modflow_results.export_json_view(results_dir, local_paths.get_output_json_path(project_id), json_downsample)
 
 
 def initialize_feedback_iteration(project_id: str, modflow_id: str, spin_up: int,
                                   shapes_to_hydrus: Dict[str, Union[str, float]],
+                                  preparation_workers: Optional[int] = 1,
+                                  binary_heads: bool = False,
                                   **kwargs):
     logger.debug(f"Initializing new feedback iteration for project: {project_id}")
-    modflow_model_management.prepare_model_for_next_iteration(project_id, modflow_id)
+    modflow_model_management.prepare_model_for_next_iteration(project_id, modflow_id, binary_heads)
     hydrus_ids_data = hydrus_utils.get_compound_hydrus_ids_for_feedback_loop(shapes_to_hydrus)
 
-    for ref_hydrus_id, compound_hydrus_id in hydrus_ids_data:
-        hydrus_model_management.prepare_model_for_next_iteration(
-            project_id=project_id,
-            ref_hydrus_id=ref_hydrus_id,
-            compound_hydrus_id=compound_hydrus_id,
-            spin_up=spin_up
-        )
+    hydrus_model_management.prepare_models_for_next_iteration(
+        project_id=project_id,
+        hydrus_ids=hydrus_ids_data,
+        spin_up=spin_up,
+        workers=preparation_workers
+    )
+    simulation_state.update_current_step_status(project_id, StepStatus.MODELS_PREPARED)
 
 
 def create_hydrus_models_for_zones(project_id: str, shapes_to_hydrus: Dict[str, Union[str, float]], **kwargs):
@@ -1,8 +1,11 @@
 import logging
-from typing import Dict, Union
+from typing import Dict, Optional, Union
 
 from hmse_utils.processing import data_passing_utils
 from hmse_utils.processing.hydrus import hydrus_utils
+from hmse_utils.processing.hydrus.hydrus_conductivity import DEFAULT_TABLE_TOLERANCE
+from hmse_utils.processing.local_fs_configuration import simulation_state
+from hmse_utils.processing.local_fs_configuration.simulation_state import StepStatus
 from hmse_utils.processing.modflow.modflow_metadata import ModflowMetadata
 
 logger = logging.getLogger(__name__)
@@ -41,43 +44,49 @@ def transfer_data_from_hydrus_to_modflow(project_id: str, shapes_to_hydrus: Dict
         model_to_shapes_mapping=model_to_shapes_mapping,
         feedback_loop=is_feedback_loop
     )
+    if is_feedback_loop:
+        simulation_state.update_current_step_status(project_id, StepStatus.RECHARGE_TRANSFERRED)
 
 
 def transfer_data_from_modflow_to_hydrus(project_id: str,
                                          shapes_to_hydrus: Dict[str, Union[str, float]],
                                          modflow_metadata: ModflowMetadata,
+                                         kh_tolerance: Optional[float] = DEFAULT_TABLE_TOLERANCE,
                                          **kwargs):
     logger.debug(f"Transferring data from modflow to hydrus profiles in project: {project_id}")
     __transfer_from_modflow_to_hydrus(
         project_id=project_id,
         shapes_to_hydrus=shapes_to_hydrus,
         modflow_metadata=modflow_metadata,
-        use_modflow_results=True
+        use_modflow_results=True,
+        kh_tolerance=kh_tolerance
     )
 
 
 def transfer_data_from_modflow_to_hydrus_init_transient(project_id: str,
                                                         shapes_to_hydrus: Dict[str, Union[str, float]],
                                                         modflow_metadata: ModflowMetadata,
+                                                        kh_tolerance: Optional[float] = DEFAULT_TABLE_TOLERANCE,
                                                         **kwargs):
     logger.debug(f"Transferring data from modflow to hydrus profiles (first step transient) in project: {project_id}")
     __transfer_from_modflow_to_hydrus(
         project_id=project_id,
         shapes_to_hydrus=shapes_to_hydrus,
         modflow_metadata=modflow_metadata,
-        use_modflow_results=False
+        use_modflow_results=False,
+        kh_tolerance=kh_tolerance
     )
 
 
 def __transfer_from_modflow_to_hydrus(project_id: str,
                                       shapes_to_hydrus: Dict[str, Union[str, float]],
                                       modflow_metadata: ModflowMetadata,
-                                      use_modflow_results: bool):
-    for shape_id, plain_hydrus_id in shapes_to_hydrus.items():
-        if not isinstance(plain_hydrus_id, str):
-            continue
-        data_passing_utils.transfer_water_level_to_hydrus(project_id,
-                                                          plain_hydrus_id,
-                                                          modflow_metadata,
-                                                          shape_id,
-                                                          use_modflow_results)
+                                      use_modflow_results: bool,
+                                      kh_tolerance: Optional[float]):
+    shapes_with_hydrus = {shape_id: plain_hydrus_id for shape_id, plain_hydrus_id in shapes_to_hydrus.items()
+                          if isinstance(plain_hydrus_id, str)}
+    data_passing_utils.transfer_water_levels_to_hydrus(project_id,
+                                                       shapes_with_hydrus,
+                                                       modflow_metadata,
+                                                       use_modflow_results,
+                                                       kh_tolerance)
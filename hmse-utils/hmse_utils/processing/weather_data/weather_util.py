@@ -1,64 +1,113 @@
-import csv
+import hashlib
 import logging
+import os
 from collections import defaultdict
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
 
 from hmse_utils.processing import julian_calendar_manager
 from hmse_utils.processing.hydrus import hydrus_utils
-from hmse_utils.processing.hydrus.file_processing.selector_in_processor import SelectorInProcessor
+from hmse_utils.processing.hydrus.file_processing.atmosph_in_processor import AtmosphInProcessor
+from hmse_utils.processing.hydrus.file_processing.meteo_in_processor import MeteoInProcessor
+from hmse_utils.processing.hydrus.file_processing.selector_in import get_selector_in
 
 logger = logging.getLogger(__name__)
-def read_weather_csv(filepath: str, start_date: Optional[datetime] = None, record_count: Optional[int] = None):
+def read_weather_csv(filepath: str, start_date: Optional[datetime] = None, record_count: Optional[int] = None,
+                     cache_path: Optional[str] = None):
     """
     Reads the data from a SWAT weather data .csv file. Returns the data as a dict.
 
     :param filepath: the path to the file we want to read from
+    :param cache_path: path of the binary (.npz) sidecar with parsed file contents, see: read_weather_columns
     :return: a dictionary of {str: list}, a mapping of column names to lists of values in said columns
     """
+    columns = read_weather_columns(filepath, start_date, record_count, cache_path)
+    return defaultdict(list, {column: values.tolist() for column, values in columns.items()})
 
-    logger.debug(f"Reading CSV with weather data in SWAT format under path {filepath}")
-    data = defaultdict(list)
-    file = open(filepath)
-    reader = csv.DictReader(file)
-    jul_day_iter = -1
-
-    found_start_date = start_date is None
-
-    for line in reader:
-        data_read = False
-        for column, value in line.items():
-            if column == "Date":
-                date_parts = list(map(int, value.split('/')))
-                dt_date = datetime(month=date_parts[0], day=date_parts[1], year=date_parts[2])
-                if dt_date == start_date:
-                    found_start_date = True
-
-            if not found_start_date:
-                continue
-
-            # a None pops up among the keys for some reason, ignore it
-            if column is None:
-                continue
-
-            # for everything except date cast the numeric string to a true float
-            if column != "Date":
-                value = float(value)
-            else:
-                if jul_day_iter <= 0:
-                    jul_day_iter = julian_calendar_manager.date_to_julian(value)
-                value = jul_day_iter
-                jul_day_iter += 1
-
-            data_read = True
-            data[column].append(value)
-
-        if data_read and record_count is not None:
-            record_count -= 1
-            if record_count <= 0:
-                break
 
-    return data
+def read_weather_columns(filepath: str, start_date: Optional[datetime] = None,
+                         record_count: Optional[int] = None, cache_path: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """
+    Reads the data from a SWAT weather data .csv file into typed columns, parsed in a single call.
+    Dates are converted to consecutive julian days, starting from the day of year of the first record read.
+
+    :param filepath: the path to the file we want to read from
+    :param start_date: date of the first record to read, records from the beginning of the file if not specified
+    :param record_count: max number of records to read, all records until the end of file if not specified
+    :param cache_path: path of the binary (.npz) sidecar with parsed file contents - used instead of parsing the file
+                       if it matches the file contents, (re)created otherwise; no sidecar is used if not specified
+    :return: a mapping of column names to arrays of values in said columns, empty if start_date was not found
+    """
+    column_names, dates, values = __load_weather_table(filepath, cache_path)
+
+    start_idx = 0
+    if start_date is not None:
+        start_idx = __find_date_idx(dates, start_date)
+        if start_idx == len(dates) or __parse_date(dates[start_idx]) != start_date:
+            return {}
+    stop_idx = len(dates) if record_count is None else min(start_idx + max(record_count, 1), len(dates))
+    if start_idx == stop_idx:
+        return {}
+
+    value_columns = [column for column in column_names if column != DATE]
+    columns = {column: values[start_idx:stop_idx, i] for i, column in enumerate(value_columns)}
+    first_julian_day = julian_calendar_manager.date_to_julian(dates[start_idx])
+    columns[DATE] = np.arange(first_julian_day, first_julian_day + stop_idx - start_idx)
+    return {column: columns[column] for column in column_names}
+
+
+def __load_weather_table(filepath: str, cache_path: Optional[str]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    with open(filepath, 'rb') as handle:
+        source_digest = hashlib.blake2b(handle.read(), digest_size=16).hexdigest()
+
+    if cache_path and os.path.isfile(cache_path):
+        try:
+            with np.load(cache_path, allow_pickle=False) as cache:
+                if str(cache["source_digest"]) == source_digest:
+                    logger.debug(f"Reading weather data from cache {cache_path}")
+                    return cache["column_names"].tolist(), cache["dates"], cache["values"]
+        except (OSError, KeyError, ValueError):
+            logger.warning(f"Ignoring unreadable weather data cache {cache_path}")
+
+    logger.debug(f"Reading CSV with weather data in SWAT format under path {filepath}")
+    # Rows end with a trailing comma - index_col=False prevents treating the first column as an index
+    weather_df = pd.read_csv(filepath, index_col=False, dtype={DATE: str}, float_precision="round_trip")
+    column_names = weather_df.columns.tolist()
+    dates = weather_df[DATE].to_numpy(dtype=str)
+    values = weather_df[[column for column in column_names if column != DATE]].to_numpy(dtype=float)
+
+    if cache_path:
+        logger.debug(f"Saving weather data cache {cache_path}")
+        tmp_cache_path = f"{cache_path}.tmp-{os.getpid()}.npz"
+        try:
+            np.savez(tmp_cache_path, source_digest=source_digest, column_names=np.array(column_names),
+                     dates=dates, values=values)
+            os.replace(tmp_cache_path, cache_path)
+        finally:
+            if os.path.exists(tmp_cache_path):
+                os.remove(tmp_cache_path)
+    return column_names, dates, values
+
+
+def __find_date_idx(dates: np.ndarray, date: datetime) -> int:
+    # Records are ordered by date - binary search parses only the probed dates
+    low, high = 0, len(dates)
+    while low < high:
+        mid = (low + high) // 2
+        if __parse_date(dates[mid]) < date:
+            low = mid + 1
+        else:
+            high = mid
+    return low
+
+
+def __parse_date(date: str) -> datetime:
+    # Format: M/D/YYYY
+    month, day, year = map(int, date.split('/'))
+    return datetime(month=month, day=day, year=year)
 
 
 # TODO: enum on the units?
@@ -72,15 +121,15 @@ def adapt_data(data: dict, hydrus_dist_unit: str, start_date=None):
     :return: the modified data
     """
     logger.debug("Adapting weather data")
-    #                   to  min  hr   day  km
-    data["Wind"] = [speed * 60 * 60 * 24 / 1000 for speed in data["Wind"]]
+    #                                              to  min  hr   day  km
+    data["Wind"] = (np.asarray(data["Wind"], dtype=float) * 60 * 60 * 24 / 1000).tolist()
 
-    data["Relative Humidity"] = [value * 100 for value in data["Relative Humidity"]]
+    data["Relative Humidity"] = (np.asarray(data["Relative Humidity"], dtype=float) * 100).tolist()
 
     if hydrus_dist_unit == "m":
-        data["Precipitation"] = [value / 1000 for value in data["Precipitation"]]
+        data["Precipitation"] = (np.asarray(data["Precipitation"], dtype=float) / 1000).tolist()
     elif hydrus_dist_unit == "cm":
-        data["Precipitation"] = [value / 10 for value in data["Precipitation"]]
+        data["Precipitation"] = (np.asarray(data["Precipitation"], dtype=float) / 10).tolist()
     elif hydrus_dist_unit == "mm":
         pass
 
@@ -125,137 +174,34 @@ def add_weather_to_hydrus_model(model_path: str, data: dict):
 
     selector_path = hydrus_utils.find_hydrus_file_path(model_path, file_name="selector.in")
     if selector_path:
-        with open(selector_path, 'r+', encoding='utf-8') as fp:
-            SelectorInProcessor(fp).update_initial_and_final_step(data[DATE][0], data[DATE][-1])
+        selector_in = get_selector_in(selector_path)
+        selector_in.update_initial_and_final_step(data[DATE][0], data[DATE][-1])
+        selector_in.save()
 
     return True
 
 
 def __modify_meteo_file(meteo_file_path, data):
     logger.debug(f"Applying weather data to Meteo.in file under path: {meteo_file_path}")
-    meteo_file = open(meteo_file_path, "r+")
-
-    old_file_lines = meteo_file.readlines()
-    # remove trailing empty lines from end of file
-    while old_file_lines[len(old_file_lines) - 1].strip() == "":
-        old_file_lines.pop()
-    new_file_lines = []
-
-    # update latitude and altitude
-    i = 0
-    while True:
-        curr_line = old_file_lines[i]
-        new_file_lines.append(curr_line)
-        i += 1
-        if "Latitude" in curr_line:
-            # write the updated values and break
-            new_file_lines.append(f"   {data[LATITUDE][0]}   {data[ELEVATION][0]}\n")
-            i += 1
-            break
-
-    # check which fields we have data about
-    replace_rad = RAD in data.keys()
-    replace_tmax = T_MAX in data.keys()
-    replace_tmin = T_MIN in data.keys()
-    replace_rhmean = RH_MEAN in data.keys()
-    replace_wind = WIND in data.keys()
-
-    # navigate to table start
-    while True:
-        curr_line = old_file_lines[i]
-        new_file_lines.append(curr_line)
-        i += 1
-        if "Daily values" in curr_line:
-            new_file_lines.append(old_file_lines[i])  # skip field descriptions line
-            i += 1
-            new_file_lines.append(old_file_lines[i])  # skip units line
-            i += 1
-            break
-
-    # write new table values, only change columns for which we have data
-    for data_row in range(len(data[DATE])):
-        # break if reached end of file
-        curr_line = old_file_lines[i]
-        if "end" in curr_line:
-            new_file_lines.append(curr_line)
-            break
-
-        curr_row = old_file_lines[i].split()
-        curr_row[0] = data[DATE][data_row]
-        if replace_rad:
-            curr_row[1] = data[RAD][data_row]
-        if replace_tmax:
-            curr_row[2] = data[T_MAX][data_row]
-        if replace_tmin:
-            curr_row[3] = data[T_MIN][data_row]
-        if replace_rhmean:
-            curr_row[4] = data[RH_MEAN][data_row]
-        if replace_wind:
-            curr_row[5] = data[WIND][data_row]
-
-        new_file_lines.append(__build_line(curr_row))
-
-        i += 1
-        data_row += 1
-
-    # overwrite file
-    meteo_file.seek(0)
-    meteo_file.writelines(new_file_lines)
-    meteo_file.truncate()
-    meteo_file.close()
+    # only change columns for which we have data
+    column_values = {0: data[DATE]}
+    for col_idx, column in enumerate([RAD, T_MAX, T_MIN, RH_MEAN, WIND], start=1):
+        if column in data.keys():
+            column_values[col_idx] = data[column]
+
+    with open(meteo_file_path, "r+") as meteo_file:
+        MeteoInProcessor(meteo_file).substitute_columns(
+            column_values,
+            # update latitude and altitude
+            header_substitutions={"Latitude": f"   {data[LATITUDE][0]}   {data[ELEVATION][0]}\n"}
+        )
 
     return True
 
 
 def __modify_atmosph_file(atmosph_file_path, data):
     logger.debug(f"Applying weather data to Atmosph.in file under path: {atmosph_file_path}")
-    atmosph_file = open(atmosph_file_path, "r+")
-
-    old_file_lines = atmosph_file.readlines()
-    # remove trailing empty lines from end of file
-    while old_file_lines[len(old_file_lines) - 1].strip() == "":
-        old_file_lines.pop()
-    new_file_lines = []
-
-    i = 0
-
-    # navigate to table start
-    while True:
-        curr_line = old_file_lines[i]
-        new_file_lines.append(curr_line)
-        i += 1
-        if "Prec" in curr_line:
-            break
-
-    # modify table
-    for data_row in range(len(data[DATE])):
-
-        # break if reached end of file
-        curr_line = old_file_lines[i]
-        if "end" in curr_line:
-            new_file_lines.append(curr_line)
-            break
-
-        curr_row = old_file_lines[i].split()
-        curr_row[0] = data[DATE][data_row]
-        curr_row[1] = data[PRECIPITATION][data_row]
-        new_file_lines.append(__build_line(curr_row))
-
-        i += 1
-        data_row += 1
-
-    # overwrite file
-    atmosph_file.seek(0)
-    atmosph_file.writelines(new_file_lines)
-    atmosph_file.truncate()
-    atmosph_file.close()
+    with open(atmosph_file_path, "r+") as atmosph_file:
+        AtmosphInProcessor(atmosph_file).substitute_columns({0: data[DATE], 1: data[PRECIPITATION]})
 
     return True
-
-
-def __build_line(items: list):
-    line = "   "
-    for item in items:
-        line += f"{item}    "
-    line += "\n"
-    return line
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from hmse_utils.processing.hydrus.hydrus_conductivity import calculate_conductivity, get_conductivity_table, \
+    get_saturation_head
+
+MATERIALS = np.array([[0.078, 0.43, 0.036, 1.56, 24.96, 0.5],
+                      [0.065, 0.41, 0.075, 1.89, 106.1, 0.5],
+                      [0.1, 0.39, 0.059, 1.48, 31.44, 0.5],
+                      [0.045, 0.43, 0.145, 2.68, 712.8, 0.5]])
+
+
+@pytest.mark.parametrize("tolerance", [1e-4, 1e-6, 1e-8])
+def test_table_lookup_within_tolerance(tolerance: float):
+    table = get_conductivity_table(MATERIALS, tolerance)
+    rng = np.random.default_rng(3)
+    h = -10.0 ** rng.uniform(-3, 3, 20000)
+    material_idx = rng.integers(0, len(MATERIALS), len(h))
+
+    expected = calculate_conductivity(h, MATERIALS[material_idx])
+    np.testing.assert_allclose(table.lookup(h, material_idx), expected, rtol=tolerance, atol=0)
+
+
+def test_table_lookup_outside_table_range():
+    table = get_conductivity_table(MATERIALS)
+    h = np.array([5.0, 0.0, get_saturation_head(MATERIALS[1]) + 1e-9, -1e5, -1e8])
+    material_idx = np.array([0, 1, 1, 2, 3])
+
+    np.testing.assert_array_equal(table.lookup(h, material_idx), calculate_conductivity(h, MATERIALS[material_idx]))
+
+
+def test_table_reused_for_same_materials():
+    assert get_conductivity_table(MATERIALS) is get_conductivity_table(MATERIALS.copy())
+    assert get_conductivity_table(MATERIALS) is not get_conductivity_table(MATERIALS[:2])
@@ -0,0 +1,140 @@
+import os
+
+import pytest
+
+from hmse_utils.processing.hydrus.hydrus_input_compiler import get_model_template
+
+PROFILE_DAT = ("Pcp_File_Version=4\r\n"
+               "0\r\n"
+               "3 0 0 0         x    h  Mat  Lay  Beta\r\n"
+               "1      0.0 -500    1    1  1.00\r\n"
+               "2     -1.0 -500    1    1  1.00\r\n"
+               "3     -2.0 -500    1    1  1.00\r\n"
+               "0\r\n")
+
+ATMOSPH_IN = ("Pcp_File_Version=4\n"
+              "MaxAL (MaxAL = number of atmospheric data-records)\n"
+              "6\n"
+              " tAtm  Prec     rSoil     rRoot    hCritA  rB  hB  ht\n"
+              + "".join(f"  {i + 1}  0.{i}  0.001  0.0146  100000.0   0   0   0\n" for i in range(6))
+              + "end*** END OF INPUT FILE ATMOSPH.IN **********************************\n")
+
+METEO_IN = ("Pcp_File_Version=4\n"
+            "MeteoRecords  Radiation   Penman-Hargreaves\n"
+            "   6    0    t\n"
+            "      t      Rad     TMax     TMin    RHMean    Wind\n"
+            "     [T]    [MJ/m2/d]   [C]    [C]     [%]   [km/d]\n"
+            + "".join(f"  {i + 1}  10.5  20.{i}  5.{i}  80  100\n" for i in range(6))
+            + "end*** END OF INPUT FILE 'METEO.IN' **********************************\n")
+
+SELECTOR_IN = ("*** BLOCK C: TIME INFORMATION ****************************************************\n"
+               "dt dtMin dtMax dMul dMul2 ItMin ItMax MPL\n"
+               "0.01 0.001 5 1.3 0.7 3 7 5\n"
+               "tInit tMax\n"
+               "0 6\n"
+               "TPrint(1),TPrint(2),...,TPrint(MPL)\n"
+               "6\n")
+
+NOD_INF_OUT = (" Units: L = cm   , T = days , M = mmol \n\n\n"
+               " Time:        2.0000\n\n\n"
+               " Node      Depth      Head Moisture       K          C         Flux\n"
+               "           [L]        [L]    [-]        [L/T]      [1/L]      [L/T]\n\n"
+               "   1     0.0000     -10.500 0.3421   0.1000E+01  0.0000E+00 -0.1000E+01\n"
+               "   2    -1.0000     -20.250 0.3421   0.1000E+01  0.0000E+00 -0.1000E+01\n"
+               "   3    -2.0000     -30.125 0.3421   0.1000E+01  0.0000E+00 -0.1000E+01\n"
+               "end\n")
+
+
+def __write(path: str, content: str) -> None:
+    with open(path, 'w', newline='') as handle:
+        handle.write(content)
+
+
+def __read(path: str) -> str:
+    with open(path, 'r', newline='') as handle:
+        return handle.read()
+
+
+@pytest.fixture
+def ref_hydrus_dir(tmp_path):
+    model_dir = os.path.join(tmp_path, "ref")
+    os.makedirs(model_dir)
+    for name, content in [("PROFILE.DAT", PROFILE_DAT), ("ATMOSPH.IN", ATMOSPH_IN), ("METEO.IN", METEO_IN),
+                          ("SELECTOR.IN", SELECTOR_IN), ("DESCRIPT.TXT", "description\r\n"),
+                          ("BALANCE.OUT", "output of reference model\n")]:
+        __write(os.path.join(model_dir, name), content)
+    return model_dir
+
+
+@pytest.fixture
+def prev_hydrus_dir(tmp_path):
+    model_dir = os.path.join(tmp_path, "prev")
+    os.makedirs(model_dir)
+    __write(os.path.join(model_dir, "NOD_INF.OUT"), NOD_INF_OUT)
+    __write(os.path.join(model_dir, "T_LEVEL.OUT"), "t_level of previous model\n")
+    return model_dir
+
+
+def test_emitting_first_step(ref_hydrus_dir: str, tmp_path):
+    new_hydrus_dir = os.path.join(tmp_path, "new")
+    get_model_template(ref_hydrus_dir).emit(new_hydrus_dir, first_step=0, step_count=3)
+
+    assert sorted(os.listdir(new_hydrus_dir)) == ["ATMOSPH.IN", "DESCRIPT.TXT", "METEO.IN",
+                                                  "PROFILE.DAT", "SELECTOR.IN"]
+    assert __read(os.path.join(new_hydrus_dir, "PROFILE.DAT")) == PROFILE_DAT
+    assert __read(os.path.join(new_hydrus_dir, "DESCRIPT.TXT")) == "description\r\n"
+
+    atmosph_rows = __read(os.path.join(new_hydrus_dir, "ATMOSPH.IN")).splitlines()[4:-1]
+    assert [row.split()[:2] for row in atmosph_rows] == [["1.000", "0.0"], ["2.000", "0.1"], ["3.000", "0.2"]]
+    selector_lines = __read(os.path.join(new_hydrus_dir, "SELECTOR.IN")).splitlines()
+    assert selector_lines[4].split() == ["0.900", "2.900"]
+
+
+def test_emitting_next_step(ref_hydrus_dir: str, prev_hydrus_dir: str, tmp_path):
+    new_hydrus_dir = os.path.join(tmp_path, "new")
+    template = get_model_template(ref_hydrus_dir)
+    template.emit(new_hydrus_dir, first_step=0, step_count=3)
+    template.emit(new_hydrus_dir, first_step=3, step_count=2, prev_hydrus_dir=prev_hydrus_dir)
+
+    assert __read(os.path.join(new_hydrus_dir, "NOD_INF.OUT")) == NOD_INF_OUT
+    assert __read(os.path.join(new_hydrus_dir, "T_LEVEL.OUT")) == "t_level of previous model\n"
+    profile_lines = __read(os.path.join(new_hydrus_dir, "PROFILE.DAT")).splitlines()
+    assert profile_lines[3:6] == ["1\t0.0\t-10.500\t1\t1\t1.00",
+                                  "2\t-1.0\t-20.250\t1\t1\t1.00",
+                                  "3\t-2.0\t-30.125\t1\t1\t1.00"]
+
+    meteo_rows = __read(os.path.join(new_hydrus_dir, "METEO.IN")).splitlines()[5:-1]
+    assert [row.split()[:3] for row in meteo_rows] == [["4.000", "10.5", "20.3"], ["5.000", "10.5", "20.4"]]
+    selector_lines = __read(os.path.join(new_hydrus_dir, "SELECTOR.IN")).splitlines()
+    assert selector_lines[4].split() == ["3.900", "4.900"]
+    assert selector_lines[6].split() == ["4.900"]
+
+    # Template is not modified by emitted models
+    assert __read(os.path.join(ref_hydrus_dir, "PROFILE.DAT")) == PROFILE_DAT
+    assert get_model_template(ref_hydrus_dir) is template
+
+
+def test_subdirectories_copied(ref_hydrus_dir: str, tmp_path):
+    os.makedirs(os.path.join(ref_hydrus_dir, "data", "nested"))
+    __write(os.path.join(ref_hydrus_dir, "data", "nested", "roots.txt"), "root distribution\n")
+    new_hydrus_dir = os.path.join(tmp_path, "new")
+
+    get_model_template(ref_hydrus_dir).emit(new_hydrus_dir, first_step=0, step_count=3)
+
+    assert __read(os.path.join(new_hydrus_dir, "data", "nested", "roots.txt")) == "root distribution\n"
+
+
+def test_template_invalidated_after_file_change(ref_hydrus_dir: str, tmp_path):
+    template = get_model_template(ref_hydrus_dir)
+    __write(os.path.join(ref_hydrus_dir, "DESCRIPT.TXT"), "new description\n")
+
+    new_template = get_model_template(ref_hydrus_dir)
+    assert new_template is not template
+    assert new_template.static_files["DESCRIPT.TXT"] == b"new description\n"
+
+
+def test_mismatched_weather_ranges(ref_hydrus_dir: str, tmp_path):
+    __write(os.path.join(ref_hydrus_dir, "METEO.IN"), METEO_IN.replace("  1  10.5", "  0  10.5"))
+
+    with pytest.raises(RuntimeError):
+        get_model_template(ref_hydrus_dir).emit(os.path.join(tmp_path, "new"), first_step=0, step_count=3)
@@ -0,0 +1,74 @@
+import json
+import os
+
+import pytest
+
+from hmse_utils.processing.hydrus import hydrus_model_management
+from hmse_utils.processing.hydrus.hydrus_model_management import HydrusModelPreparationError
+from hmse_utils.processing.local_fs_configuration import local_paths, path_constants
+from tests.processing.hydrus.test_hydrus_input_compiler import PROFILE_DAT, ATMOSPH_IN, METEO_IN, SELECTOR_IN, \
+    NOD_INF_OUT
+
+PROJECT_ID = "project"
+STEPS_INFO = [{"type": "TRANSIENT", "duration": 2}, {"type": "TRANSIENT", "duration": 1}]
+
+
+def __write(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', newline='') as handle:
+        handle.write(content)
+
+
+def __read_model(model_dir: str):
+    model_files = {}
+    for name in os.listdir(model_dir):
+        with open(os.path.join(model_dir, name), 'rb') as handle:
+            model_files[name] = handle.read()
+    return model_files
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setattr(path_constants, "__WORKSPACE_PATH", str(tmp_path))
+    __write(local_paths.get_project_metadata_path(PROJECT_ID),
+            json.dumps({"modflow_metadata": {"steps_info": STEPS_INFO}}))
+    for hydrus_id in ("h1", "h2"):
+        ref_dir = local_paths.get_hydrus_model_path(PROJECT_ID, hydrus_id, simulation_mode=True, simulation_ref=True)
+        for name, content in [("PROFILE.DAT", PROFILE_DAT), ("ATMOSPH.IN", ATMOSPH_IN),
+                              ("METEO.IN", METEO_IN), ("SELECTOR.IN", SELECTOR_IN)]:
+            __write(os.path.join(ref_dir, name), content)
+
+    prev_step_dir = os.path.join(local_paths.get_simulation_dir(PROJECT_ID), "sim_step_0", "hydrus")
+    for compound_hydrus_id in ("h1--s1", "h1--s2", "h2--s3"):
+        __write(os.path.join(prev_step_dir, compound_hydrus_id, "NOD_INF.OUT"), NOD_INF_OUT)
+        __write(os.path.join(prev_step_dir, compound_hydrus_id, "T_LEVEL.OUT"), "t_level\n")
+    return PROJECT_ID
+
+
+@pytest.mark.parametrize("workers", [1, 2, None])
+def test_preparing_models_for_next_iteration(project: str, workers):
+    hydrus_ids = [("h1", "h1--s1"), ("h1", "h1--s2"), ("h2", "h2--s3")]
+    hydrus_model_management.prepare_models_for_next_iteration(project, hydrus_ids, spin_up=1, workers=workers)
+
+    models = {compound_hydrus_id: __read_model(local_paths.get_hydrus_model_path(project, compound_hydrus_id,
+                                                                                 simulation_mode=True))
+              for _, compound_hydrus_id in hydrus_ids}
+    assert models["h1--s1"] == models["h1--s2"] == models["h2--s3"]
+    assert sorted(models["h1--s1"].keys()) == ["ATMOSPH.IN", "METEO.IN", "NOD_INF.OUT",
+                                               "PROFILE.DAT", "SELECTOR.IN", "T_LEVEL.OUT"]
+    # Second step (days 4 and 5 - after 2 days of the first step and 1 day of spin-up)
+    assert models["h1--s1"]["SELECTOR.IN"].decode().splitlines()[4].split() == ["3.900", "4.900"]
+
+
+def test_preparation_errors_collected(project: str):
+    os.remove(os.path.join(local_paths.get_hydrus_model_path(project, "h2", simulation_mode=True,
+                                                             simulation_ref=True), "METEO.IN"))
+    os.remove(os.path.join(local_paths.get_simulation_dir(project), "sim_step_0", "hydrus", "h1--s2", "NOD_INF.OUT"))
+
+    hydrus_ids = [("h1", "h1--s1"), ("h1", "h1--s2"), ("h2", "h2--s3")]
+    with pytest.raises(HydrusModelPreparationError) as error_info:
+        hydrus_model_management.prepare_models_for_next_iteration(project, hydrus_ids, spin_up=1, workers=2)
+
+    assert sorted(error_info.value.errors.keys()) == ["h1--s2", "h2--s3"]
+    assert os.path.exists(os.path.join(local_paths.get_hydrus_model_path(project, "h1--s1", simulation_mode=True),
+                                       "PROFILE.DAT"))
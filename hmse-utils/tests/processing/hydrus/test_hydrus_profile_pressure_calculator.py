@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+from scipy.optimize import root_scalar
+
+from hmse_utils.processing.hydrus import hydrus_profile_pressure_calculator
+from hmse_utils.processing.hydrus.hydrus_profile_pressure_calculator import ProfileFlowState, \
+    solve_pressure_profiles, calculate_pressure_for_hydrus_models
+
+MATERIALS = np.array([[0.078, 0.43, 0.036, 1.56, 24.96, 0.5],
+                      [0.065, 0.41, 0.075, 1.89, 106.1, 0.5],
+                      [0.1, 0.39, 0.059, 1.48, 31.44, 0.5]])
+
+
+# Scalar implementation (iModel 0) used before vectorization
+def __reference_kh(h, thr, ths, alfa, n, ks, b_par):
+    ks = max(ks, 1.0e-37)
+    m = 1.0 - 1.0 / n
+    hh = max(h, -1.0e300 ** (1.0 / n) / max(alfa, 1.0))
+    qees = min((ths - thr) / (ths - thr), 0.999999999999999)
+    hk = -1.0 / alfa * (qees ** (-1.0 / m) - 1.0) ** (1.0 / n)
+    if h < hk:
+        qee = (1.0 + (-alfa * hh) ** n) ** (-m)
+        ffq = 1.0 - (1.0 - qee ** (1.0 / m)) ** (-m)
+        if ffq <= 0.0:
+            ffq = m * qee ** (1.0 / m)
+        return max(ks * qee ** b_par * ffq ** 2, 1.0e-37)
+    return ks
+
+
+def __reference_flux_bal(h, q, h0, k0, dz, *material):
+    return q + 0.5 * (k0 + __reference_kh(h, *material)) * ((h - h0) / dz + 1)
+
+
+def __reference_solve(state: ProfileFlowState) -> np.ndarray:
+    h2new = state.head.copy()
+    q_bot = state.bottom_flux
+    h_low = h2new[-1]
+    k_low = state.conductivity[-1]
+    for idx in range(len(h2new) - 2, 0, -1):
+        qold1 = 0.5 * (state.flux[idx] + state.flux[idx + 1])
+        if qold1 * q_bot < 0 or abs(qold1 - q_bot) > (1e-12 + 0.1 * max(abs(qold1), abs(q_bot))):
+            break
+        dz = abs(state.x[idx + 1] - state.x[idx])
+        material = tuple(state.materials[idx])
+        flux_max = -0.5 * (__reference_kh(-1000., *material) + k_low) * ((-1000. - h_low) / dz + 1)
+        flux_min = -0.5 * (material[4] + k_low) * ((100. - h_low) / dz + 1)
+        hz = h_low - dz
+        args = (q_bot, h_low, k_low, dz) + material
+        if abs(q_bot) < 1e-12:
+            h_up = hz
+        elif q_bot < 0:
+            h_up = 100. if q_bot < flux_min else root_scalar(__reference_flux_bal, args=args,
+                                                             bracket=[hz, 100.]).root
+        else:
+            h_up = -1000. if q_bot > flux_max else root_scalar(__reference_flux_bal, args=args,
+                                                               bracket=[-1000., hz]).root
+        h2new[idx] = h_up
+        h_low = h_up
+        k_low = __reference_kh(h_low, *material)
+    return h2new
+
+
+def __synthetic_profile(rng, node_count: int, bottom_flux: float, water_table: float,
+                        saturated_part: float) -> ProfileFlowState:
+    x = np.linspace(0, -200, node_count)
+    materials = MATERIALS[np.where(x > -60, 0, np.where(x > -130, 1, 2))]
+    head = -x - water_table
+    conductivity = np.array([__reference_kh(h, *material) for h, material in zip(head, materials)])
+    flux = np.full(node_count, 3 * bottom_flux)
+    saturated_nodes = int(node_count * saturated_part)
+    flux[-saturated_nodes:] = bottom_flux * (1 + 0.02 * rng.standard_normal(saturated_nodes))
+    head[-1] += rng.uniform(-20, 20)
+    return ProfileFlowState(x=x, head=head, conductivity=conductivity, flux=flux, bottom_flux=bottom_flux,
+                            materials=materials, i_model=0)
+
+
+@pytest.fixture
+def profiles():
+    rng = np.random.default_rng(1)
+    return [__synthetic_profile(rng, int(rng.integers(20, 200)), bottom_flux, water_table, saturated_part)
+            for bottom_flux, water_table, saturated_part in [(-0.5, 150, 0.6), (-0.01, 120, 0.9), (0.02, 180, 0.5),
+                                                             (0.0, 100, 0.8), (-30., 150, 0.7), (5., 100, 1.0),
+                                                             (-1e-4, 50, 0.95), (0.3, 190, 0.99)] * 3]
+
+
+def test_batched_solver_matches_scalar_solver(profiles):
+    solved = solve_pressure_profiles(profiles, kh_tolerance=None)
+
+    assert len(solved) == len(profiles)
+    for profile, heads in zip(profiles, solved):
+        np.testing.assert_allclose(heads, __reference_solve(profile), rtol=1e-10, atol=1e-10)
+
+
+def test_single_profile_matches_batch(profiles):
+    batch_heads = solve_pressure_profiles(profiles)
+    for profile, heads in zip(profiles[:8], batch_heads):
+        np.testing.assert_array_equal(solve_pressure_profiles([profile])[0], heads)
+
+
+def test_table_solver_close_to_exact_solver(profiles):
+    exact = solve_pressure_profiles(profiles, kh_tolerance=None)
+    interpolated = solve_pressure_profiles(profiles, kh_tolerance=1e-9)
+
+    for exact_heads, heads in zip(exact, interpolated):
+        np.testing.assert_allclose(heads, exact_heads, rtol=1e-6, atol=1e-6)
+
+
+def test_tolerance_passed_to_solver(profiles, monkeypatch):
+    model_profiles = dict(zip(map(str, range(len(profiles))), profiles))
+    monkeypatch.setattr(hydrus_profile_pressure_calculator, "read_profile_flow_state",
+                        lambda hydrus_root_dir, water_depth: model_profiles[hydrus_root_dir])
+
+    exact = calculate_pressure_for_hydrus_models(list(model_profiles), [0.0] * len(profiles), kh_tolerance=None)
+
+    for exact_heads, heads in zip(exact, solve_pressure_profiles(profiles, kh_tolerance=None)):
+        np.testing.assert_array_equal(exact_heads, heads)
+
+
+def test_unsupported_model(profiles):
+    profiles[0].i_model = 3
+    with pytest.raises(RuntimeError):
+        solve_pressure_profiles(profiles)
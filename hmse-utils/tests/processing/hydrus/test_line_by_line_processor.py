@@ -0,0 +1,83 @@
+import io
+
+import pytest
+
+from hmse_utils.processing.hydrus.file_processing.atmosph_in_processor import AtmosphInProcessor
+from hmse_utils.processing.hydrus.file_processing.meteo_in_processor import MeteoInProcessor
+
+ATMOSPH_IN_HEADER = ("Pcp_File_Version=4\n"
+                     "*** BLOCK I: ATMOSPHERIC INFORMATION  **********************************\n"
+                     "MaxAL (MaxAL = number of atmospheric data-records)\n"
+                     "6\n"
+                     "hCritS (max. allowed pressure head at the soil surface)\n"
+                     "0\n"
+                     " tAtm  Prec     rSoil     rRoot    hCritA  rB  hB  ht\n")
+ATMOSPH_IN_FOOTER = "end*** END OF INPUT FILE ATMOSPH.IN **********************************\n"
+
+METEO_IN_HEADER = ("Pcp_File_Version=4\n"
+                   "MeteoRecords  Radiation   Penman-Hargreaves\n"
+                   "   4    0    t\n"
+                   "Latitude   Altitude\n"
+                   "   50.1   210\n"
+                   "* Daily values\n"
+                   "      t      Rad     TMax     TMin    RHMean    Wind\n"
+                   "     [T]    [MJ/m2/d]   [C]    [C]     [%]   [km/d]\n")
+METEO_IN_FOOTER = "end*** END OF INPUT FILE 'METEO.IN' **********************************\n"
+
+
+def __atmosph_in(first_day: int = 364) -> io.StringIO:
+    rows = [f"  {first_day + i}  0.{i}  0.001  0.0146  100000.0   0   0   0\n" for i in range(6)]
+    return io.StringIO(ATMOSPH_IN_HEADER + "".join(rows) + ATMOSPH_IN_FOOTER)
+
+
+def __meteo_in() -> io.StringIO:
+    rows = [f"  {i + 1}  10.5  20.{i}  5.{i}  80  100\n" for i in range(4)]
+    return io.StringIO(METEO_IN_HEADER + "".join(rows) + METEO_IN_FOOTER)
+
+
+def __table_rows(content: str, header: str, footer: str):
+    assert content.startswith(header)
+    assert content.endswith(footer)
+    return [row.split() for row in content[len(header):-len(footer)].splitlines()]
+
+
+@pytest.mark.parametrize(
+    "data_start_idx,data_count,expected_days",
+    [
+        (0, 6, ["364.000", "365.000", "366.000", "367.000", "368.000", "369.000"]),
+        (2, 3, ["1.000", "2.000", "3.000"]),
+        (4, 10, ["3.000", "4.000"]),  # Range exceeding the table keeps the end of file untouched
+    ]
+)
+def test_truncating_atmosph_in(data_start_idx: int, data_count: int, expected_days):
+    fp = __atmosph_in()
+    first_day, last_day = AtmosphInProcessor(fp).truncate_file(data_start_idx, data_count)
+
+    rows = __table_rows(fp.getvalue(), ATMOSPH_IN_HEADER, ATMOSPH_IN_FOOTER)
+    assert [row[0] for row in rows] == expected_days
+    assert [row[1] for row in rows] == [f"0.{i}" for i in range(data_start_idx, data_start_idx + len(rows))]
+    assert (first_day, last_day) == (float(expected_days[0]), float(expected_days[-1]))
+
+
+def test_substituting_atmosph_in_columns():
+    fp = __atmosph_in()
+    first_day, last_day = AtmosphInProcessor(fp).substitute_columns({0: [9, 10, 11], 1: [0.25, 1e-05, 3.0]})
+
+    rows = __table_rows(fp.getvalue(), ATMOSPH_IN_HEADER, ATMOSPH_IN_FOOTER)
+    assert rows == [["9", "0.25", "0.001", "0.0146", "100000.0", "0", "0", "0"],
+                    ["10", "1e-05", "0.001", "0.0146", "100000.0", "0", "0", "0"],
+                    ["11", "3.0", "0.001", "0.0146", "100000.0", "0", "0", "0"]]
+    assert (first_day, last_day) == (9.0, 11.0)
+
+
+def test_substituting_meteo_in_columns():
+    fp = __meteo_in()
+    MeteoInProcessor(fp).substitute_columns({0: [0, 1, 2, 3, 4], 3: [-1.5, 0.1 + 0.2, 7.0, 8.0, 9.0]},
+                                            header_substitutions={"Latitude": "   45.5   300\n"})
+
+    content = fp.getvalue()
+    header = METEO_IN_HEADER.replace("   50.1   210\n", "   45.5   300\n")
+    rows = __table_rows(content, header, METEO_IN_FOOTER)
+    assert [row[0] for row in rows] == ["0", "1", "2", "3"]
+    assert [row[3] for row in rows] == ["-1.5", "0.30000000000000004", "7.0", "8.0"]
+    assert [row[2] for row in rows] == ["20.0", "20.1", "20.2", "20.3"]
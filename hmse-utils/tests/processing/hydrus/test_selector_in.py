@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from hmse_utils.processing.hydrus.file_processing.selector_in import get_selector_in
+from hmse_utils.processing.unit_manager import LengthUnit
+
+SELECTOR_IN = """Pcp_File_Version=4
+*** BLOCK A: BASIC INFORMATION ***************************************************
+LUnit TUnit MUnit
+cm
+days
+*** BLOCK B: WATER FLOW INFORMATION **********************************************
+iModel  iHyst
+0     0
+ thr       ths      Alfa         n          Ks    l
+ 0.078  0.43  0.036  1.56  24.96  0.5
+ 0.065  0.41  0.075  1.89  106.1  0.5
+*** BLOCK C: TIME INFORMATION ****************************************************
+dt dtMin dtMax dMul dMul2 ItMin ItMax MPL
+0.01 0.001 5 1.3 0.7 3 7 729
+tInit tMax
+0 730
+TPrint(1),TPrint(2),...,TPrint(MPL)
+730
+*** BLOCK END OF INPUT FILE SELECTOR.IN ******************************************"""
+
+
+@pytest.fixture
+def selector_in_path(tmp_path):
+    path = os.path.join(tmp_path, "SELECTOR.IN")
+    with open(path, 'w') as handle:
+        handle.write(SELECTOR_IN)
+    return path
+
+
+def test_reading_selector_in(selector_in_path: str):
+    selector_in = get_selector_in(selector_in_path)
+
+    assert selector_in.get_model_length() == LengthUnit.cm
+    assert selector_in.get_waterflow_config() == {"iModel": 0}
+    assert selector_in.get_material_properties().to_numpy().tolist() == [[0.078, 0.43, 0.036, 1.56, 24.96, 0.5],
+                                                                         [0.065, 0.41, 0.075, 1.89, 106.1, 0.5]]
+
+
+def test_updating_initial_and_final_step(selector_in_path: str, tmp_path):
+    selector_in = get_selector_in(selector_in_path)
+    selector_in.update_initial_and_final_step(10, 20)
+    new_path = os.path.join(tmp_path, "NEW_SELECTOR.IN")
+    selector_in.save(new_path)
+
+    with open(new_path, 'r') as handle:
+        lines = handle.read().splitlines()
+    assert lines[13].split() == ["0.01", "0.001", "5", "1.3", "0.7", "3", "7", "1"]
+    assert lines[15].split() == ["9.900", "19.900"]
+    assert lines[17].split() == ["19.900"]
+
+    # Pending edits are not shared through the cache, source file stays untouched
+    assert get_selector_in(selector_in_path).pending_edits == {}
+    with open(selector_in_path, 'r') as handle:
+        assert handle.read() == SELECTOR_IN
+
+
+def test_cache_invalidated_after_file_change(selector_in_path: str):
+    assert get_selector_in(selector_in_path).get_model_length() == LengthUnit.cm
+
+    with open(selector_in_path, 'w') as handle:
+        handle.write(SELECTOR_IN.replace("\ncm\n", "\nm\n"))
+    assert get_selector_in(selector_in_path).get_model_length() == LengthUnit.m
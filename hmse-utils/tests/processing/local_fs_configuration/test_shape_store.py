@@ -0,0 +1,98 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from hmse_utils.processing.local_fs_configuration.path_constants import SHAPE_STORE_FILENAME, \
+    SHAPE_STORE_LOCK_FILENAME
+from hmse_utils.processing.local_fs_configuration.shape_store import ShapeStore
+
+GRID_SHAPE = (7, 13)
+
+
+def __random_mask(seed: int) -> np.ndarray:
+    return (np.random.default_rng(seed).random(GRID_SHAPE) > 0.5).astype(float)
+
+
+@pytest.fixture
+def masks():
+    return {f"shape_{i}": __random_mask(i) for i in range(4)}
+
+
+def test_save_and_read_masks(tmp_path, masks):
+    store = ShapeStore(str(tmp_path))
+    store.save_masks(masks)
+
+    assert store.get_shape_ids() == list(masks.keys())
+    for shape_id, mask in ShapeStore(str(tmp_path)).get_masks().items():
+        assert mask.dtype == bool
+        np.testing.assert_array_equal(mask, masks[shape_id] == 1)
+    np.testing.assert_array_equal(store.get_mask("shape_2"), masks["shape_2"] == 1)
+
+
+def test_union_mask(tmp_path, masks):
+    store = ShapeStore(str(tmp_path))
+    store.save_masks(masks)
+
+    expected = np.amax([masks["shape_0"], masks["shape_3"]], axis=0) == 1
+    np.testing.assert_array_equal(store.get_union_mask(["shape_0", "shape_3"]), expected)
+
+
+def test_update_and_delete_masks(tmp_path, masks):
+    store = ShapeStore(str(tmp_path))
+    store.save_masks(masks)
+
+    new_mask = __random_mask(100)
+    store.save_mask("shape_1", new_mask)
+    store.delete_masks(["shape_0", "unknown_shape"])
+
+    assert store.get_shape_ids() == ["shape_1", "shape_2", "shape_3"]
+    np.testing.assert_array_equal(store.get_mask("shape_1"), new_mask == 1)
+    np.testing.assert_array_equal(store.get_mask("shape_3"), masks["shape_3"] == 1)
+    with pytest.raises(KeyError):
+        store.get_mask("shape_0")
+
+    store.clear()
+    assert store.get_shape_ids() == []
+    assert os.listdir(tmp_path) == [SHAPE_STORE_LOCK_FILENAME]
+
+
+def test_grid_change_drops_stale_masks(tmp_path, masks):
+    store = ShapeStore(str(tmp_path))
+    store.save_masks(masks)
+    store.save_mask("new_grid_shape", np.ones((3, 3)))
+
+    assert store.get_shape_ids() == ["new_grid_shape"]
+    assert store.get_mask("new_grid_shape").all()
+
+
+def test_legacy_masks_migration(tmp_path, masks):
+    for shape_id, mask in masks.items():
+        np.save(os.path.join(tmp_path, f"{shape_id}.npy"), mask)
+
+    store = ShapeStore(str(tmp_path))
+
+    assert sorted(os.listdir(tmp_path)) == sorted([SHAPE_STORE_FILENAME, SHAPE_STORE_LOCK_FILENAME])
+    assert sorted(store.get_shape_ids()) == sorted(masks.keys())
+    for shape_id, mask in store.get_masks().items():
+        np.testing.assert_array_equal(mask, masks[shape_id] == 1)
+
+
+def test_concurrent_modifications_not_lost(tmp_path, masks):
+    store = ShapeStore(str(tmp_path))
+    store.save_masks(masks)
+    new_masks = {f"new_shape_{i}": __random_mask(100 + i) for i in range(16)}
+
+    def modify(i: int):
+        ShapeStore(str(tmp_path)).save_mask(f"new_shape_{i}", new_masks[f"new_shape_{i}"])
+        if i < len(masks):
+            ShapeStore(str(tmp_path)).delete_mask(f"shape_{i}")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(modify, range(len(new_masks))))
+
+    assert sorted(store.get_shape_ids()) == sorted(new_masks.keys())
+    for shape_id, mask in store.get_masks().items():
+        np.testing.assert_array_equal(mask, new_masks[shape_id] == 1)
+    assert sorted(os.listdir(tmp_path)) == sorted([SHAPE_STORE_FILENAME, SHAPE_STORE_LOCK_FILENAME])
@@ -0,0 +1,68 @@
+import json
+import os
+
+import pytest
+
+from hmse_utils.processing.local_fs_configuration import local_paths, path_constants, simulation_state
+from hmse_utils.processing.local_fs_configuration.feedback_loop_file_management import pre_configure_iteration, \
+    find_previous_simulation_step_dir
+from hmse_utils.processing.local_fs_configuration.path_constants import SIMULATION_STATE_FILENAME
+from hmse_utils.processing.local_fs_configuration.simulation_state import StepStatus
+
+PROJECT_ID = "project"
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setattr(path_constants, "__WORKSPACE_PATH", str(tmp_path))
+    os.makedirs(local_paths.get_modflow_model_path(PROJECT_ID, "modflow", simulation_mode=True))
+    os.makedirs(local_paths.get_hydrus_model_path(PROJECT_ID, "h1--s1", simulation_mode=True))
+    return PROJECT_ID
+
+
+def test_state_updated_by_pre_configuration(project: str):
+    assert find_previous_simulation_step_dir(project) is None
+
+    pre_configure_iteration(project)
+    simulation_state.update_current_step_status(project, StepStatus.MODELS_PREPARED)
+    pre_configure_iteration(project)
+
+    simulation_dir = local_paths.get_simulation_dir(project)
+    assert find_previous_simulation_step_dir(project) == os.path.join(simulation_dir, "sim_step_1")
+    assert os.path.isdir(os.path.join(simulation_dir, "sim_step_1", "hydrus", "h1--s1"))
+    with open(os.path.join(simulation_dir, SIMULATION_STATE_FILENAME), 'r') as handle:
+        assert json.load(handle) == {"current_step": 1,
+                                     "steps": [{"step": 0, "dir": "sim_step_0", "status": "MODELS_PREPARED"},
+                                               {"step": 1, "dir": "sim_step_1", "status": "CONFIGURED"}]}
+
+
+def test_interrupted_step_configured_again(project: str):
+    pre_configure_iteration(project)
+    simulation_state.start_simulation_step(project)
+    simulation_dir = local_paths.get_simulation_dir(project)
+    os.makedirs(os.path.join(simulation_dir, "sim_step_1", "leftover"))
+
+    # Interrupted step is not used as the previous one
+    assert find_previous_simulation_step_dir(project) == os.path.join(simulation_dir, "sim_step_0")
+
+    pre_configure_iteration(project)
+    assert find_previous_simulation_step_dir(project) == os.path.join(simulation_dir, "sim_step_1")
+    assert not os.path.exists(os.path.join(simulation_dir, "sim_step_1", "leftover"))
+    assert [(step.step, step.status) for step in simulation_state.get_simulation_state(project).steps] == \
+           [(0, StepStatus.CONFIGURED), (1, StepStatus.CONFIGURED)]
+
+
+def test_state_recreated_from_step_dirs(project: str):
+    simulation_dir = local_paths.get_simulation_dir(project)
+    for step in (0, 1, 10, 2):
+        os.makedirs(os.path.join(simulation_dir, f"sim_step_{step}"))
+
+    assert find_previous_simulation_step_dir(project) == os.path.join(simulation_dir, "sim_step_10")
+    assert simulation_state.start_simulation_step(project).dir_name == "sim_step_11"
+    assert [step.step for step in simulation_state.get_simulation_state(project).steps] == [0, 1, 2, 10, 11]
+
+
+def test_status_update_without_steps(project: str):
+    simulation_state.update_current_step_status(project, StepStatus.RECHARGE_TRANSFERRED)
+
+    assert not os.path.exists(os.path.join(local_paths.get_simulation_dir(project), SIMULATION_STATE_FILENAME))
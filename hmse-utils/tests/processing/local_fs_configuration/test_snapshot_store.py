@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from hmse_utils.processing.local_fs_configuration import snapshot_store
+
+
+def __write(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as handle:
+        handle.write(content)
+
+
+def __read(path: str) -> str:
+    with open(path, 'r') as handle:
+        return handle.read()
+
+
+@pytest.fixture
+def source_dirs(tmp_path):
+    modflow_dir = os.path.join(tmp_path, "live", "modflow")
+    hydrus_dir = os.path.join(tmp_path, "live", "hydrus")
+    __write(os.path.join(modflow_dir, "model", "model.dis"), "dis")
+    __write(os.path.join(modflow_dir, "model", "model.fhd"), "heads step 0")
+    __write(os.path.join(hydrus_dir, "h1--s1", "SELECTOR.IN"), "selector")
+    __write(os.path.join(hydrus_dir, "h1--s2", "SELECTOR.IN"), "selector")
+    os.makedirs(os.path.join(hydrus_dir, "empty"))
+    return {"modflow": modflow_dir, "hydrus": hydrus_dir}
+
+
+def test_first_snapshot_deduplicates_content(tmp_path, source_dirs):
+    snapshot_dir = os.path.join(tmp_path, "sim_step_0")
+    stats = snapshot_store.create_snapshot(source_dirs, snapshot_dir)
+
+    assert (stats.file_count, stats.linked_count, stats.written_count) == (4, 1, 3)
+    assert os.path.isdir(os.path.join(snapshot_dir, "hydrus", "empty"))
+    assert os.path.samefile(os.path.join(snapshot_dir, "hydrus", "h1--s1", "SELECTOR.IN"),
+                            os.path.join(snapshot_dir, "hydrus", "h1--s2", "SELECTOR.IN"))
+    assert sorted(snapshot_store.read_manifest(snapshot_dir).keys()) == ["hydrus/h1--s1/SELECTOR.IN",
+                                                                         "hydrus/h1--s2/SELECTOR.IN",
+                                                                         "modflow/model/model.dis",
+                                                                         "modflow/model/model.fhd"]
+
+
+def test_next_snapshot_links_unchanged_files(tmp_path, source_dirs):
+    first_snapshot_dir = os.path.join(tmp_path, "sim_step_0")
+    next_snapshot_dir = os.path.join(tmp_path, "sim_step_1")
+    snapshot_store.create_snapshot(source_dirs, first_snapshot_dir)
+    __write(os.path.join(source_dirs["modflow"], "model", "model.fhd"), "heads step 1")
+    # Rewritten with the same content - linked after comparing digests
+    __write(os.path.join(source_dirs["hydrus"], "h1--s2", "SELECTOR.IN"), "selector")
+
+    stats = snapshot_store.create_snapshot(source_dirs, next_snapshot_dir, prev_snapshot_dir=first_snapshot_dir)
+
+    assert (stats.file_count, stats.linked_count, stats.written_count) == (4, 3, 1)
+    assert stats.written_bytes == len("heads step 1")
+    for rel_path in ["modflow/model/model.dis", "hydrus/h1--s1/SELECTOR.IN", "hydrus/h1--s2/SELECTOR.IN"]:
+        assert os.path.samefile(os.path.join(first_snapshot_dir, rel_path), os.path.join(next_snapshot_dir, rel_path))
+    assert __read(os.path.join(first_snapshot_dir, "modflow", "model", "model.fhd")) == "heads step 0"
+    assert __read(os.path.join(next_snapshot_dir, "modflow", "model", "model.fhd")) == "heads step 1"
+
+    # Live files are never linked - modifying them in place does not affect snapshots
+    with open(os.path.join(source_dirs["modflow"], "model", "model.dis"), 'r+') as handle:
+        handle.write("DIS")
+    assert __read(os.path.join(next_snapshot_dir, "modflow", "model", "model.dis")) == "dis"
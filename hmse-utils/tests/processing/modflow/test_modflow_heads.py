@@ -0,0 +1,139 @@
+import os
+
+import flopy
+import numpy as np
+import pytest
+
+from hmse_utils.processing.modflow import modflow_heads, modflow_package_manager
+from hmse_utils.processing.modflow.modflow_heads import BinaryHeadFile, HeadOutputNotConfigured, \
+    SINGLE_PRECISION_HEADER, DOUBLE_PRECISION_HEADER
+
+NLAY, NROW, NCOL = 2, 3, 4
+TIMES = [1.0, 2.5, 4.0]
+
+
+def __get_heads(step: int) -> np.ndarray:
+    return np.arange(NLAY * NROW * NCOL, dtype=float).reshape(NLAY, NROW, NCOL) + step * 100
+
+
+def __write_binary_heads(path: str, header_dtype: np.dtype, value_dtype: str):
+    with open(path, 'wb') as fp:
+        for step, totim in enumerate(TIMES):
+            for layer, layer_heads in enumerate(__get_heads(step)):
+                np.array((step + 1, 1, totim, totim, "            HEAD", NCOL, NROW, layer + 1),
+                         dtype=header_dtype).tofile(fp)
+                layer_heads.astype(value_dtype).tofile(fp)
+
+
+def __write_formatted_heads(path: str):
+    with open(path, 'w') as fp:
+        for step, totim in enumerate(TIMES):
+            for layer, layer_heads in enumerate(__get_heads(step)):
+                fp.write(f"{step + 1:5d}{1:5d}{totim:15.7E}{totim:15.7E}{'HEAD':>16s}"
+                         f"{NCOL:6d}{NROW:6d}{layer + 1:6d} (10F12.4)\n")
+                for row in layer_heads:
+                    fp.write("".join(f"{value:12.4f}" for value in row) + "\n")
+
+
+@pytest.mark.parametrize("header_dtype,value_dtype", [(SINGLE_PRECISION_HEADER, "<f4"),
+                                                      (DOUBLE_PRECISION_HEADER, "<f8")])
+def test_binary_heads_match_formatted_heads(tmp_path, header_dtype: np.dtype, value_dtype: str):
+    binary_path = os.path.join(tmp_path, "model.hds")
+    formatted_path = os.path.join(tmp_path, "model.fhd")
+    __write_binary_heads(binary_path, header_dtype, value_dtype)
+    __write_formatted_heads(formatted_path)
+
+    binary_heads = modflow_heads.open_head_file(binary_path)
+    formatted_heads = modflow_heads.open_head_file(formatted_path)
+    assert isinstance(binary_heads, BinaryHeadFile)
+    assert not isinstance(formatted_heads, BinaryHeadFile)
+
+    assert binary_heads.get_times() == TIMES
+    np.testing.assert_allclose(binary_heads.get_data(), __get_heads(len(TIMES) - 1))
+    for idx in range(NLAY * len(TIMES)):
+        np.testing.assert_allclose(binary_heads.get_data(idx=idx), formatted_heads.get_data(idx=idx))
+    binary_heads.close()
+    formatted_heads.close()
+
+
+def test_memory_mapped_views(tmp_path):
+    binary_path = os.path.join(tmp_path, "model.hds")
+    formatted_path = os.path.join(tmp_path, "model.fhd")
+    __write_binary_heads(binary_path, SINGLE_PRECISION_HEADER, "<f4")
+    __write_formatted_heads(formatted_path)
+
+    with BinaryHeadFile(binary_path) as heads:
+        view = heads.get_view(totim=TIMES[1])
+        layer_view = heads.get_layer_view(1)
+    assert not view.flags.writeable and not layer_view.flags.writeable
+    np.testing.assert_allclose(view, __get_heads(1))
+    np.testing.assert_allclose(layer_view, __get_heads(len(TIMES) - 1)[1])
+
+    for path in (binary_path, formatted_path):
+        head_file = modflow_heads.open_head_file(path)
+        np.testing.assert_allclose(modflow_heads.get_heads(head_file), __get_heads(len(TIMES) - 1))
+        np.testing.assert_allclose(modflow_heads.get_layer_heads(head_file, layer=1), __get_heads(len(TIMES) - 1)[1])
+        head_file.close()
+
+
+def test_incomplete_last_record_ignored(tmp_path):
+    path = os.path.join(tmp_path, "model.hds")
+    __write_binary_heads(path, SINGLE_PRECISION_HEADER, "<f4")
+    with open(path, 'r+b') as fp:
+        fp.truncate(os.path.getsize(path) - 4)
+
+    with BinaryHeadFile(path) as heads:
+        assert len(heads.records) == NLAY * len(TIMES) - 1
+        np.testing.assert_allclose(heads.get_data(totim=TIMES[1]), __get_heads(1))
+
+
+def test_binary_head_file_preferred_without_oc(tmp_path):
+    for file_name in ["model.fhd", "model.hds", "model.nam"]:
+        open(os.path.join(tmp_path, file_name), 'w').close()
+
+    assert modflow_heads.find_head_file(tmp_path) == "model.hds"
+
+
+def test_head_file_resolved_from_oc_unit(tmp_path):
+    model = flopy.modflow.Modflow("model", model_ws=str(tmp_path))
+    flopy.modflow.ModflowDis(model, nlay=1, nrow=2, ncol=2)
+    flopy.modflow.ModflowBas(model)
+    flopy.modflow.ModflowOc(model, chedfm="(10F12.4)", head_save_unit=51, filenames=[None, "model.fhd"])
+    model.write_input()
+    # Stale binary heads uploaded with the model are not read
+    open(os.path.join(tmp_path, "model.hds"), 'w').close()
+
+    assert modflow_heads.find_head_file(tmp_path) == "model.fhd"
+
+
+def test_steps_compiled_with_binary_heads(tmp_path):
+    ref_dir = os.path.join(tmp_path, "ref")
+    model = flopy.modflow.Modflow("model", model_ws=ref_dir)
+    flopy.modflow.ModflowDis(model, nlay=1, nrow=2, ncol=2, nper=2)
+    flopy.modflow.ModflowBas(model)
+    flopy.modflow.ModflowOc(model, chedfm="(10F12.4)", head_save_unit=51,
+                            stress_period_data={(kper, 0): ["save head"] for kper in range(2)})
+    model.write_input()
+
+    steps_dir = os.path.join(tmp_path, "steps")
+    step_file_names = modflow_package_manager.compile_steps(ref_dir, steps_dir, binary_heads=True)
+
+    assert "model.nam" in step_file_names
+    step_dir = modflow_package_manager.get_step_dir(steps_dir, 1)
+    with open(os.path.join(step_dir, "model.nam"), 'r') as fp:
+        assert "DATA(BINARY) 51 model.hds REPLACE" in fp.read()
+    with open(os.path.join(step_dir, "model.oc"), 'r') as fp:
+        assert "HEAD SAVE FORMAT" not in fp.read()
+    assert modflow_heads.find_head_file(step_dir) == "model.hds"
+
+
+def test_missing_head_output_reported(tmp_path):
+    model = flopy.modflow.Modflow("model", model_ws=str(tmp_path))
+    flopy.modflow.ModflowDis(model, nlay=1, nrow=2, ncol=2)
+    flopy.modflow.ModflowBas(model)
+    flopy.modflow.ModflowOc(model, stress_period_data={(0, 0): ["print budget"]})
+    model.write_input()
+
+    assert modflow_heads.find_head_file(tmp_path) is None
+    with pytest.raises(HeadOutputNotConfigured):
+        modflow_heads.get_head_file(tmp_path)
@@ -0,0 +1,35 @@
+import math
+
+import flopy
+import numpy as np
+import pytest
+
+from hmse_utils.processing.local_fs_configuration import local_paths, path_constants
+from hmse_utils.processing.local_fs_configuration.shape_store import ShapeStore
+from hmse_utils.processing.modflow import modflow_model_management
+
+PROJECT_ID = "project"
+MODFLOW_ID = "modflow"
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setattr(path_constants, "__WORKSPACE_PATH", str(tmp_path))
+    model = flopy.modflow.Modflow("model", model_ws=local_paths.get_modflow_model_path(PROJECT_ID, MODFLOW_ID,
+                                                                                      simulation_mode=True))
+    flopy.modflow.ModflowDis(model, nlay=1, nrow=2, ncol=2, top=np.array([[10.0, 12.0], [14.0, 16.0]]), botm=0.0)
+    flopy.modflow.ModflowBas(model, ibound=np.array([[1, 1], [0, 0]]), strt=np.array([[4.0, 6.0], [8.0, 9.0]]))
+    model.write_input()
+
+    ShapeStore(local_paths.get_shapes_dir(PROJECT_ID)).save_masks({"active": np.array([[1, 1], [0, 0]]),
+                                                                  "inactive": np.array([[0, 0], [1, 0]])})
+    return PROJECT_ID
+
+
+def test_water_depth_of_shape_without_active_cells(project: str, caplog):
+    depths = modflow_model_management.get_avg_water_depth_for_shapes(project, MODFLOW_ID, ["active", "inactive"],
+                                                                     use_modflow_results=False)
+
+    assert depths["active"] == pytest.approx(6.0)
+    assert math.isnan(depths["inactive"])
+    assert "['inactive']" in caplog.text
@@ -0,0 +1,60 @@
+import filecmp
+import os
+import shutil
+
+import flopy
+import numpy as np
+import pytest
+
+from hmse_utils.processing.modflow import modflow_package_manager
+
+WELLS = {0: [[0, 1, 1, -10.0], [0, 2, 2, -3.0]], 2: [[0, 3, 3, -5.0]]}
+
+
+@pytest.fixture
+def ref_modflow_dir(tmp_path):
+    model_dir = os.path.join(tmp_path, "ref")
+    model = flopy.modflow.Modflow("model", model_ws=model_dir)
+    flopy.modflow.ModflowDis(model, nlay=1, nrow=4, ncol=5, nper=4, perlen=[1, 3, 2, 5], nstp=[1, 3, 2, 5],
+                             steady=[True, False, False, False], top=10.0, botm=0.0)
+    flopy.modflow.ModflowBas(model, ibound=np.ones((1, 4, 5), dtype=int), strt=5.0)
+    flopy.modflow.ModflowWel(model, stress_period_data=WELLS)
+    flopy.modflow.ModflowRch(model, rech={0: 0.001})
+    flopy.modflow.ModflowOc(model, stress_period_data={(kper, 0): ["save head"] for kper in range(4)})
+    model.write_input()
+    return model_dir
+
+
+def __load_step(steps_dir: str, ref_modflow_dir: str, step: int) -> flopy.modflow.Modflow:
+    model_dir = os.path.join(steps_dir, f"model_{step}")
+    shutil.copytree(ref_modflow_dir, model_dir)
+    for file_name in modflow_package_manager.get_compiled_step_file_names(steps_dir):
+        shutil.copy(os.path.join(modflow_package_manager.get_step_dir(steps_dir, step), file_name), model_dir)
+    return flopy.modflow.Modflow.load("model.nam", model_ws=model_dir, forgive=True)
+
+
+def test_compiled_steps_contain_single_stress_period(ref_modflow_dir: str, tmp_path):
+    steps_dir = os.path.join(tmp_path, "steps")
+    step_file_names = modflow_package_manager.compile_steps(ref_modflow_dir, steps_dir)
+
+    assert sorted(step_file_names) == ["model.dis", "model.oc", "model.wel"]
+    for step, expected_wells in enumerate([WELLS[0], WELLS[0], WELLS[2], WELLS[2]]):
+        model = __load_step(steps_dir, ref_modflow_dir, step)
+        assert model.nper == 1
+        assert model.dis.perlen.array.tolist() == [[1, 3, 2, 5][step]]
+        wells = model.wel.stress_period_data.data[0]
+        assert [[well["k"], well["i"], well["j"], well["flux"]] for well in wells] == expected_wells
+
+
+def test_compiled_steps_match_packages_created_for_step(ref_modflow_dir: str, tmp_path):
+    steps_dir = os.path.join(tmp_path, "steps")
+    modflow_package_manager.compile_steps(ref_modflow_dir, steps_dir)
+
+    for step in range(4):
+        model_dir = os.path.join(tmp_path, f"model_{step}")
+        shutil.copytree(ref_modflow_dir, model_dir)
+        model = flopy.modflow.Modflow.load("model.nam", model_ws=model_dir, forgive=True)
+        modflow_package_manager.create_packages_for_step(model, step)
+        step_dir = modflow_package_manager.get_step_dir(steps_dir, step)
+        for file_name in ["model.dis", "model.oc", "model.wel"]:
+            assert filecmp.cmp(os.path.join(model_dir, file_name), os.path.join(step_dir, file_name), shallow=False)
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from hmse_utils.processing.modflow import modflow_recharge_utils
+
+
+def __reference_recharge(perlen, steady_state, sum_v_bot, recharge_stack, mask):
+    stress_period_duration_iter = 0
+    for idx, stress_period_duration in enumerate(perlen):
+        if not steady_state[idx]:
+            period_duration = int(stress_period_duration)
+            final_sp_recharge = sum_v_bot[stress_period_duration_iter + period_duration - 1]
+            starting_sp_recharge = sum_v_bot[stress_period_duration_iter]
+            recharge_stack[idx][mask] = (final_sp_recharge - starting_sp_recharge) / stress_period_duration
+            stress_period_duration_iter += period_duration
+    return recharge_stack
+
+
+@pytest.mark.parametrize(
+    "perlen,steady_state,expected_starts,expected_ends",
+    [
+        ([1, 30, 31], [True, False, False], [0, 30], [29, 60]),
+        ([10, 5], [False, False], [0, 10], [9, 14]),
+        ([1, 3, 1, 2], [False, True, False, True], [0, 1], [0, 1]),
+    ]
+)
+def test_transient_period_bounds(perlen, steady_state, expected_starts, expected_ends):
+    periods, starts, ends = modflow_recharge_utils.get_transient_period_bounds(perlen, steady_state)
+    assert periods.tolist() == [i for i, is_steady in enumerate(steady_state) if not is_steady]
+    assert starts.tolist() == expected_starts
+    assert ends.tolist() == expected_ends
+
+
+@pytest.mark.parametrize(
+    "perlen,steady_state",
+    [
+        ([1, 30, 31], [True, False, False]),
+        ([1] * 20, [False] * 20),
+        ([7, 1, 14, 3], [False, True, False, False]),
+    ]
+)
+def test_vectorized_recharge_matches_loop(perlen, steady_state):
+    rng = np.random.default_rng(seed=42)
+    sum_v_bot = np.cumsum(rng.random(sum(perlen)))
+    mask = rng.random((6, 7)) > 0.5
+    recharge_stack = rng.random((len(perlen), 6, 7))
+    expected = __reference_recharge(perlen, steady_state, sum_v_bot, recharge_stack.copy(), mask)
+
+    periods, starts, ends = modflow_recharge_utils.get_transient_period_bounds(perlen, steady_state)
+    period_recharge = modflow_recharge_utils.calculate_average_recharge(sum_v_bot, perlen, periods, starts, ends)
+    modflow_recharge_utils.scatter_recharge(recharge_stack, mask, periods, period_recharge)
+
+    np.testing.assert_allclose(recharge_stack, expected)
+
+
+def test_manual_recharge_value():
+    periods, starts, ends = modflow_recharge_utils.get_transient_period_bounds([1, 5, 5], [True, False, False])
+    period_recharge = modflow_recharge_utils.calculate_average_recharge(0.25, [1, 5, 5], periods, starts, ends)
+    assert period_recharge.tolist() == [0.25, 0.25]
@@ -0,0 +1,70 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from hmse_utils.processing.modflow import modflow_heads, modflow_results
+from hmse_utils.processing.modflow.modflow_heads import SINGLE_PRECISION_HEADER
+from hmse_utils.processing.modflow.modflow_results import NoHeadsSaved
+
+NLAY, NROW, NCOL = 2, 4, 5
+# (kstp, kper, totim) of saved time steps
+TIME_STEPS = [(1, 1, 1.0), (1, 2, 2.0), (2, 2, 3.0), (3, 2, 4.0), (1, 3, 6.0)]
+
+
+def __get_heads(totim: float) -> np.ndarray:
+    return np.arange(NLAY * NROW * NCOL, dtype=np.float32).reshape(NLAY, NROW, NCOL) + totim * 100
+
+
+def __write_head_file(path: str):
+    with open(path, 'wb') as fp:
+        for kstp, kper, totim in TIME_STEPS:
+            for layer, layer_heads in enumerate(__get_heads(totim)):
+                np.array((kstp, kper, totim, totim, "            HEAD", NCOL, NROW, layer + 1),
+                         dtype=SINGLE_PRECISION_HEADER).tofile(fp)
+                layer_heads.tofile(fp)
+
+
+def test_heads_exported_per_stress_period(tmp_path):
+    head_file_path = os.path.join(tmp_path, "model.hds")
+    results_dir = os.path.join(tmp_path, "results")
+    __write_head_file(head_file_path)
+
+    with modflow_heads.open_head_file(head_file_path) as head_file:
+        modflow_results.export_heads(head_file, results_dir)
+
+    manifest = modflow_results.read_manifest(results_dir)
+    assert manifest.shape == (NLAY, NROW, NCOL)
+    assert [(chunk.period, chunk.totim) for chunk in manifest.chunks] == [(0, 1.0), (1, 4.0), (2, 6.0)]
+    for chunk in manifest.chunks:
+        np.testing.assert_array_equal(modflow_results.load_period_heads(results_dir, chunk), __get_heads(chunk.totim))
+
+
+def test_downsampled_json_view(tmp_path):
+    head_file_path = os.path.join(tmp_path, "model.hds")
+    results_dir = os.path.join(tmp_path, "results")
+    json_path = os.path.join(tmp_path, "results.json")
+    __write_head_file(head_file_path)
+    with modflow_heads.open_head_file(head_file_path) as head_file:
+        modflow_results.export_heads(head_file, results_dir)
+
+    modflow_results.export_json_view(results_dir, json_path, downsample=2)
+
+    with open(json_path, 'r') as fp:
+        results = json.load(fp)
+    assert np.array(results).shape == (3, NLAY, 2, 3)
+    np.testing.assert_array_equal(results[1], __get_heads(4.0)[:, ::2, ::2])
+
+
+def test_head_file_without_heads(tmp_path, monkeypatch):
+    head_file_path = os.path.join(tmp_path, "model.hds")
+    results_dir = os.path.join(tmp_path, "results")
+    __write_head_file(head_file_path)
+    monkeypatch.setattr(modflow_heads, "get_period_times", lambda head_file: {})
+
+    with modflow_heads.open_head_file(head_file_path) as head_file:
+        with pytest.raises(NoHeadsSaved):
+            modflow_results.export_heads(head_file, results_dir)
+    with pytest.raises(FileNotFoundError):
+        modflow_results.read_manifest(results_dir)
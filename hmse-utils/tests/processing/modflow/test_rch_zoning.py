@@ -0,0 +1,60 @@
+from collections import deque
+from typing import List
+
+import numpy as np
+import pytest
+
+from hmse_utils.processing.modflow.rch_zoning import label_rch_zones
+
+
+def __reference_masks(recharge_array: np.ndarray) -> List[np.ndarray]:
+    rows, cols = recharge_array.shape
+    is_checked = np.full(recharge_array.shape, False)
+    masks = []
+    for row in range(rows):
+        for col in range(cols):
+            if is_checked[row, col]:
+                continue
+            mask = np.zeros(recharge_array.shape, dtype=bool)
+            value = recharge_array[row, col]
+            stack = deque([(row, col)])
+            while stack:
+                cur_row, cur_col = stack.pop()
+                if not (0 <= cur_row < rows and 0 <= cur_col < cols) or is_checked[cur_row, cur_col]:
+                    continue
+                if recharge_array[cur_row, cur_col] == value:
+                    is_checked[cur_row, cur_col] = True
+                    mask[cur_row, cur_col] = True
+                    stack.extend([(cur_row - 1, cur_col), (cur_row + 1, cur_col),
+                                  (cur_row, cur_col - 1), (cur_row, cur_col + 1)])
+            masks.append(mask)
+    return masks
+
+
+@pytest.mark.parametrize(
+    "recharge_array",
+    [
+        np.array([[0.1, 0.1, 0.2],
+                  [0.2, 0.1, 0.2],
+                  [0.2, 0.2, 0.2]]),
+        np.array([[1.0, 2.0],
+                  [2.0, 1.0]]),  # diagonal cells are not connected
+        np.full((4, 6), 0.5),
+        np.array([[3.0, 1.0, 2.0, 5.0]]),
+        np.random.default_rng(7).integers(0, 3, size=(20, 17)).astype(float),
+    ]
+)
+def test_label_rch_zones_matches_flood_fill(recharge_array: np.ndarray):
+    expected_masks = __reference_masks(recharge_array)
+    zoning = label_rch_zones(recharge_array)
+
+    assert zoning.zone_count == len(expected_masks)
+    assert zoning.labels.min() == 1
+    for (zone_idx, mask), expected_mask in zip(zoning.iter_masks(), expected_masks):
+        np.testing.assert_array_equal(mask, expected_mask)
+        assert zoning.cell_counts[zone_idx] == expected_mask.sum()
+        assert np.all(recharge_array[expected_mask] == zoning.zone_values[zone_idx])
+
+        rows, cols = np.nonzero(expected_mask)
+        assert zoning.get_bounding_box(zone_idx) == (slice(rows.min(), rows.max() + 1),
+                                                   slice(cols.min(), cols.max() + 1))
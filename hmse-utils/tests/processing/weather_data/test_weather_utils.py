@@ -1,4 +1,5 @@
 import os.path
+import shutil
 from datetime import datetime
 from pathlib import Path
 
@@ -43,4 +44,67 @@ def test_reading_swat_csv_whole(start_date: datetime, records_to_read: int, expe
 
     assert read_data["Date"][0] == (start_date.timetuple().tm_yday - 1 if start_date else 0)
 
-# def test_adapting_data()
+
+def test_reading_swat_csv_columns():
+    test_csv_file = os.path.join(WEATHER_TEST_DIR, 'test_weatherdata.csv')
+    start_date = datetime(day=10, month=1, year=2000)
+    columns = weather_util.read_weather_columns(test_csv_file, start_date, 15)
+    read_data = weather_util.read_weather_csv(test_csv_file, start_date, 15)
+
+    assert list(columns) == list(read_data)
+    assert columns["Date"].tolist() == list(range(9, 24))
+    for col, values in columns.items():
+        assert values.tolist() == read_data[col]
+
+
+def test_reading_swat_csv_missing_start_date():
+    test_csv_file = os.path.join(WEATHER_TEST_DIR, 'test_weatherdata.csv')
+    assert not weather_util.read_weather_csv(test_csv_file, datetime(day=1, month=1, year=1999))
+
+
+@pytest.mark.parametrize("hydrus_dist_unit,precipitation_coef", [("m", 1e-3), ("cm", 0.1), ("mm", 1.0)])
+def test_adapting_data(hydrus_dist_unit: str, precipitation_coef: float):
+    data = {"Wind": [1.0, 2.5], "Relative Humidity": [0.5, 0.75], "Precipitation": [10.0, 0.0]}
+    adapted = weather_util.adapt_data(data, hydrus_dist_unit)
+
+    assert adapted["Wind"] == pytest.approx([86.4, 216.0])
+    assert adapted["Relative Humidity"] == pytest.approx([50.0, 75.0])
+    assert adapted["Precipitation"] == pytest.approx([10.0 * precipitation_coef, 0.0])
+    assert all(isinstance(value, float) for values in adapted.values() for value in values)
+
+
+def test_reading_swat_csv_with_cache(tmp_path, monkeypatch):
+    test_csv_file = os.path.join(tmp_path, 'weather.csv')
+    shutil.copy(os.path.join(WEATHER_TEST_DIR, 'test_weatherdata.csv'), test_csv_file)
+    cache_path = os.path.join(tmp_path, 'weather.npz')
+    start_date = datetime(day=10, month=1, year=2000)
+    expected = weather_util.read_weather_csv(test_csv_file, start_date, 15)
+
+    assert weather_util.read_weather_csv(test_csv_file, start_date, 15, cache_path) == expected
+    assert os.path.isfile(cache_path)
+
+    # Cached data is used without parsing the CSV file
+    with monkeypatch.context() as patch:
+        patch.setattr(weather_util.pd, "read_csv", None)
+        assert weather_util.read_weather_csv(test_csv_file, start_date, 15, cache_path) == expected
+
+    # Cache is recreated after CSV file changes
+    with open(test_csv_file, 'r') as handle:
+        lines = handle.readlines()
+    with open(test_csv_file, 'w') as handle:
+        handle.writelines(lines[:-1])
+    assert len(weather_util.read_weather_csv(test_csv_file, cache_path=cache_path)["Date"]) == 30
+
+
+def test_failed_cache_save_cleaned_up(tmp_path, monkeypatch):
+    cache_path = os.path.join(tmp_path, 'weather.npz')
+
+    def failing_savez(path, **_):
+        with open(path, 'wb') as handle:
+            handle.write(b'partial')
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(weather_util.np, "savez", failing_savez)
+    with pytest.raises(OSError):
+        weather_util.read_weather_csv(os.path.join(WEATHER_TEST_DIR, 'test_weatherdata.csv'), cache_path=cache_path)
+    assert os.listdir(tmp_path) == []
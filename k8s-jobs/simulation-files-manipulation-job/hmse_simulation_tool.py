@@ -2,6 +2,7 @@ import json
 from argparse import ArgumentParser
 from typing import Dict
 
+from hmse_utils.processing.hydrus.hydrus_conductivity import DEFAULT_TABLE_TOLERANCE
 from hmse_utils.processing.modflow.modflow_metadata import ModflowMetadata
 # very important imports - used in CLI, accessed through globals() dict
 from hmse_utils.processing.task_logic.data_tasks_logic import \
@@ -41,6 +42,14 @@ def __create_parser() -> ArgumentParser:
     arg_parser.add_argument("--is_feedback_loop", action="store_true")
     arg_parser.add_argument("--no_feedback_loop", action="store_false", dest="is_feedback_loop")
     arg_parser.add_argument("--spin_up", type=int)
+    # processes preparing Hydrus models, 0 - one per CPU available to the pod
+    arg_parser.add_argument("--preparation_workers", type=int, default=1)
+    arg_parser.add_argument("--binary_heads", action="store_true")  # save Modflow heads to binary head files
+    arg_parser.add_argument("--no_binary_heads", action="store_false", dest="binary_heads")
+    # results.json with every n-th row and column of heads, 0 - not exported
+    arg_parser.add_argument("--json_downsample", type=int, default=1)
+    # max relative error of K(h) tables used while recalculating Hydrus pressure profiles, 0 - exact conductivity
+    arg_parser.add_argument("--kh_tolerance", type=float, default=DEFAULT_TABLE_TOLERANCE)
     return arg_parser
 
 
@@ -63,6 +72,7 @@ def __parse_cli_kwargs(project_kwargs: Dict):
     project_kwargs["hydrus_to_weather"] = json.loads(project_kwargs["hydrus_to_weather"].replace('\'', "\""))
     # except:
     #     pass
+    project_kwargs["kh_tolerance"] = project_kwargs["kh_tolerance"] or None
     return project_kwargs
 
 
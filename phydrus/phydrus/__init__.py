@@ -1,7 +1,8 @@
 from .model import Model
 from .profile import create_profile
 from .read import read_profile, read_nod_inf, read_run_inf, read_tlevel, \
-    read_balance, read_i_check, read_obs_node, read_alevel, read_solute
+    read_balance, read_i_check, read_obs_node, read_alevel, read_solute, \
+    index_nod_inf, read_nod_inf_block, read_tlevel_columns
 from logging import getLogger
 from .utils import show_versions, set_log_level, _initialize_logger
 from .version import __version__
@@ -14,6 +14,10 @@ or
 
 """
 
+from io import BytesIO, StringIO
+from os import SEEK_END
+
+from numpy import array
 from pandas import read_csv, DataFrame, to_numeric
 
 from .decorators import check_file_path
@@ -131,6 +135,67 @@ def read_tlevel(path="T_LEVEL.OUT", usecols=None):
     return data
 
 
+@check_file_path
+def read_tlevel_columns(path="T_LEVEL.OUT", usecols=None):
+    """
+    Method to read selected columns of the T_LEVEL.OUT output file into
+    NumPy arrays. The data section is located by its byte offsets and only
+    the requested columns are converted by the C parser.
+
+    Parameters
+    ----------
+    path: str, optional
+        String with the name of the t_level out file. default is "T_LEVEL.OUT".
+    usecols: list of str optional
+        List with the names of the columns to import, e.g. ["sum(vBot)"].
+        Default is all columns, including "Time".
+
+    Returns
+    -------
+    data: dict
+        Dictionary with the column name as a key and a numpy.ndarray as a
+        value.
+
+    """
+    with open(path, "rb") as file:
+        names, start = _find_tlevel_data_start(file)
+        end = _find_tlevel_data_end(file)
+        if usecols is None:
+            usecols = names
+        missing = [col for col in usecols if col not in names]
+        if missing:
+            raise ValueError(f"Columns {missing} not found in file {path}")
+
+        file.seek(start)
+        data = read_csv(BytesIO(file.read(max(end - start, 0))), sep=r"\s+",
+                        header=None, names=names, usecols=usecols,
+                        dtype=float, engine="c")
+    return {col: data[col].to_numpy() for col in usecols}
+
+
+def _find_tlevel_data_start(file):
+    """Internal method returning the column names and the byte offset of the
+    first data row of T_LEVEL.OUT (after the header and the units line)."""
+    offset = 0
+    for line in file:
+        offset += len(line)
+        if b"rTop" in line:
+            names = [name.decode() for name in line.split()]
+            return names, offset + len(file.readline())
+    raise ValueError("Header of the T_LEVEL.OUT file not found")
+
+
+def _find_tlevel_data_end(file, tail_size=2 ** 12):
+    """Internal method returning the byte offset of the "end" line of
+    T_LEVEL.OUT, or the file size if the file is not finished."""
+    file.seek(0, SEEK_END)
+    size = file.tell()
+    file.seek(max(size - tail_size, 0))
+    tail = file.read()
+    marker = tail.rfind(b"\nend")
+    return size if marker < 0 else size - len(tail) + marker + 1
+
+
 def read_alevel(path="A_LEVEL.OUT", usecols=None):
     """
     Method to read the A_LEVEL.OUT output file.
@@ -297,31 +362,17 @@ def read_nod_inf(path="NOD_INF.OUT", times=None):
         Dictionary with the time as a key and a Pandas DataFrame as a value.
 
     """
-    use_times = []
-    start = []
-    end = []
-
-    with open(path) as file:
-        # Find the starting times to read the information
-        for i, line in enumerate(file.readlines()):
-            if "Time" in line and "Date" not in line:
-                time = line.replace(" ", "").split(":")[1].replace("\n", "")
-                use_times.append(float(time))
-            elif "Node" in line:
-                start.append(i)
-            elif "end" in line:
-                end.append(i)
-        if times is None:
-            times = use_times
-        # Read the data into a Pandas DataFrame
-        data = {}
-        for s, e, time in zip(start, end, use_times):
-            if time in times:
-                file.seek(0)  # Go back to start of file
-                data[time] = read_csv(file, skiprows=s,
+    # Parse only the requested blocks, located by the byte offset index
+    data = {}
+    with open(path, "rb") as file:
+        for time, (start, end) in index_nod_inf(path).items():
+            if times is None or time in times:
+                file.seek(start)
+                block = file.read(end - start).decode()
+                header = block.index("Node")
+                data[time] = read_csv(StringIO(block[header:block.rindex("end")]),
                                       skipinitialspace=True,
-                                      delim_whitespace=True,
-                                      nrows=e - s - 2)
+                                      delim_whitespace=True)
                 data[time] = data[time].drop([0])
                 data[time] = data[time].apply(to_numeric)
     if len(data) == 1:
@@ -330,6 +381,137 @@ def read_nod_inf(path="NOD_INF.OUT", times=None):
         return data
 
 
+@check_file_path
+def index_nod_inf(path="NOD_INF.OUT"):
+    """
+    Method to index the time blocks of the NOD_INF.OUT output file in a
+    single streaming pass.
+
+    Parameters
+    ----------
+    path: str, optional
+        String with the name of the NOD_INF out file. default is "NOD_INF.OUT".
+
+    Returns
+    -------
+    index: dict
+        Dictionary with the time as a key and a tuple with the byte offsets of
+        the start of the block ("Time:" line) and of the end of the block
+        (after the "end" line) as a value. Unfinished blocks are omitted.
+
+    """
+    index = {}
+    time = None
+    with open(path, "rb") as file:
+        offset = 0
+        for line in file:
+            if _is_nod_inf_time_line(line):
+                time = _parse_nod_inf_time(line)
+                start = offset
+            elif time is not None and line.strip() == b"end":
+                index[time] = (start, offset + len(line))
+                time = None
+            offset += len(line)
+    return index
+
+
+@check_file_path
+def read_nod_inf_block(path="NOD_INF.OUT", time=None, index=None):
+    """
+    Method to read a single time block of the NOD_INF.OUT output file into
+    NumPy arrays, without reading the rest of the file.
+
+    Parameters
+    ----------
+    path: str, optional
+        String with the name of the NOD_INF out file. default is "NOD_INF.OUT".
+    time: float, optional
+        Time of the block to read. By default the last block is read, found
+        by seeking backwards from the end of the file.
+    index: dict, optional
+        Index of the file created with `index_nod_inf`, created if a time is
+        provided and no index is passed.
+
+    Returns
+    -------
+    time: float
+        Time of the block.
+    data: dict
+        Dictionary with the column name (e.g. "Head", "K", "Flux") as a key
+        and a numpy.ndarray with nodal values as a value.
+
+    """
+    with open(path, "rb") as file:
+        if time is None:
+            start = _find_last_nod_inf_block(file)
+            if start is None:
+                raise ValueError(f"No time blocks found in file {path}")
+            file.seek(start)
+            block = file.read()
+        else:
+            if index is None:
+                index = index_nod_inf(path)
+            if time not in index:
+                raise KeyError(f"Time {time} not found in file {path}")
+            start, end = index[time]
+            file.seek(start)
+            block = file.read(end - start)
+    return _parse_nod_inf_block(block)
+
+
+def _is_nod_inf_time_line(line):
+    return b"Time:" in line and b"Date" not in line
+
+
+def _parse_nod_inf_time(line):
+    return float(line.split(b":")[1])
+
+
+def _find_last_nod_inf_block(file, chunk_size=2 ** 16):
+    """Internal method returning the byte offset of the last "Time:" line."""
+    file.seek(0, SEEK_END)
+    position = file.tell()
+    buffer = b""
+    while position > 0:
+        read_size = min(chunk_size, position)
+        position -= read_size
+        file.seek(position)
+        buffer = file.read(read_size) + buffer
+        search_end = len(buffer)
+        while True:
+            marker = buffer.rfind(b"Time:", 0, search_end)
+            if marker < 0:
+                break
+            line_start = buffer.rfind(b"\n", 0, marker) + 1
+            if line_start == 0 and position > 0:
+                break  # beginning of the line is in the previous chunk
+            line_end = buffer.find(b"\n", marker)
+            line_end = len(buffer) if line_end < 0 else line_end
+            if _is_nod_inf_time_line(buffer[line_start:line_end]):
+                return position + line_start
+            search_end = line_start
+    return None
+
+
+def _parse_nod_inf_block(block):
+    """Internal method parsing a NOD_INF.OUT block into NumPy arrays."""
+    lines = block.splitlines()
+    time = _parse_nod_inf_time(lines[0])
+    header = next(i for i, line in enumerate(lines) if b"Node" in line)
+    names = [name.decode() for name in lines[header].split()]
+
+    # Skip the units line, read rows until the end of the block
+    rows = []
+    for line in lines[header + 2:]:
+        if line.strip() == b"end":
+            break
+        if line.strip():
+            rows.append(line)
+    values = array(b" ".join(rows).split(), dtype=float)
+    values = values.reshape(len(rows), -1) if rows else values.reshape(0, len(names))
+    return time, {name: values[:, i] for i, name in enumerate(names[:values.shape[1]])}
+
+
 @check_file_path
 def read_balance(path="BALANCE.OUT", usecols=None):
     """
@@ -11,6 +11,28 @@ def test_read_nod_inf():
     return
 
 
+def test_index_nod_inf():
+    index = ps.index_nod_inf(path="tests/test_data/NOD_INF.OUT")
+    assert list(index) == sorted(index)
+    assert list(index)[0] == 90.0
+    return
+
+
+def test_read_nod_inf_block():
+    path = "tests/test_data/NOD_INF.OUT"
+    data = ps.read_nod_inf(path=path)
+    last_time = max(data)
+    time, block = ps.read_nod_inf_block(path=path)
+    assert time == last_time
+    assert (block["Head"] == data[last_time]["Head"].to_numpy()).all()
+    assert (block["Flux"] == data[last_time]["Flux"].to_numpy()).all()
+
+    time, block = ps.read_nod_inf_block(path=path, time=120.0)
+    assert time == 120.0
+    assert (block["K"] == data[120.0]["K"].to_numpy()).all()
+    return
+
+
 def test_read_run_inf():
     ps.read_run_inf(path="tests/test_data/RUN_INF.OUT")
     return
@@ -31,6 +53,20 @@ def test_read_tlevel():
     return
 
 
+def test_read_tlevel_columns():
+    path = "tests/test_data/T_LEVEL.OUT"
+    data = ps.read_tlevel_columns(path=path, usecols=["sum(vBot)", "vBot"])
+    assert list(data) == ["sum(vBot)", "vBot"]
+    assert len(data["vBot"]) == 110
+    assert data["sum(vBot)"][[0, -1]].tolist() == [-0.385e-03, -0.299]
+    assert data["vBot"][[0, -1]].tolist() == [-0.385e-01, -0.314e-01]
+    # Same values as the line by line reader
+    tlevel = ps.read_tlevel(path=path)
+    assert (data["sum(vBot)"] == tlevel["sum(vBot)"].to_numpy()).all()
+    assert (data["vBot"] == tlevel["vBot"].to_numpy()).all()
+    return
+
+
 def test_read_alevel():
     ps.read_alevel(path="tests/test_data/A_LEVEL.OUT")
     return